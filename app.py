@@ -1,82 +1,190 @@
-# Monkey-patch must happen before all other imports
-try:
-    import eventlet
-    eventlet.monkey_patch()
-    async_mode = 'eventlet'
-except ImportError:
+# Monkey-patch must happen before all other imports. Under asgi.py
+# (SERVER_MODE=asgi) this module only provides the Flask app and shared state,
+# and must not patch the asyncio server it runs in.
+import os
+if os.environ.get('SERVER_MODE') == 'asgi':
     async_mode = 'threading'
+else:
+    try:
+        import eventlet
+        eventlet.monkey_patch()
+        async_mode = 'eventlet'
+    except ImportError:
+        async_mode = 'threading'
 
 from flask import Flask, render_template, request, session, jsonify, redirect, url_for
-from flask_socketio import SocketIO, emit, join_room, leave_room
-from werkzeug.utils import secure_filename
+from flask_socketio import SocketIO
 from functools import wraps
 import models
+import metrics
+import hubwatch
+import sharedstate
+import images
+import uploads
+from assets import AssetManifest, IMMUTABLE, minify_js
+from presence import PresenceBroadcaster
+from scheduler import Scheduler
+from games import GameType, RPSGame, BombGame, TapGame, TTOLGame
 import uuid
-import os
+import atexit
+import json
+import base64
+import hashlib
+import hmac
 import random
+import re
+import threading
 import time
 from datetime import datetime, timedelta
-import threading
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SECRET_KEY', 'shamrock-secret-key-change-in-production')
 app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 5MB max upload
 
 UPLOAD_FOLDER = os.path.join(app.static_folder, 'uploads')
-ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif', 'webp'}
-ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', 'shamrock2024')
+UPLOAD_URL = '/static/uploads'
+
+SOCKETIO_CLIENT_URL = 'https://cdnjs.cloudflare.com/ajax/libs/socket.io/4.6.0/socket.io.min.js'
+app.add_template_global(SOCKETIO_CLIENT_URL, 'socketio_client_url')
 
-def allowed_file(filename):
-    return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
+# Fingerprinted, precompressed copies of static/ under /assets, JS minified (templates use asset_url())
+static_assets = AssetManifest(app.static_folder, transforms={'.js': minify_js})
+static_assets.init_app(app)
 
+@app.after_request
+def cache_uploads(response):
+    """Uploaded photos have content-hashed names, so they never change either."""
+    if response.status_code == 200 and request.path.startswith(UPLOAD_URL + '/'):
+        response.headers['Cache-Control'] = IMMUTABLE
+    return response
+ADMIN_PASSWORD = os.environ.get('ADMIN_PASSWORD', 'shamrock2024')
+METRICS_TOKEN = os.environ.get('METRICS_TOKEN', '')  # lets a Prometheus scraper in without an admin login
+
+# With MESSAGE_QUEUE set, emits fan out to every worker through Redis and the
+# presence/client/game state below is shared (see sharedstate.py)
 socketio = SocketIO(app, cors_allowed_origins="*", async_mode=async_mode,
-                    ping_timeout=60, ping_interval=25)
+                    ping_timeout=60, ping_interval=25,
+                    message_queue=sharedstate.MESSAGE_QUEUE or None)
+
+# One scheduler task drives every game, disconnect and housekeeping timeout
+scheduler = Scheduler()
+socketio.start_background_task(scheduler.run)
+
+# Measures hub lag and catches whatever blocks the hub (see hubwatch.py)
+HUB_LAG_THRESHOLD = float(os.environ.get('HUB_LAG_THRESHOLD', 0.1))  # seconds
+hub_watchdog = hubwatch.HubWatchdog(threshold=HUB_LAG_THRESHOLD)
+if async_mode == 'eventlet':
+    hub_watchdog.start(socketio.start_background_task, socketio.sleep)
+
+# Latency histograms for every handler and route (wired up at the bottom of this file)
+handler_metrics = metrics.Metrics()
 
 # Track connected clients
-connected_clients = {}  # session_id -> {socket_id}
-disconnect_timers = {}  # session_id -> timer
-
-def get_sender_session():
-    """Get session_id of the current socket caller from connected_clients."""
-    sid = request.sid
-    for sess_id, data in connected_clients.items():
-        if data.get('socket_id') == sid:
-            return sess_id
-    return None
-
-active_games = {}  # game_id -> {session_a, session_b, mode, drink, choice_a, choice_b, timer}
-bomb_games = {}    # game_id -> {session_a, session_b, mode, drink, holder, started, timer, last_pass_time}
-tap_games = {}     # game_id -> {session_a, session_b, ...}
-ttol_games = {}    # game_id -> {session_a, session_b, ...}
+connected_clients = sharedstate.create_client_registry()  # session_id <-> socket_ids
+disconnect_timers = {}  # session_id -> timer (armed on this worker)
+DISCONNECT_GRACE = float(os.environ.get('DISCONNECT_GRACE', 86400))  # seconds a tabless session stays online
+
+# ============== Transport ==============
+# The socket event handlers and game rules below take the caller's socket id
+# and reach clients only through `transport`, never through Flask-SocketIO's
+# request context, so asgi.py can run the very same code on its own server
+# by swapping in its own transport.
+
+class SocketIOTransport:
+    """Emits and room changes through this module's Flask-SocketIO server."""
+
+    def emit(self, event, data=None, to=None):
+        """Send an event to a socket id or room (to everyone if to is None)."""
+        socketio.emit(event, *(() if data is None else (data,)), to=to)
+
+    def enter_room(self, sid, room):
+        socketio.server.enter_room(sid, room, namespace='/')
+
+    def leave_room(self, sid, room):
+        socketio.server.leave_room(sid, room, namespace='/')
+
+transport = SocketIOTransport()
+
+SOCKET_EVENTS = {}  # event name -> handler(sid, data), for asgi.py
+
+def on_socket_event(event):
+    """Register handler(sid, data) for a Socket.IO event (also listed in SOCKET_EVENTS)."""
+    def register(handler):
+        SOCKET_EVENTS[event] = handler
+
+        @wraps(handler)
+        def on_event(data=None):
+            return handler(request.sid, data)
+        socketio.on_event(event, on_event)
+        return handler
+    return register
+
+# ============== Venues ==============
+# One deployment serves many venues. A guest belongs to the venue they checked
+# in at (the ?venue= of the link or QR code they arrived through); presence,
+# broadcasts and games never cross venues.
+
+VENUE_PATTERN = re.compile(r'^[a-z0-9][a-z0-9-]{0,31}$')
+
+def normalize_venue(value):
+    """A venue slug from user input, or the default venue if it isn't a valid one."""
+    value = (value or '').strip().lower()
+    return value if VENUE_PATTERN.match(value) else models.DEFAULT_VENUE
+
+def venue_room(venue):
+    return f'venue_{venue}'
+
+# In-flight games of every type, indexed by game_id and by player
+games = sharedstate.create_game_engine()
 
 # Periodic cleanup for abandoned games (older than 1 hour)
 GAME_MAX_AGE = 3600  # 1 hour in seconds
 
 def cleanup_stale_games():
     """Remove games that have been in memory longer than GAME_MAX_AGE."""
-    now = time.time()
-    for store_name, store in [('active_games', active_games), ('bomb_games', bomb_games),
-                               ('tap_games', tap_games), ('ttol_games', ttol_games)]:
-        stale = [gid for gid, g in store.items() if now - g.get('created_at', 0) > GAME_MAX_AGE]
-        for gid in stale:
-            game = store.pop(gid, None)
-            if game and game.get('timer'):
-                game['timer'].cancel()
-            print(f"Cleaned up stale {store_name} game: {gid}")
+    for game in games.cleanup_stale(GAME_MAX_AGE):
+        print(f"Cleaned up stale {game.game_type} game: {game.game_id}")
     # Schedule next cleanup
-    cleanup_timer = threading.Timer(300, cleanup_stale_games)  # every 5 minutes
-    cleanup_timer.daemon = True
-    cleanup_timer.start()
+    scheduler.call_later(300, cleanup_stale_games)  # every 5 minutes
 
 # Start the cleanup loop
-_initial_cleanup = threading.Timer(300, cleanup_stale_games)
-_initial_cleanup.daemon = True
-_initial_cleanup.start()
+scheduler.call_later(300, cleanup_stale_games)
 
 # Initialize database on startup
 models.init_db()
-models.init_menu_table()
-models.init_game_results_table()
+
+# Mirror in-memory presence to profiles.is_online (PRESENCE_WRITE_THROUGH=1 only)
+PRESENCE_FLUSH_INTERVAL = 2.0  # seconds
+
+def flush_presence_writes():
+    models.flush_presence_writes()
+    scheduler.call_later(PRESENCE_FLUSH_INTERVAL, flush_presence_writes)
+
+if models.PRESENCE_WRITE_THROUGH:
+    scheduler.call_later(PRESENCE_FLUSH_INTERVAL, flush_presence_writes)
+
+# With several workers, each one keeps a heartbeat in Redis and sweeps up after
+# workers that stopped sending theirs: the sockets they held are forgotten, and
+# guests left without any get the usual disconnect timer here
+WORKER_SWEEP_INTERVAL = sharedstate.WORKER_TTL / 3
+
+def sweep_dead_workers():
+    scheduler.call_later(WORKER_SWEEP_INTERVAL, sweep_dead_workers)  # first, so a Redis error can't stop the heartbeat
+    connected_clients.heartbeat()
+    for session_id in connected_clients.sweep_dead_workers():
+        print(f"Session {session_id} lost its worker")
+        start_disconnect_timer(session_id)
+
+if sharedstate.enabled():
+    connected_clients.heartbeat()
+    scheduler.call_later(WORKER_SWEEP_INTERVAL, sweep_dead_workers)
+    atexit.register(connected_clients.retire)
+
+# Activity log and game results are committed in batches by one writer task;
+# whatever is still queued is written out when the process exits
+if models.WRITE_BEHIND:
+    socketio.start_background_task(models.run_write_behind)
+    atexit.register(models.flush_writes)
 
 # ============== Routes ==============
 
@@ -87,8 +195,9 @@ def index():
 
 @app.route('/people')
 def people():
-    """People page - main interaction area."""
-    return render_template('people.html')
+    """People page - main interaction area. Game scripts are loaded on demand."""
+    game_scripts = {t: static_assets.url(f'js/games/{t}.js') for t in games.types}
+    return render_template('people.html', game_scripts=game_scripts)
 
 @app.route('/activity')
 def activity_page():
@@ -97,109 +206,178 @@ def activity_page():
 
 @app.route('/api/users')
 def api_users():
-    """Get all active users."""
+    """Get the active users of a venue (?venue=, or the venue of ?exclude=)."""
     exclude = request.args.get('exclude')
-    return jsonify(models.get_active_users(exclude_session=exclude))
+    if 'venue' in request.args:
+        venue = normalize_venue(request.args['venue'])
+    else:
+        venue = models.get_venue(exclude)
+    return jsonify(models.get_active_users(venue, exclude_session=exclude))
 
 @app.route('/api/profile', methods=['POST'])
 def api_create_profile():
-    """Create or update a user profile."""
-    session_id = request.form.get('session_id')
-    name = request.form.get('name', '').strip()
-
-    if not session_id or not name:
-        return jsonify({'error': 'Name and session_id are required'}), 400
-
-    if len(name) > 20:
-        return jsonify({'error': 'Name must be 20 characters or less'}), 400
-
-    if 'photo' not in request.files or not request.files['photo'].filename:
-        return jsonify({'error': 'Photo is required'}), 400
-
-    photo_url = None
-    file = request.files['photo']
-    if file and allowed_file(file.filename):
-        os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-        ext = file.filename.rsplit('.', 1)[1].lower()
-        filename = secure_filename(f'{session_id}.{ext}')
-        filepath = os.path.join(UPLOAD_FOLDER, filename)
-        file.save(filepath)
-        photo_url = f'/static/uploads/{filename}'
-
-    color_frame = request.form.get('color_frame', '').strip() or None
+    """Create or update a user profile.
+
+    The multipart body is streamed (see uploads.py) rather than parsed via
+    request.form/request.files, so bad photos are refused early and good
+    ones never sit in memory.
+    """
+    max_bytes = app.config['MAX_CONTENT_LENGTH']
+    if request.content_length is not None and request.content_length > max_bytes:
+        return jsonify({'error': 'Photo is too large'}), 413  # refused before reading any of the body
+    try:
+        form, upload = uploads.parse_upload(request.stream, request.content_type, 'photo', UPLOAD_FOLDER, max_bytes)
+    except uploads.UploadError as e:
+        return jsonify({'error': e.message}), e.status
+
+    try:
+        session_id = form.get('session_id')
+        name = form.get('name', '').strip()
+
+        if not session_id or not name:
+            return jsonify({'error': 'Name and session_id are required'}), 400
+
+        if len(name) > 20:
+            return jsonify({'error': 'Name must be 20 characters or less'}), 400
+
+        if upload is None:
+            return jsonify({'error': 'Photo is required'}), 400
+
+        try:
+            photo_urls = images.save_photo(upload.path, upload.digest, upload.ext, UPLOAD_FOLDER, UPLOAD_URL)
+        except images.InvalidImage:
+            return jsonify({'error': 'Photo could not be read as an image'}), 400
+        photo_url = photo_urls['thumb']
+    finally:
+        if upload is not None:
+            upload.discard()
+
+    color_frame = form.get('color_frame', '').strip() or None
     if color_frame and color_frame not in ('red', 'yellow', 'green'):
         color_frame = None
 
-    instagram = request.form.get('instagram', '').strip() or None
+    instagram = form.get('instagram', '').strip() or None
+    venue = normalize_venue(form.get('venue'))
 
-    models.create_profile(session_id, name, photo_url, color_frame, instagram)
-    return jsonify({'success': True, 'name': name, 'photo_url': photo_url, 'color_frame': color_frame, 'instagram': instagram})
+    previous = models.get_profile(session_id)
+    models.create_profile(session_id, name, photo_url, color_frame, instagram, photo_urls, venue)
+    if previous:
+        _remove_photo_files(previous, keep=photo_urls)
+    return jsonify({'success': True, 'name': name, 'photo_url': photo_url, 'photo_urls': photo_urls,
+                    'color_frame': color_frame, 'instagram': instagram, 'venue': venue})
 
 @app.route('/api/profile/<session_id>')
 def api_get_profile(session_id):
-    """Get a profile by session_id."""
+    """Get a profile by session_id (served from the profile cache, with an ETag)."""
     profile = models.get_profile(session_id)
-    if profile:
-        return jsonify(profile)
-    return jsonify({'error': 'Profile not found'}), 404
+    if not profile:
+        return jsonify({'error': 'Profile not found'}), 404
+    response = jsonify(profile)
+    response.set_etag(hashlib.sha1(json.dumps(profile, sort_keys=True).encode()).hexdigest())
+    response.cache_control.no_cache = True  # always revalidate; unchanged profiles get a 304
+    return response.make_conditional(request)
 
-@app.route('/api/activity/<session_id>')
-def api_user_activity(session_id):
-    """Get combined activity (drinks + games) for a user."""
-    import json as json_mod
-    messages = models.get_user_messages(session_id, limit=50)
-    games = models.get_user_game_results(session_id, limit=50)
+ACTIVITY_PAGE_SIZE = 50
 
-    activity = []
+def _encode_activity_cursor(row):
+    raw = json.dumps([row['created_at'], row['kind'], row['id']])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
 
-    for msg in messages:
-        other_session = msg['to_session'] if msg['from_session'] == session_id else msg['from_session']
-        other_profile = models.get_profile(other_session)
-        other_name = other_profile['name'] if other_profile else 'Someone'
-        other_photo = other_profile.get('photo_url') if other_profile else None
+def _decode_activity_cursor(cursor):
+    try:
+        created_at, kind, row_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return (str(created_at), str(kind), int(row_id))
+    except (ValueError, TypeError):
+        return None
 
-        activity.append({
-            'type': 'drink',
-            'direction': 'sent' if msg['from_session'] == session_id else 'received',
-            'other_name': other_name,
-            'other_photo': other_photo,
-            'status': msg['status'],
-            'created_at': msg['created_at'],
-        })
-
-    for game in games:
-        other_session = game['session_b'] if game['session_a'] == session_id else game['session_a']
-        other_profile = models.get_profile(other_session)
-        other_name = other_profile['name'] if other_profile else 'Someone'
-        other_photo = other_profile.get('photo_url') if other_profile else None
+@app.route('/api/activity/<session_id>')
+def api_user_activity(session_id):
+    """Get combined activity (drinks + games) for a user, one page at a time."""
+    limit = min(max(request.args.get('limit', ACTIVITY_PAGE_SIZE, type=int), 1), 100)
+    before = None
+    if request.args.get('cursor'):
+        before = _decode_activity_cursor(request.args['cursor'])
+        if before is None:
+            return jsonify({'error': 'Invalid cursor'}), 400
+
+    rows = models.get_user_activity(session_id, limit=limit + 1, before=before)
+    has_more = len(rows) > limit
+    rows = rows[:limit]
 
-        if game['winner_session'] == session_id:
+    activity = []
+    for row in rows:
+        other_name = row['other_name'] or 'Someone'
+        other_photo = row['other_photo']
+
+        if row['kind'] == 'drink':
+            activity.append({
+                'type': 'drink',
+                'direction': 'sent' if row['from_session'] == session_id else 'received',
+                'other_name': other_name,
+                'other_photo': other_photo,
+                'status': row['status'],
+                'created_at': row['created_at'],
+            })
+            continue
+
+        if row['winner_session'] == session_id:
             outcome = 'won'
-        elif game['loser_session'] == session_id:
+        elif row['loser_session'] == session_id:
             outcome = 'lost'
         else:
             outcome = 'tied'
 
-        details = json_mod.loads(game['details']) if game.get('details') else {}
-
         activity.append({
             'type': 'game',
-            'game_type': game['game_type'],
+            'game_type': row['game_type'],
             'other_name': other_name,
             'other_photo': other_photo,
             'outcome': outcome,
-            'mode': game['mode'],
-            'details': details,
-            'created_at': game['created_at'],
+            'mode': row['mode'],
+            'details': json.loads(row['details']) if row['details'] else {},
+            'created_at': row['created_at'],
         })
 
-    activity.sort(key=lambda x: x['created_at'] or '', reverse=True)
-    return jsonify(activity)
+    return jsonify({
+        'items': activity,
+        'next_cursor': _encode_activity_cursor(rows[-1]) if has_more else None,
+    })
+
+# App shell the service worker precaches: the pages plus every fingerprinted asset
+SHELL_PAGES = ['/', '/people', '/activity']
+SHELL_TEMPLATES = ['base.html', 'index.html', 'people.html', 'activity.html']
+
+_service_worker_js = None
+
+def _build_service_worker():
+    """sw.js with the precache list and a version that changes whenever the shell does."""
+    precache = SHELL_PAGES + static_assets.urls() + [url_for('static', filename='manifest.json'), SOCKETIO_CLIENT_URL]
+    version = hashlib.sha256()
+    for url in precache:
+        version.update(url.encode())
+    for name in SHELL_TEMPLATES:
+        with open(os.path.join(app.root_path, app.template_folder, name), 'rb') as f:
+            version.update(f.read())
+    with open(os.path.join(app.static_folder, 'manifest.json'), 'rb') as f:
+        version.update(f.read())
+    with open(os.path.join(app.static_folder, 'sw.js'), encoding='utf-8') as f:
+        source = f.read()
+    version.update(source.encode())
+    return (source
+            .replace("'__SW_VERSION__'", json.dumps(version.hexdigest()[:12]))
+            .replace('__PRECACHE_URLS__', json.dumps(precache)))
 
 @app.route('/sw.js')
 def service_worker():
     """Serve service worker from root scope (required for iOS PWA notifications)."""
-    return app.send_static_file('sw.js'), 200, {'Content-Type': 'application/javascript', 'Service-Worker-Allowed': '/'}
+    global _service_worker_js
+    if _service_worker_js is None or app.debug:
+        _service_worker_js = _build_service_worker()
+    return _service_worker_js, 200, {
+        'Content-Type': 'application/javascript',
+        'Service-Worker-Allowed': '/',
+        'Cache-Control': 'no-cache',
+    }
 
 # ============== Admin ==============
 
@@ -232,13 +410,24 @@ def admin_logout():
 @app.route('/admin')
 @admin_required
 def admin_dashboard():
-    """Admin dashboard — live stats."""
-    users = models.get_active_users()
-    total_messages = models.count_messages()
-    active_game_count = len(active_games) + len(bomb_games) + len(tap_games) + len(ttol_games)
-    activity = models.get_recent_activity(30)
-    drink_stats = models.get_drink_stats(10)
+    """Admin dashboard — live stats, for one venue (?venue=) or all of them."""
+    venues = models.get_venues()
+    venue = normalize_venue(request.args['venue']) if request.args.get('venue') else None
+    users = [u for v in ([venue] if venue else venues) for u in models.get_active_users(v)]
+    total_messages = models.count_messages(venue)
+    active_game_count = len(games)
+    activity = models.get_recent_activity(30, venue)
+    drink_stats = models.get_drink_stats(10, venue)
+    pool_stats = models.get_pool_stats()
+    broadcast_stats = presence_broadcaster.stats()
+    timer_stats = scheduler.stats()
+    write_stats = models.get_write_stats()
+    profile_cache_stats = models.get_profile_cache_stats()
     return render_template('admin.html',
+        hub_stats=hub_watchdog.stats(),
+        hub_offenders=hub_watchdog.offenders(),
+        venue=venue,
+        venues=venues,
         users=users,
         online_count=len(users),
         total_messages=total_messages,
@@ -246,8 +435,22 @@ def admin_dashboard():
         connected=len(connected_clients),
         activity=activity,
         drink_stats=drink_stats,
+        pool_stats=pool_stats,
+        broadcast_stats=broadcast_stats,
+        timer_stats=timer_stats,
+        write_stats=write_stats,
+        profile_cache_stats=profile_cache_stats,
     )
 
+@app.route('/admin/metrics')
+def admin_metrics():
+    """Prometheus text metrics, for an admin session or a METRICS_TOKEN bearer."""
+    auth = request.headers.get('Authorization', '')
+    token_ok = bool(METRICS_TOKEN) and hmac.compare_digest(auth, f'Bearer {METRICS_TOKEN}')
+    if not (token_ok or session.get('admin')):
+        return 'Unauthorized\n', 401, {'WWW-Authenticate': 'Bearer'}
+    return handler_metrics.render(), 200, {'Content-Type': 'text/plain; version=0.0.4; charset=utf-8'}
+
 @app.route('/admin/menu')
 @admin_required
 def admin_menu():
@@ -290,164 +493,222 @@ def admin_menu_delete(item_id):
 @app.route('/admin/users/reset', methods=['POST'])
 @admin_required
 def admin_users_reset():
-    """Reset all users (set everyone offline)."""
-    for sess_id in list(connected_clients.keys()):
+    """Reset all users of a venue, or of every venue (set everyone offline)."""
+    venue = normalize_venue(request.form['venue']) if request.form.get('venue') else None
+    sessions = connected_clients.sessions()
+    profiles = models.get_profiles(sessions)
+    for sess_id in sessions:
+        sess_venue = profiles[sess_id]['venue'] if sess_id in profiles else models.DEFAULT_VENUE
+        if venue is not None and sess_venue != venue:
+            continue
+        forfeit_user_games(sess_id)
         _cleanup_profile(sess_id)
         models.go_offline(sess_id)
-    connected_clients.clear()
-    for timer in disconnect_timers.values():
-        timer.cancel()
-    disconnect_timers.clear()
-    socketio.emit('users_update', models.get_active_users())
-    return redirect(url_for('admin_dashboard'))
+        connected_clients.remove_session(sess_id)
+        timer = disconnect_timers.pop(sess_id, None)
+        if timer:
+            timer.cancel()
+        broadcast_presence(sess_venue)
+    return redirect(url_for('admin_dashboard', venue=venue))
 
 @app.route('/admin/users/kick/<session_id>', methods=['POST'])
 @admin_required
 def admin_kick_user(session_id):
     """Kick a specific user offline."""
+    venue = models.get_venue(session_id)
+    forfeit_user_games(session_id)
     _cleanup_profile(session_id)
     models.go_offline(session_id)
-    if session_id in connected_clients:
-        del connected_clients[session_id]
-    socketio.emit('users_update', models.get_active_users())
-    socketio.emit('kicked', {}, room=f'user_{session_id}')
-    return redirect(url_for('admin_dashboard'))
+    connected_clients.remove_session(session_id)
+    broadcast_presence(venue)
+    transport.emit('kicked', {}, to=f'user_{session_id}')
+    return redirect(url_for('admin_dashboard', venue=request.form.get('venue') or None))
 
 @app.route('/admin/broadcast', methods=['POST'])
 @admin_required
 def admin_broadcast():
-    """Send a broadcast message to all connected clients."""
+    """Send a broadcast message to the guests of one venue, or to everyone."""
     message = request.form.get('message', '').strip()
+    venue = normalize_venue(request.form['venue']) if request.form.get('venue') else None
     if message:
-        socketio.emit('admin_broadcast', {'message': message})
-        models.log_activity('broadcast', f'Admin broadcast: {message}')
-    return redirect(url_for('admin_dashboard'))
+        if venue is None:
+            transport.emit('admin_broadcast', {'message': message})
+        else:
+            transport.emit('admin_broadcast', {'message': message}, to=venue_room(venue))
+        for v in ([venue] if venue else models.get_venues()):
+            models.log_activity('broadcast', f'Admin broadcast: {message}', venue=v)
+    return redirect(url_for('admin_dashboard', venue=venue))
 
 @app.route('/admin/activity/clear', methods=['POST'])
 @admin_required
 def admin_activity_clear():
-    """Clear the activity log."""
-    models.clear_activity_log()
-    return redirect(url_for('admin_dashboard'))
-
-
-def _cleanup_profile(session_id):
-    """Delete a user's profile and photo file."""
-    profile = models.get_profile(session_id)
-    if profile and profile.get('photo_url'):
-        photo_path = os.path.join(app.root_path, profile['photo_url'].lstrip('/'))
+    """Clear the activity log of one venue, or of every venue."""
+    venue = normalize_venue(request.form['venue']) if request.form.get('venue') else None
+    models.clear_activity_log(venue)
+    return redirect(url_for('admin_dashboard', venue=venue))
+
+
+def _remove_photo_files(profile, keep=None):
+    """Delete a profile's photo files from disk, except any still listed in keep."""
+    urls = dict(profile.get('photo_urls') or {})
+    if profile.get('photo_url'):
+        urls['photo_url'] = profile['photo_url']
+    urls = {k: url for k, url in urls.items() if not models.is_photo_in_use(url, profile['session_id'])}
+    kept = images.photo_paths(keep, UPLOAD_FOLDER, UPLOAD_URL)
+    for photo_path in images.photo_paths(urls, UPLOAD_FOLDER, UPLOAD_URL) - kept:
         if os.path.exists(photo_path):
             try:
                 os.remove(photo_path)
             except OSError:
                 pass
+
+def _cleanup_profile(session_id):
+    """Delete a user's profile and photo files."""
+    profile = models.get_profile(session_id)
+    if profile:
+        _remove_photo_files(profile)
     models.delete_profile(session_id)
 
+# ============== Presence Broadcasts ==============
+
+PRESENCE_BROADCAST_WINDOW = float(os.environ.get('PRESENCE_BROADCAST_WINDOW', 0.15))  # seconds
+
+def _send_presence_changes(venues):
+    """Send each venue every presence delta since its last broadcast, as one presence_batch."""
+    for venue in venues:
+        changes = models.take_presence_changes(venue)
+        if changes is None:
+            # Deltas already rotated out of the feed — send the venue a snapshot
+            transport.emit('users_update', models.get_presence_snapshot(venue), to=venue_room(venue))
+        elif changes:
+            transport.emit('presence_batch', {'changes': changes}, to=venue_room(venue))
+
+presence_broadcaster = PresenceBroadcaster(
+    _send_presence_changes, PRESENCE_BROADCAST_WINDOW, scheduler.call_later,
+)
+
+def broadcast_presence(venue):
+    """Queue a presence broadcast to a venue; changes within the window go out together."""
+    presence_broadcaster.request(venue)
+
 # ============== Socket Events ==============
 
-@socketio.on('connect')
-def handle_connect():
+@on_socket_event('connect')
+def handle_connect(sid, data):
     """Handle client connection."""
-    print(f"Client connected: {request.sid}")
+    print(f"Client connected: {sid}")
 
-@socketio.on('disconnect')
-def handle_disconnect():
+@on_socket_event('disconnect')
+def handle_disconnect(sid, data):
     """Handle client disconnect - wait before going offline."""
-    sid = request.sid
-
-    # Find which session this socket belongs to
-    session_id = None
-    for sess_id, data in connected_clients.items():
-        if data.get('socket_id') == sid:
-            session_id = sess_id
-            break
-
-    if session_id:
-        # Start a timer before going offline
-        def offline_after_timeout():
-            if session_id in connected_clients:
-                _cleanup_profile(session_id)
-                models.go_offline(session_id)
-                del connected_clients[session_id]
-                socketio.emit('users_update', models.get_active_users())
-                print(f"Session {session_id} went offline after timeout")
-
-        # Cancel existing timer if any
-        if session_id in disconnect_timers:
-            disconnect_timers[session_id].cancel()
-
-        timer = threading.Timer(86400.0, offline_after_timeout)
-        disconnect_timers[session_id] = timer
-        timer.start()
-        print(f"Started disconnect timer for session {session_id}")
-
-@socketio.on('go_online')
-def handle_go_online(data):
+    session_id = connected_clients.unbind_socket(sid)
+
+    # Only start the offline timer once the session's last tab is gone
+    if session_id and not connected_clients.has_sockets(session_id):
+        start_disconnect_timer(session_id)
+
+def start_disconnect_timer(session_id):
+    """Take a session with no sockets left offline unless a tab comes back within DISCONNECT_GRACE."""
+    def offline_after_timeout():
+        disconnect_timers.pop(session_id, None)
+        # A tab may have reconnected to another worker meanwhile
+        if session_id in connected_clients and not connected_clients.has_sockets(session_id):
+            venue = models.get_venue(session_id)
+            forfeit_user_games(session_id)
+            _cleanup_profile(session_id)
+            models.go_offline(session_id)
+            connected_clients.remove_session(session_id)
+            broadcast_presence(venue)
+            print(f"Session {session_id} went offline after timeout")
+
+    # Cancel existing timer if any
+    previous = disconnect_timers.pop(session_id, None)
+    if previous:
+        previous.cancel()
+
+    disconnect_timers[session_id] = scheduler.call_later(DISCONNECT_GRACE, offline_after_timeout)
+    print(f"Started disconnect timer for session {session_id}")
+
+@on_socket_event('go_online')
+def handle_go_online(sid, data):
     """Handle a user coming online after profile creation."""
     session_id = data.get('session_id')
     if not session_id:
-        emit('online_error', {'message': 'Invalid request'})
+        transport.emit('online_error', {'message': 'Invalid request'}, to=sid)
         return
 
     # Cancel any pending disconnect timer
-    if session_id in disconnect_timers:
-        disconnect_timers[session_id].cancel()
-        del disconnect_timers[session_id]
+    timer = disconnect_timers.pop(session_id, None)
+    if timer:
+        timer.cancel()
 
     # Mark online in DB
     models.go_online(session_id)
+    profile = models.get_profile(session_id)
+    venue = profile['venue'] if profile else models.DEFAULT_VENUE
 
     # Track this client
-    connected_clients[session_id] = {
-        'socket_id': request.sid
-    }
+    connected_clients.bind(session_id, sid)
 
-    # Join a personal room
-    join_room(f'user_{session_id}')
+    # Join a personal room and the venue's room
+    transport.enter_room(sid, f'user_{session_id}')
+    transport.enter_room(sid, venue_room(venue))
 
-    emit('online_success', {'session_id': session_id})
+    transport.emit('online_success', {'session_id': session_id}, to=sid)
 
     # Log activity
-    profile = models.get_profile(session_id)
     pname = profile['name'] if profile else session_id[:8]
-    models.log_activity('join', f'{pname} came online', session_id)
+    models.log_activity('join', f'{pname} came online', session_id, venue)
 
-    # Broadcast updated user list to everyone
-    socketio.emit('users_update', models.get_active_users())
+    # Broadcast updated user list to everyone in the venue
+    broadcast_presence(venue)
     print(f"Session {session_id} came online")
 
-@socketio.on('rejoin')
-def handle_rejoin(data):
+@on_socket_event('rejoin')
+def handle_rejoin(sid, data):
     """Handle a user rejoining after page refresh."""
     session_id = data.get('session_id')
     if not session_id:
         return
 
     # Cancel any pending disconnect timer
-    if session_id in disconnect_timers:
-        disconnect_timers[session_id].cancel()
-        del disconnect_timers[session_id]
+    timer = disconnect_timers.pop(session_id, None)
+    if timer:
+        timer.cancel()
 
     profile = models.get_profile(session_id)
     if not profile:
-        emit('rejoin_failed', {'message': 'Session expired'})
+        transport.emit('rejoin_failed', {'message': 'Session expired'}, to=sid)
         return
 
     # Re-mark online
     models.go_online(session_id)
 
-    if session_id in connected_clients:
-        connected_clients[session_id]['socket_id'] = request.sid
-    else:
-        connected_clients[session_id] = {'socket_id': request.sid}
+    connected_clients.bind(session_id, sid)
 
-    join_room(f'user_{session_id}')
-    emit('rejoin_success', {'session_id': session_id})
-    socketio.emit('users_update', models.get_active_users())
+    transport.enter_room(sid, f'user_{session_id}')
+    transport.enter_room(sid, venue_room(profile['venue']))
+    transport.emit('rejoin_success', {'session_id': session_id}, to=sid)
+    broadcast_presence(profile['venue'])
     print(f"Session {session_id} rejoined")
 
-@socketio.on('checkout')
-def handle_checkout(data):
+@on_socket_event('presence_sync')
+def handle_presence_sync(sid, data):
+    """Catch a client up: replay missed presence deltas, or send a full snapshot."""
+    data = data or {}
+    venue = models.get_venue(connected_clients.session_for(sid))
+    since = data.get('since')
+    changes = None
+    if (data.get('epoch') == models.get_presence_epoch(venue)
+            and isinstance(since, int) and 0 <= since <= models.get_presence_seq(venue)):
+        changes = models.get_presence_changes(venue, since)
+    if changes is None:
+        transport.emit('users_update', models.get_presence_snapshot(venue), to=sid)
+    elif changes:
+        transport.emit('presence_batch', {'changes': changes}, to=sid)
+
+@on_socket_event('checkout')
+def handle_checkout(sid, data):
     """Handle a user checking out (leaving the app)."""
     session_id = data.get('session_id')
     if not session_id:
@@ -455,45 +716,51 @@ def handle_checkout(data):
 
     profile = models.get_profile(session_id)
     pname = profile['name'] if profile else session_id[:8]
-    models.log_activity('leave', f'{pname} checked out', session_id)
+    venue = profile['venue'] if profile else models.DEFAULT_VENUE
+    models.log_activity('leave', f'{pname} checked out', session_id, venue)
 
+    forfeit_user_games(session_id)
     _cleanup_profile(session_id)
     models.go_offline(session_id)
-    leave_room(f'user_{session_id}')
+    transport.leave_room(sid, f'user_{session_id}')
+    transport.leave_room(sid, venue_room(venue))
 
-    if session_id in connected_clients:
-        del connected_clients[session_id]
+    connected_clients.remove_session(session_id)
 
-    socketio.emit('users_update', models.get_active_users())
-    emit('checkout_success')
+    broadcast_presence(venue)
+    transport.emit('checkout_success', to=sid)
     print(f"Session {session_id} checked out")
 
-@socketio.on('send_message')
-def handle_send_message(data):
+@on_socket_event('send_message')
+def handle_send_message(sid, data):
     """Handle sending a message/drink to another user."""
     to_session = data.get('to_session')
     content = data.get('content')
     message_type = data.get('message_type', 'message')
 
-    sender_session = get_sender_session()
+    sender_session = connected_clients.session_for(sid)
     if not all([sender_session, to_session, content]):
-        emit('send_error', {'message': 'Invalid request'})
+        transport.emit('send_error', {'message': 'Invalid request'}, to=sid)
         return
 
-    # Check if target user is still online
-    if not models.is_user_online(to_session):
-        emit('send_error', {'message': "Oops! They just left. Maybe next time!"})
+    # Both profiles in one lookup (usually straight from the cache)
+    profiles = models.get_profiles([sender_session, to_session])
+    profile = profiles.get(sender_session)
+    venue = profile['venue'] if profile else models.DEFAULT_VENUE
+
+    # Check if target user is still online (and at the same venue)
+    if not models.is_user_online(to_session, venue):
+        transport.emit('send_error', {'message': "Oops! They just left. Maybe next time!"}, to=sid)
         return
 
     # Create the message in database
-    message_id = models.create_message(sender_session, to_session, message_type, content)
+    message_id = models.create_message(sender_session, to_session, message_type, content, venue)
 
     # Send notification to the target user
     note = data.get('note', '')
-    profile = models.get_profile(sender_session)
     sender_name = profile['name'] if profile else 'Someone'
     sender_photo = profile.get('photo_url') if profile else None
-    socketio.emit('incoming_message', {
+    transport.emit('incoming_message', {
         'message_id': message_id,
         'from_session': sender_session,
         'from_name': sender_name,
@@ -501,21 +768,21 @@ def handle_send_message(data):
         'message_type': message_type,
         'content': content,
         'note': note,
-    }, room=f'user_{to_session}')
+    }, to=f'user_{to_session}')
 
     # Log activity
     if message_type == 'drink':
-        target_profile = models.get_profile(to_session)
+        target_profile = profiles.get(to_session)
         target_name = target_profile['name'] if target_profile else 'someone'
-        models.log_activity('drink', f'{sender_name} offered a drink to {target_name}', sender_session)
+        models.log_activity('drink', f'{sender_name} offered a drink to {target_name}', sender_session, venue)
     else:
-        models.log_activity('message', f'{sender_name} messaged someone', sender_session)
+        models.log_activity('message', f'{sender_name} messaged someone', sender_session, venue)
 
-    emit('send_success', {'message': 'Sent!'})
+    transport.emit('send_success', {'message': 'Sent!'}, to=sid)
     print(f"Message from {sender_session[:8]} to {to_session[:8]}: {content}")
 
-@socketio.on('respond_message')
-def handle_respond_message(data):
+@on_socket_event('respond_message')
+def handle_respond_message(sid, data):
     """Handle accepting or declining a message/drink."""
     message_id = data.get('message_id')
     response = data.get('response')  # 'accepted' or 'declined'
@@ -531,7 +798,7 @@ def handle_respond_message(data):
     message = models.get_message(message_id)
     content = message['content'] if message else ''
 
-    responder_session = get_sender_session()
+    responder_session = connected_clients.session_for(sid)
     responder_profile = models.get_profile(responder_session) if responder_session else None
     responder_name = responder_profile['name'] if responder_profile else 'Someone'
 
@@ -542,15 +809,136 @@ def handle_respond_message(data):
         'responder_session': responder_session,
     }
 
-    socketio.emit('message_response', notification, room=f'user_{from_session}')
-    emit('response_confirmed', notification)
+    transport.emit('message_response', notification, to=f'user_{from_session}')
+    transport.emit('response_confirmed', notification, to=sid)
     print(f"Message {message_id} {response}")
 
+# ============== Games: shared lifecycle ==============
+# challenge -> accept -> play -> resolve -> persist. Each game type registers
+# its start/finish rules with the engine; the Socket.IO handlers below are
+# thin wrappers around these shared steps.
+
+def _handle_challenge(sid, type_name, data):
+    """Create a pending game and invite the opponent."""
+    to_session = data.get('to_session')
+    mode = data.get('mode', 'fun')
+    drink = data.get('drink', '')
+
+    sender_session = connected_clients.session_for(sid)
+    if not all([sender_session, to_session]):
+        transport.emit(f'{type_name}_error', {'message': 'Invalid request'}, to=sid)
+        return
+
+    venue = models.get_venue(sender_session)
+    if not models.is_user_online(to_session, venue):
+        transport.emit(f'{type_name}_error', {'message': "They just left!"}, to=sid)
+        return
+
+    game_id = str(uuid.uuid4())[:8]
+    games.create(type_name, game_id, sender_session, to_session, mode, drink, venue)
+
+    profile = models.get_profile(sender_session)
+    sender_name = profile['name'] if profile else 'Someone'
+    sender_photo = profile.get('photo_url') if profile else None
+    transport.emit(f'{type_name}_incoming', {
+        'game_id': game_id,
+        'from_session': sender_session,
+        'from_name': sender_name,
+        'from_photo': sender_photo,
+        'mode': mode,
+        'drink': drink,
+    }, to=f'user_{to_session}')
+
+    transport.emit(f'{type_name}_challenge_sent', {'game_id': game_id}, to=sid)
+    print(f"{games.types[type_name].label} challenge: {sender_session[:8]} -> {to_session[:8]} ({mode})")
+
+def _handle_response(type_name, data):
+    """Accept (start) or decline a pending game."""
+    game_id = data.get('game_id')
+    accepted = data.get('accepted', False)
+
+    with games.locked(game_id):
+        game = games.get(game_id, type_name)
+        if not game or game.started:
+            return
+
+        label = games.types[type_name].label
+        if not accepted:
+            games.pop(game_id)
+            transport.emit(f'{type_name}_declined', {
+                'game_id': game_id,
+                'from_session': game.session_b
+            }, to=f'user_{game.session_a}')
+            print(f"{label} challenge {game_id} declined")
+            return
+
+        game.started = True
+        games.types[type_name].start(game)
+        games.save(game)
+
+def _emit_to_players(game, event, data):
+    for sess in game.players:
+        transport.emit(event, data, to=f'user_{sess}')
+
+def _persist_result(game, winner_session, loser_session, result, details=None,
+                    activity=None, activity_session=None):
+    """Record a finished game in the activity log and game_results."""
+    venue = game.venue or models.DEFAULT_VENUE
+    if activity:
+        models.log_activity('game', activity, activity_session or game.session_a, venue)
+    models.save_game_result(
+        game_type=game.game_type, session_a=game.session_a, session_b=game.session_b,
+        winner_session=winner_session, loser_session=loser_session, result=result,
+        mode=game.mode, details=details, venue=venue
+    )
+
+def forfeit_user_games(session_id):
+    """End every game a departing user is in, right away.
+
+    Pending challenges are withdrawn; games in progress are forfeited to the
+    opponent and recorded like any other result.
+    """
+    user_games = games.games_for(session_id)
+    if not user_games:
+        return
+    profile = models.get_profile(session_id)
+    name = profile['name'] if profile else 'They'
+
+    for game in user_games:
+        games.pop(game.game_id)
+        game_type = games.types[game.game_type]
+        opponent = game.opponent(session_id)
+
+        if not game.started:
+            if session_id == game.session_b:
+                transport.emit(f'{game.game_type}_declined', {
+                    'game_id': game.game_id,
+                    'from_session': session_id
+                }, to=f'user_{opponent}')
+            else:
+                transport.emit(f'{game.game_type}_result', game.payload(
+                    result='cancelled', message=f'{name} left — challenge cancelled'
+                ), to=f'user_{opponent}')
+            continue
+
+        fields = game_type.state_fields(game)
+        transport.emit(f'{game.game_type}_result', game.payload(
+            **fields, result='win', winner=opponent, loser=session_id,
+            forfeit=True, message=f'{name} left the game'
+        ), to=f'user_{opponent}')
+        _persist_result(
+            game, opponent, session_id, 'win_a' if opponent == game.session_a else 'win_b',
+            details={**fields, 'forfeit': True},
+            activity=f'{game_type.label}: {name} forfeited',
+            activity_session=opponent,
+        )
+        print(f"{game_type.label} game {game.game_id}: {session_id[:8]} forfeited")
+
 # ============== Rock Paper Scissors ==============
 
 def resolve_rps(game):
     """Determine RPS winner. Returns 'a', 'b', or 'tie'."""
-    a, b = game['choice_a'], game['choice_b']
+    a, b = game.choice_a, game.choice_b
     if a == b:
         return 'tie'
     wins = {'rock': 'scissors', 'scissors': 'paper', 'paper': 'rock'}
@@ -558,156 +946,73 @@ def resolve_rps(game):
 
 def finish_game(game_id):
     """Resolve a game and notify both players."""
-    game = active_games.pop(game_id, None)
+    game = games.pop(game_id, 'rps')
     if not game:
         return
 
-    if game.get('timer'):
-        game['timer'].cancel()
-
     # Handle forfeits (timeout with no choice)
-    if not game['choice_a'] and not game['choice_b']:
-        for sess in [game['session_a'], game['session_b']]:
-            socketio.emit('rps_result', {
-                'game_id': game_id, 'result': 'cancelled',
-                'message': 'Game timed out!'
-            }, room=f'user_{sess}')
+    if not game.choice_a and not game.choice_b:
+        _emit_to_players(game, 'rps_result', {
+            'game_id': game_id, 'result': 'cancelled',
+            'message': 'Game timed out!'
+        })
         return
 
-    if not game['choice_a']:
-        winner_session, loser_session = game['session_b'], game['session_a']
+    if not game.choice_a:
+        winner_session, loser_session = game.session_b, game.session_a
         result_key = 'b'
-    elif not game['choice_b']:
-        winner_session, loser_session = game['session_a'], game['session_b']
+    elif not game.choice_b:
+        winner_session, loser_session = game.session_a, game.session_b
         result_key = 'a'
     else:
         result_key = resolve_rps(game)
         if result_key == 'tie':
             winner_session, loser_session = None, None
         elif result_key == 'a':
-            winner_session, loser_session = game['session_a'], game['session_b']
+            winner_session, loser_session = game.session_a, game.session_b
         else:
-            winner_session, loser_session = game['session_b'], game['session_a']
+            winner_session, loser_session = game.session_b, game.session_a
 
-    base = {
-        'game_id': game_id,
-        'choice_a': game['choice_a'],
-        'choice_b': game['choice_b'],
-        'session_a': game['session_a'],
-        'session_b': game['session_b'],
-        'mode': game['mode'],
-        'drink': game.get('drink', ''),
-    }
+    base = game.payload(choice_a=game.choice_a, choice_b=game.choice_b)
 
     if result_key == 'tie':
-        for sess in [game['session_a'], game['session_b']]:
-            socketio.emit('rps_result', {**base, 'result': 'tie'}, room=f'user_{sess}')
+        _emit_to_players(game, 'rps_result', {**base, 'result': 'tie'})
     else:
-        socketio.emit('rps_result', {
+        transport.emit('rps_result', {
             **base, 'result': 'win', 'winner': winner_session, 'loser': loser_session
-        }, room=f'user_{winner_session}')
-        socketio.emit('rps_result', {
+        }, to=f'user_{winner_session}')
+        transport.emit('rps_result', {
             **base, 'result': 'lose', 'winner': winner_session, 'loser': loser_session
-        }, room=f'user_{loser_session}')
+        }, to=f'user_{loser_session}')
 
-    models.log_activity('game', f'RPS: {game["session_a"][:8]} vs {game["session_b"][:8]} → {result_key}', game['session_a'])
-    models.save_game_result(
-        game_type='rps', session_a=game['session_a'], session_b=game['session_b'],
-        winner_session=winner_session, loser_session=loser_session, result=result_key,
-        mode=game['mode'], details={'choice_a': game['choice_a'], 'choice_b': game['choice_b']}
+    _persist_result(
+        game, winner_session, loser_session, result_key,
+        details={'choice_a': game.choice_a, 'choice_b': game.choice_b},
+        activity=f'RPS: {game.session_a[:8]} vs {game.session_b[:8]} → {result_key}',
     )
     print(f"RPS game {game_id}: {result_key}")
 
-@socketio.on('rps_challenge')
-def handle_rps_challenge(data):
-    """Handle a RPS challenge from one user to another."""
-    to_session = data.get('to_session')
-    mode = data.get('mode', 'fun')
-    drink = data.get('drink', '')
-
-    sender_session = get_sender_session()
-    if not all([sender_session, to_session]):
-        emit('rps_error', {'message': 'Invalid request'})
-        return
-
-    if not models.is_user_online(to_session):
-        emit('rps_error', {'message': "They just left!"})
-        return
-
-    game_id = str(uuid.uuid4())[:8]
-
-    active_games[game_id] = {
-        'session_a': sender_session,
-        'session_b': to_session,
-        'mode': mode,
-        'drink': drink,
-        'choice_a': None,
-        'choice_b': None,
-        'timer': None,
-        'started': False,
-        'created_at': time.time(),
-    }
+def start_rps_game(game):
+    """Open the 30-second choice window."""
+    game_id = game.game_id
+    games.set_timer(game, scheduler.call_later(30.0, finish_game, game_id))
 
-    profile = models.get_profile(sender_session)
-    sender_name = profile['name'] if profile else 'Someone'
-    sender_photo = profile.get('photo_url') if profile else None
-    socketio.emit('rps_incoming', {
-        'game_id': game_id,
-        'from_session': sender_session,
-        'from_name': sender_name,
-        'from_photo': sender_photo,
-        'mode': mode,
-        'drink': drink,
-    }, room=f'user_{to_session}')
+    start_data = game.payload()
+    _emit_to_players(game, 'rps_start', start_data)
+    print(f"RPS game {game_id} started")
 
-    emit('rps_challenge_sent', {'game_id': game_id})
-    print(f"RPS challenge: {sender_session[:8]} -> {to_session[:8]} ({mode})")
+@on_socket_event('rps_challenge')
+def handle_rps_challenge(sid, data):
+    """Handle a RPS challenge from one user to another."""
+    _handle_challenge(sid, 'rps', data)
 
-@socketio.on('rps_response')
-def handle_rps_response(data):
+@on_socket_event('rps_response')
+def handle_rps_response(sid, data):
     """Handle accept/decline of a RPS challenge."""
-    game_id = data.get('game_id')
-    accepted = data.get('accepted', False)
-
-    game = active_games.get(game_id)
-    if not game:
-        return
-
-    if not accepted:
-        active_games.pop(game_id, None)
-        socketio.emit('rps_declined', {
-            'game_id': game_id,
-            'from_session': game['session_b']
-        }, room=f'user_{game["session_a"]}')
-        print(f"RPS challenge {game_id} declined")
-        return
+    _handle_response('rps', data)
 
-    # Start the game
-    game['started'] = True
-
-    # 30-second timeout
-    def timeout():
-        if game_id in active_games:
-            finish_game(game_id)
-
-    timer = threading.Timer(30.0, timeout)
-    game['timer'] = timer
-    timer.start()
-
-    # Notify both users
-    start_data = {
-        'game_id': game_id,
-        'session_a': game['session_a'],
-        'session_b': game['session_b'],
-        'mode': game['mode'],
-        'drink': game.get('drink', ''),
-    }
-    socketio.emit('rps_start', start_data, room=f'user_{game["session_a"]}')
-    socketio.emit('rps_start', start_data, room=f'user_{game["session_b"]}')
-    print(f"RPS game {game_id} started")
-
-@socketio.on('rps_choice')
-def handle_rps_choice(data):
+@on_socket_event('rps_choice')
+def handle_rps_choice(sid, data):
     """Handle a player's RPS choice."""
     game_id = data.get('game_id')
     choice = data.get('choice')
@@ -716,596 +1021,381 @@ def handle_rps_choice(data):
     if choice not in ('rock', 'paper', 'scissors'):
         return
 
-    game = active_games.get(game_id)
-    if not game or not game.get('started'):
-        return
+    with games.locked(game_id):
+        game = games.get(game_id, 'rps')
+        if not game or not game.started:
+            return
 
-    if session_id == game['session_a']:
-        game['choice_a'] = choice
-    elif session_id == game['session_b']:
-        game['choice_b'] = choice
-    else:
-        return
+        if session_id == game.session_a:
+            game.choice_a = choice
+        elif session_id == game.session_b:
+            game.choice_b = choice
+        else:
+            return
+        games.save(game)
 
-    if game['choice_a'] and game['choice_b']:
-        finish_game(game_id)
+        if game.choice_a and game.choice_b:
+            finish_game(game_id)
 
 # ============== Bomb Pass ==============
 
 def finish_bomb_game(game_id):
     """Resolve a bomb game — whoever holds the bomb loses."""
-    game = bomb_games.pop(game_id, None)
+    game = games.pop(game_id, 'bomb')
     if not game:
         return
 
-    if game.get('timer'):
-        game['timer'].cancel()
-
-    holder = game['holder']
+    holder = game.holder
     if not holder:
-        for sess in [game['session_a'], game['session_b']]:
-            socketio.emit('bomb_result', {
-                'game_id': game_id, 'result': 'cancelled',
-                'message': 'Game cancelled!'
-            }, room=f'user_{sess}')
+        _emit_to_players(game, 'bomb_result', {
+            'game_id': game_id, 'result': 'cancelled',
+            'message': 'Game cancelled!'
+        })
         return
 
     loser_session = holder
-    winner_session = game['session_b'] if holder == game['session_a'] else game['session_a']
+    winner_session = game.opponent(holder)
 
-    base = {
-        'game_id': game_id,
-        'session_a': game['session_a'],
-        'session_b': game['session_b'],
-        'mode': game['mode'],
-        'drink': game.get('drink', ''),
-        'winner': winner_session,
-        'loser': loser_session,
-    }
+    base = game.payload(winner=winner_session, loser=loser_session)
 
-    socketio.emit('bomb_result', {
+    transport.emit('bomb_result', {
         **base, 'result': 'win'
-    }, room=f'user_{winner_session}')
-    socketio.emit('bomb_result', {
+    }, to=f'user_{winner_session}')
+    transport.emit('bomb_result', {
         **base, 'result': 'lose'
-    }, room=f'user_{loser_session}')
+    }, to=f'user_{loser_session}')
 
-    models.log_activity('game', f'Bomb Pass: {winner_session[:8]} beat {loser_session[:8]}', winner_session)
-    models.save_game_result(
-        game_type='bomb', session_a=game['session_a'], session_b=game['session_b'],
-        winner_session=winner_session, loser_session=loser_session,
-        result='win_a' if winner_session == game['session_a'] else 'win_b',
-        mode=game['mode']
+    _persist_result(
+        game, winner_session, loser_session,
+        'win_a' if winner_session == game.session_a else 'win_b',
+        activity=f'Bomb Pass: {winner_session[:8]} beat {loser_session[:8]}',
+        activity_session=winner_session,
     )
     print(f"Bomb game {game_id}: {loser_session[:8]} exploded!")
 
-@socketio.on('bomb_challenge')
-def handle_bomb_challenge(data):
-    """Handle a Bomb Pass challenge."""
-    to_session = data.get('to_session')
-    mode = data.get('mode', 'fun')
-    drink = data.get('drink', '')
-
-    sender_session = get_sender_session()
-    if not all([sender_session, to_session]):
-        emit('bomb_error', {'message': 'Invalid request'})
-        return
-
-    if not models.is_user_online(to_session):
-        emit('bomb_error', {'message': "They just left!"})
-        return
-
-    game_id = str(uuid.uuid4())[:8]
-
-    bomb_games[game_id] = {
-        'session_a': sender_session,
-        'session_b': to_session,
-        'mode': mode,
-        'drink': drink,
-        'holder': None,
-        'started': False,
-        'timer': None,
-        'last_pass_time': 0,
-        'created_at': time.time(),
-    }
-
-    profile = models.get_profile(sender_session)
-    sender_name = profile['name'] if profile else 'Someone'
-    sender_photo = profile.get('photo_url') if profile else None
-    socketio.emit('bomb_incoming', {
-        'game_id': game_id,
-        'from_session': sender_session,
-        'from_name': sender_name,
-        'from_photo': sender_photo,
-        'mode': mode,
-        'drink': drink,
-    }, room=f'user_{to_session}')
-
-    emit('bomb_challenge_sent', {'game_id': game_id})
-    print(f"Bomb challenge: {sender_session[:8]} -> {to_session[:8]} ({mode})")
-
-@socketio.on('bomb_response')
-def handle_bomb_response(data):
-    """Handle accept/decline of a bomb challenge."""
-    game_id = data.get('game_id')
-    accepted = data.get('accepted', False)
-
-    game = bomb_games.get(game_id)
-    if not game:
-        return
-
-    if not accepted:
-        bomb_games.pop(game_id, None)
-        socketio.emit('bomb_declined', {
-            'game_id': game_id,
-            'from_session': game['session_b']
-        }, room=f'user_{game["session_a"]}')
-        print(f"Bomb challenge {game_id} declined")
-        return
-
-    # Start the game — challenger (session_a) holds the bomb first
-    game['started'] = True
-    game['holder'] = game['session_a']
-    game['last_pass_time'] = time.time()
+def start_bomb_game(game):
+    """Light the fuse — challenger (session_a) holds the bomb first."""
+    game_id = game.game_id
+    game.holder = game.session_a
+    game.last_pass_time = time.time()
 
     # Secret fuse timer: 8–15 seconds
     fuse_time = random.uniform(8.0, 15.0)
+    games.set_timer(game, scheduler.call_later(fuse_time, finish_bomb_game, game_id))
 
-    def explode():
-        if game_id in bomb_games:
-            finish_bomb_game(game_id)
+    start_data = game.payload(holder=game.holder)
+    _emit_to_players(game, 'bomb_start', start_data)
+    print(f"Bomb game {game_id} started (fuse: {fuse_time:.1f}s)")
 
-    timer = threading.Timer(fuse_time, explode)
-    game['timer'] = timer
-    timer.start()
+@on_socket_event('bomb_challenge')
+def handle_bomb_challenge(sid, data):
+    """Handle a Bomb Pass challenge."""
+    _handle_challenge(sid, 'bomb', data)
 
-    start_data = {
-        'game_id': game_id,
-        'session_a': game['session_a'],
-        'session_b': game['session_b'],
-        'mode': game['mode'],
-        'drink': game.get('drink', ''),
-        'holder': game['holder'],
-    }
-    socketio.emit('bomb_start', start_data, room=f'user_{game["session_a"]}')
-    socketio.emit('bomb_start', start_data, room=f'user_{game["session_b"]}')
-    print(f"Bomb game {game_id} started (fuse: {fuse_time:.1f}s)")
+@on_socket_event('bomb_response')
+def handle_bomb_response(sid, data):
+    """Handle accept/decline of a bomb challenge."""
+    _handle_response('bomb', data)
 
-@socketio.on('bomb_pass')
-def handle_bomb_pass(data):
+@on_socket_event('bomb_pass')
+def handle_bomb_pass(sid, data):
     """Handle a player passing the bomb."""
     game_id = data.get('game_id')
     session_id = data.get('session_id')
 
-    game = bomb_games.get(game_id)
-    if not game or not game.get('started'):
-        return
+    with games.locked(game_id):
+        game = games.get(game_id, 'bomb')
+        if not game or not game.started:
+            return
 
-    # Only the holder can pass
-    if game['holder'] != session_id:
-        return
+        # Only the holder can pass
+        if game.holder != session_id:
+            return
 
-    # Enforce 0.5s cooldown
-    now = time.time()
-    if now - game['last_pass_time'] < 0.5:
-        return
+        # Enforce 0.5s cooldown
+        now = time.time()
+        if now - game.last_pass_time < 0.5:
+            return
 
-    # Flip holder
-    game['holder'] = game['session_b'] if session_id == game['session_a'] else game['session_a']
-    game['last_pass_time'] = now
+        # Flip holder
+        game.holder = game.opponent(session_id)
+        game.last_pass_time = now
+        games.save(game)
 
     # Notify both users
-    pass_data = {
+    _emit_to_players(game, 'bomb_passed', {
         'game_id': game_id,
-        'holder': game['holder'],
-    }
-    socketio.emit('bomb_passed', pass_data, room=f'user_{game["session_a"]}')
-    socketio.emit('bomb_passed', pass_data, room=f'user_{game["session_b"]}')
+        'holder': game.holder,
+    })
 
 # ============== Tap Race ==============
 
+# tap_update is batched: taps only bump counters, and a tick sends at most
+# TAP_UPDATE_HZ combined updates per game per second. 0 = emit on every tap.
+TAP_UPDATE_HZ = float(os.environ.get('TAP_UPDATE_HZ', 10))
+
+_tap_dirty = set()       # game_ids with taps not yet broadcast
+_tap_tick_armed = False
+_tap_lock = threading.Lock()  # taps and the tick run on different threads under asgi.py
+
+def flush_tap_updates():
+    """Send one combined tap_update per game that changed since the last tick."""
+    global _tap_tick_armed
+    with _tap_lock:
+        _tap_tick_armed = False
+        dirty = list(_tap_dirty)
+        _tap_dirty.clear()
+    for game_id in dirty:
+        game = games.get(game_id, 'tap')
+        if game:
+            _emit_to_players(game, 'tap_update', {
+                'game_id': game_id,
+                'count_a': game.count_a,
+                'count_b': game.count_b,
+            })
+
+def queue_tap_update(game_id):
+    global _tap_tick_armed
+    with _tap_lock:
+        _tap_dirty.add(game_id)
+        arm = TAP_UPDATE_HZ > 0 and not _tap_tick_armed
+        if arm:
+            _tap_tick_armed = True
+    if TAP_UPDATE_HZ <= 0:
+        flush_tap_updates()
+    elif arm:
+        scheduler.call_later(1.0 / TAP_UPDATE_HZ, flush_tap_updates)
+
 def finish_tap_game(game_id):
     """Resolve a tap race — highest tap count wins."""
-    game = tap_games.pop(game_id, None)
+    game = games.pop(game_id, 'tap')
     if not game:
         return
+    with _tap_lock:
+        _tap_dirty.discard(game_id)  # exact counts go out in tap_result
 
-    if game.get('timer'):
-        game['timer'].cancel()
+    count_a = game.count_a
+    count_b = game.count_b
 
-    count_a = game['count_a']
-    count_b = game['count_b']
-
-    base = {
-        'game_id': game_id,
-        'session_a': game['session_a'],
-        'session_b': game['session_b'],
-        'mode': game['mode'],
-        'drink': game.get('drink', ''),
-        'count_a': count_a,
-        'count_b': count_b,
-    }
+    base = game.payload(count_a=count_a, count_b=count_b)
 
     if count_a == count_b:
-        for sess in [game['session_a'], game['session_b']]:
-            socketio.emit('tap_result', {
-                **base, 'result': 'draw',
-                'winner': None, 'loser': None,
-            }, room=f'user_{sess}')
+        _emit_to_players(game, 'tap_result', {
+            **base, 'result': 'draw',
+            'winner': None, 'loser': None,
+        })
     else:
-        winner = game['session_a'] if count_a > count_b else game['session_b']
-        loser = game['session_b'] if count_a > count_b else game['session_a']
+        winner = game.session_a if count_a > count_b else game.session_b
+        loser = game.opponent(winner)
         base['winner'] = winner
         base['loser'] = loser
 
-        socketio.emit('tap_result', {
+        transport.emit('tap_result', {
             **base, 'result': 'win',
-        }, room=f'user_{winner}')
-        socketio.emit('tap_result', {
+        }, to=f'user_{winner}')
+        transport.emit('tap_result', {
             **base, 'result': 'lose',
-        }, room=f'user_{loser}')
+        }, to=f'user_{loser}')
 
-    models.log_activity('game', f'Tap Race: {count_a} vs {count_b}', game['session_a'])
     if count_a == count_b:
         tap_winner, tap_loser, tap_result = None, None, 'draw'
     elif count_a > count_b:
-        tap_winner, tap_loser, tap_result = game['session_a'], game['session_b'], 'win_a'
+        tap_winner, tap_loser, tap_result = game.session_a, game.session_b, 'win_a'
     else:
-        tap_winner, tap_loser, tap_result = game['session_b'], game['session_a'], 'win_b'
-    models.save_game_result(
-        game_type='tap', session_a=game['session_a'], session_b=game['session_b'],
-        winner_session=tap_winner, loser_session=tap_loser, result=tap_result,
-        mode=game['mode'], details={'count_a': count_a, 'count_b': count_b}
+        tap_winner, tap_loser, tap_result = game.session_b, game.session_a, 'win_b'
+    _persist_result(
+        game, tap_winner, tap_loser, tap_result,
+        details={'count_a': count_a, 'count_b': count_b},
+        activity=f'Tap Race: {count_a} vs {count_b}',
     )
     print(f"Tap race {game_id}: A={count_a} B={count_b}")
 
-@socketio.on('tap_challenge')
-def handle_tap_challenge(data):
-    """Handle a Tap Race challenge."""
-    to_session = data.get('to_session')
-    mode = data.get('mode', 'fun')
-    drink = data.get('drink', '')
-
-    sender_session = get_sender_session()
-    if not all([sender_session, to_session]):
-        emit('tap_error', {'message': 'Invalid request'})
-        return
+def start_tap_game(game):
+    """Start the race after a 3s countdown."""
+    game_id = game.game_id
+    start_data = game.payload(duration=10, countdown=3)
+    _emit_to_players(game, 'tap_start', start_data)
 
-    if not models.is_user_online(to_session):
-        emit('tap_error', {'message': "They just left!"})
-        return
-
-    game_id = str(uuid.uuid4())[:8]
-
-    tap_games[game_id] = {
-        'session_a': sender_session,
-        'session_b': to_session,
-        'mode': mode,
-        'drink': drink,
-        'count_a': 0,
-        'count_b': 0,
-        'started': False,
-        'timer': None,
-        'last_tap_a': 0,
-        'last_tap_b': 0,
-        'created_at': time.time(),
-    }
+    # Set timer: 3s countdown + 10s game = 13s total
+    games.set_timer(game, scheduler.call_later(13.0, finish_tap_game, game_id))
 
-    profile = models.get_profile(sender_session)
-    sender_name = profile['name'] if profile else 'Someone'
-    sender_photo = profile.get('photo_url') if profile else None
-    socketio.emit('tap_incoming', {
-        'game_id': game_id,
-        'from_session': sender_session,
-        'from_name': sender_name,
-        'from_photo': sender_photo,
-        'mode': mode,
-        'drink': drink,
-    }, room=f'user_{to_session}')
+    print(f"Tap Race {game_id} started")
 
-    emit('tap_challenge_sent', {'game_id': game_id})
-    print(f"Tap Race challenge: {sender_session[:8]} -> {to_session[:8]} ({mode})")
+@on_socket_event('tap_challenge')
+def handle_tap_challenge(sid, data):
+    """Handle a Tap Race challenge."""
+    _handle_challenge(sid, 'tap', data)
 
-@socketio.on('tap_response')
-def handle_tap_response(data):
+@on_socket_event('tap_response')
+def handle_tap_response(sid, data):
     """Handle accept/decline of a tap race challenge."""
-    game_id = data.get('game_id')
-    accepted = data.get('accepted', False)
+    _handle_response('tap', data)
 
-    game = tap_games.get(game_id)
-    if not game:
-        return
-
-    if not accepted:
-        tap_games.pop(game_id, None)
-        socketio.emit('tap_declined', {
-            'game_id': game_id,
-            'from_session': game['session_b']
-        }, room=f'user_{game["session_a"]}')
-        print(f"Tap Race challenge {game_id} declined")
-        return
-
-    # Start the game after a 3s countdown
-    game['started'] = True
-
-    start_data = {
-        'game_id': game_id,
-        'session_a': game['session_a'],
-        'session_b': game['session_b'],
-        'mode': game['mode'],
-        'drink': game.get('drink', ''),
-        'duration': 10,
-        'countdown': 3,
-    }
-    socketio.emit('tap_start', start_data, room=f'user_{game["session_a"]}')
-    socketio.emit('tap_start', start_data, room=f'user_{game["session_b"]}')
-
-    # Set timer: 3s countdown + 10s game = 13s total
-    def end_game():
-        if game_id in tap_games:
-            finish_tap_game(game_id)
-
-    timer = threading.Timer(13.0, end_game)
-    game['timer'] = timer
-    timer.start()
-
-    print(f"Tap Race {game_id} started")
-
-@socketio.on('tap_tap')
-def handle_tap_tap(data):
+@on_socket_event('tap_tap')
+def handle_tap_tap(sid, data):
     """Handle a single tap from a player."""
     game_id = data.get('game_id')
     session_id = data.get('session_id')
 
-    game = tap_games.get(game_id)
-    if not game or not game.get('started'):
-        return
-
-    now = time.time()
-
-    # Rate limit: max ~20 taps/sec
-    if session_id == game['session_a']:
-        if now - game['last_tap_a'] < 0.05:
+    with games.locked(game_id):
+        game = games.get(game_id, 'tap')
+        if not game or not game.started:
             return
-        game['count_a'] += 1
-        game['last_tap_a'] = now
-    elif session_id == game['session_b']:
-        if now - game['last_tap_b'] < 0.05:
+
+        now = time.time()
+
+        # Rate limit: max ~20 taps/sec
+        if session_id == game.session_a:
+            if now - game.last_tap_a < 0.05:
+                return
+            game.count_a += 1
+            game.last_tap_a = now
+        elif session_id == game.session_b:
+            if now - game.last_tap_b < 0.05:
+                return
+            game.count_b += 1
+            game.last_tap_b = now
+        else:
             return
-        game['count_b'] += 1
-        game['last_tap_b'] = now
-    else:
-        return
+        games.save(game)
 
-    # Broadcast updated counts
-    update_data = {
-        'game_id': game_id,
-        'count_a': game['count_a'],
-        'count_b': game['count_b'],
-    }
-    socketio.emit('tap_update', update_data, room=f'user_{game["session_a"]}')
-    socketio.emit('tap_update', update_data, room=f'user_{game["session_b"]}')
+    # Broadcast updated counts on the next tick
+    queue_tap_update(game_id)
 
 # ============== 2 Truths 1 Lie ==============
 
 def finish_ttol_game(game_id):
     """Resolve a 2 Truths 1 Lie game."""
-    game = ttol_games.pop(game_id, None)
+    game = games.pop(game_id, 'ttol')
     if not game:
         return
 
-    if game.get('timer'):
-        game['timer'].cancel()
-
-    a_correct = game['guess_a'] is not None and game['guess_a'] == game['lie_index_b']
-    b_correct = game['guess_b'] is not None and game['guess_b'] == game['lie_index_a']
-
-    base = {
-        'game_id': game_id,
-        'session_a': game['session_a'],
-        'session_b': game['session_b'],
-        'mode': game['mode'],
-        'drink': game.get('drink', ''),
-        'statements_a': game['statements_a'],
-        'statements_b': game['statements_b'],
-        'lie_index_a': game['lie_index_a'],
-        'lie_index_b': game['lie_index_b'],
-        'guess_a': game['guess_a'],
-        'guess_b': game['guess_b'],
-        'a_correct': a_correct,
-        'b_correct': b_correct,
-    }
+    a_correct = game.guess_a is not None and game.guess_a == game.lie_index_b
+    b_correct = game.guess_b is not None and game.guess_b == game.lie_index_a
+
+    base = game.payload(
+        statements_a=game.statements_a,
+        statements_b=game.statements_b,
+        lie_index_a=game.lie_index_a,
+        lie_index_b=game.lie_index_b,
+        guess_a=game.guess_a,
+        guess_b=game.guess_b,
+        a_correct=a_correct,
+        b_correct=b_correct,
+    )
 
     if a_correct == b_correct:
-        for sess in [game['session_a'], game['session_b']]:
-            socketio.emit('ttol_result', {
-                **base, 'result': 'draw',
-                'winner': None, 'loser': None,
-            }, room=f'user_{sess}')
+        _emit_to_players(game, 'ttol_result', {
+            **base, 'result': 'draw',
+            'winner': None, 'loser': None,
+        })
     else:
-        winner = game['session_a'] if a_correct else game['session_b']
-        loser = game['session_b'] if a_correct else game['session_a']
-        socketio.emit('ttol_result', {
+        winner = game.session_a if a_correct else game.session_b
+        loser = game.opponent(winner)
+        transport.emit('ttol_result', {
             **base, 'result': 'win',
             'winner': winner, 'loser': loser,
-        }, room=f'user_{winner}')
-        socketio.emit('ttol_result', {
+        }, to=f'user_{winner}')
+        transport.emit('ttol_result', {
             **base, 'result': 'lose',
             'winner': winner, 'loser': loser,
-        }, room=f'user_{loser}')
+        }, to=f'user_{loser}')
 
     if a_correct == b_correct:
         ttol_winner, ttol_loser, ttol_result = None, None, 'draw'
     elif a_correct:
-        ttol_winner, ttol_loser, ttol_result = game['session_a'], game['session_b'], 'win_a'
+        ttol_winner, ttol_loser, ttol_result = game.session_a, game.session_b, 'win_a'
     else:
-        ttol_winner, ttol_loser, ttol_result = game['session_b'], game['session_a'], 'win_b'
-    models.save_game_result(
-        game_type='ttol', session_a=game['session_a'], session_b=game['session_b'],
-        winner_session=ttol_winner, loser_session=ttol_loser, result=ttol_result,
-        mode=game['mode'], details={'a_correct': a_correct, 'b_correct': b_correct}
+        ttol_winner, ttol_loser, ttol_result = game.session_b, game.session_a, 'win_b'
+    _persist_result(
+        game, ttol_winner, ttol_loser, ttol_result,
+        details={'a_correct': a_correct, 'b_correct': b_correct},
     )
     print(f"TTOL game {game_id}: A_correct={a_correct} B_correct={b_correct}")
 
 def start_guess_phase(game_id):
     """Transition from write phase to guess phase."""
-    game = ttol_games.get(game_id)
+    game = games.get(game_id, 'ttol')
     if not game:
         return
 
-    if game.get('timer'):
-        game['timer'].cancel()
-
-    game['phase'] = 'guess'
+    game.phase = 'guess'
+    games.save(game)
 
     # 60-second timeout for guess phase
     def guess_timeout():
-        if game_id in ttol_games and ttol_games[game_id]['phase'] == 'guess':
+        g = games.get(game_id, 'ttol')
+        if g and g.phase == 'guess':
             finish_ttol_game(game_id)
 
-    timer = threading.Timer(60.0, guess_timeout)
-    game['timer'] = timer
-    timer.start()
+    games.set_timer(game, scheduler.call_later(60.0, guess_timeout))
 
     # Send opponent's statements to each player
-    socketio.emit('ttol_guess_phase', {
+    transport.emit('ttol_guess_phase', {
         'game_id': game_id,
-        'statements': game['statements_b'],
-        'opponent_session': game['session_b'],
-    }, room=f'user_{game["session_a"]}')
+        'statements': game.statements_b,
+        'opponent_session': game.session_b,
+    }, to=f'user_{game.session_a}')
 
-    socketio.emit('ttol_guess_phase', {
+    transport.emit('ttol_guess_phase', {
         'game_id': game_id,
-        'statements': game['statements_a'],
-        'opponent_session': game['session_a'],
-    }, room=f'user_{game["session_b"]}')
+        'statements': game.statements_a,
+        'opponent_session': game.session_a,
+    }, to=f'user_{game.session_b}')
 
     print(f"TTOL game {game_id} entering guess phase")
 
-@socketio.on('ttol_challenge')
-def handle_ttol_challenge(data):
-    """Handle a 2 Truths 1 Lie challenge."""
-    to_session = data.get('to_session')
-    mode = data.get('mode', 'fun')
-    drink = data.get('drink', '')
-
-    sender_session = get_sender_session()
-    if not all([sender_session, to_session]):
-        emit('ttol_error', {'message': 'Invalid request'})
-        return
-
-    if not models.is_user_online(to_session):
-        emit('ttol_error', {'message': "They just left!"})
-        return
-
-    game_id = str(uuid.uuid4())[:8]
-
-    ttol_games[game_id] = {
-        'session_a': sender_session,
-        'session_b': to_session,
-        'mode': mode,
-        'drink': drink,
-        'started': False,
-        'timer': None,
-        'phase': 'write',
-        'statements_a': None,
-        'statements_b': None,
-        'lie_index_a': None,
-        'lie_index_b': None,
-        'guess_a': None,
-        'guess_b': None,
-        'created_at': time.time(),
-    }
-
-    profile = models.get_profile(sender_session)
-    sender_name = profile['name'] if profile else 'Someone'
-    sender_photo = profile.get('photo_url') if profile else None
-    socketio.emit('ttol_incoming', {
-        'game_id': game_id,
-        'from_session': sender_session,
-        'from_name': sender_name,
-        'from_photo': sender_photo,
-        'mode': mode,
-        'drink': drink,
-    }, room=f'user_{to_session}')
-
-    emit('ttol_challenge_sent', {'game_id': game_id})
-    print(f"TTOL challenge: {sender_session[:8]} -> {to_session[:8]} ({mode})")
-
-@socketio.on('ttol_response')
-def handle_ttol_response(data):
-    """Handle accept/decline of a TTOL challenge."""
-    game_id = data.get('game_id')
-    accepted = data.get('accepted', False)
-
-    game = ttol_games.get(game_id)
-    if not game:
-        return
-
-    if not accepted:
-        ttol_games.pop(game_id, None)
-        socketio.emit('ttol_declined', {
-            'game_id': game_id,
-            'from_session': game['session_b']
-        }, room=f'user_{game["session_a"]}')
-        print(f"TTOL challenge {game_id} declined")
-        return
-
-    # Start the write phase
-    game['started'] = True
-    game['phase'] = 'write'
+def start_ttol_game(game):
+    """Start the write phase."""
+    game_id = game.game_id
+    game.phase = 'write'
 
     # 90-second timeout for write phase
     def write_timeout():
-        if game_id not in ttol_games:
-            return
-        g = ttol_games.get(game_id)
-        if not g or g['phase'] != 'write':
-            return
-        if g['statements_a'] is None and g['statements_b'] is None:
-            ttol_games.pop(game_id, None)
-            for sess in [g['session_a'], g['session_b']]:
-                socketio.emit('ttol_result', {
+        with games.locked(game_id):
+            g = games.get(game_id, 'ttol')
+            if not g or g.phase != 'write':
+                return
+            if g.statements_a is None and g.statements_b is None:
+                games.pop(game_id)
+                _emit_to_players(g, 'ttol_result', {
                     'game_id': game_id, 'result': 'cancelled',
                     'message': 'Both players timed out!'
-                }, room=f'user_{sess}')
-        else:
-            if g['statements_a'] is None:
-                g['statements_a'] = ['(No response)', '(No response)', '(No response)']
-                g['lie_index_a'] = 0
-            if g['statements_b'] is None:
-                g['statements_b'] = ['(No response)', '(No response)', '(No response)']
-                g['lie_index_b'] = 0
-            start_guess_phase(game_id)
+                })
+            else:
+                if g.statements_a is None:
+                    g.statements_a = NO_RESPONSE
+                    g.lie_index_a = 0
+                if g.statements_b is None:
+                    g.statements_b = NO_RESPONSE
+                    g.lie_index_b = 0
+                games.save(g)
+                start_guess_phase(game_id)
+
+    games.set_timer(game, scheduler.call_later(90.0, write_timeout))
+
+    start_data = game.payload(phase='write')
+    _emit_to_players(game, 'ttol_start', start_data)
+    print(f"TTOL game {game_id} started (write phase)")
 
-    timer = threading.Timer(90.0, write_timeout)
-    game['timer'] = timer
-    timer.start()
+@on_socket_event('ttol_challenge')
+def handle_ttol_challenge(sid, data):
+    """Handle a 2 Truths 1 Lie challenge."""
+    _handle_challenge(sid, 'ttol', data)
 
-    start_data = {
-        'game_id': game_id,
-        'session_a': game['session_a'],
-        'session_b': game['session_b'],
-        'mode': game['mode'],
-        'drink': game.get('drink', ''),
-        'phase': 'write',
-    }
-    socketio.emit('ttol_start', start_data, room=f'user_{game["session_a"]}')
-    socketio.emit('ttol_start', start_data, room=f'user_{game["session_b"]}')
-    print(f"TTOL game {game_id} started (write phase)")
+@on_socket_event('ttol_response')
+def handle_ttol_response(sid, data):
+    """Handle accept/decline of a TTOL challenge."""
+    _handle_response('ttol', data)
 
-@socketio.on('ttol_submit')
-def handle_ttol_submit(data):
+@on_socket_event('ttol_submit')
+def handle_ttol_submit(sid, data):
     """Handle a player submitting their 3 statements and lie index."""
     game_id = data.get('game_id')
     session_id = data.get('session_id')
     statements = data.get('statements')
     lie_index = data.get('lie_index')
 
-    game = ttol_games.get(game_id)
-    if not game or not game.get('started') or game['phase'] != 'write':
-        return
-
     if not isinstance(statements, list) or len(statements) != 3:
         return
     if lie_index not in (0, 1, 2):
@@ -1313,49 +1403,98 @@ def handle_ttol_submit(data):
 
     statements = [str(s).strip()[:200] for s in statements]
     if any(len(s) == 0 for s in statements):
-        emit('ttol_error', {'message': 'All three statements are required'})
+        transport.emit('ttol_error', {'message': 'All three statements are required'}, to=sid)
         return
 
-    if session_id == game['session_a']:
-        game['statements_a'] = statements
-        game['lie_index_a'] = lie_index
-    elif session_id == game['session_b']:
-        game['statements_b'] = statements
-        game['lie_index_b'] = lie_index
-    else:
-        return
+    with games.locked(game_id):
+        game = games.get(game_id, 'ttol')
+        if not game or not game.started or game.phase != 'write':
+            return
+
+        if session_id == game.session_a:
+            game.statements_a = statements
+            game.lie_index_a = lie_index
+        elif session_id == game.session_b:
+            game.statements_b = statements
+            game.lie_index_b = lie_index
+        else:
+            return
+        games.save(game)
 
-    emit('ttol_waiting', {'game_id': game_id, 'phase': 'write'})
+        transport.emit('ttol_waiting', {'game_id': game_id, 'phase': 'write'}, to=sid)
 
-    if game['statements_a'] is not None and game['statements_b'] is not None:
-        start_guess_phase(game_id)
+        if game.statements_a is not None and game.statements_b is not None:
+            start_guess_phase(game_id)
 
-@socketio.on('ttol_guess')
-def handle_ttol_guess(data):
+@on_socket_event('ttol_guess')
+def handle_ttol_guess(sid, data):
     """Handle a player's guess of which statement is the lie."""
     game_id = data.get('game_id')
     session_id = data.get('session_id')
     guess = data.get('guess')
 
-    game = ttol_games.get(game_id)
-    if not game or game['phase'] != 'guess':
-        return
-
     if guess not in (0, 1, 2):
         return
 
-    if session_id == game['session_a']:
-        game['guess_a'] = guess
-    elif session_id == game['session_b']:
-        game['guess_b'] = guess
-    else:
-        return
+    with games.locked(game_id):
+        game = games.get(game_id, 'ttol')
+        if not game or game.phase != 'guess':
+            return
 
-    emit('ttol_waiting', {'game_id': game_id, 'phase': 'guess'})
+        if session_id == game.session_a:
+            game.guess_a = guess
+        elif session_id == game.session_b:
+            game.guess_b = guess
+        else:
+            return
+        games.save(game)
 
-    if game['guess_a'] is not None and game['guess_b'] is not None:
-        finish_ttol_game(game_id)
+        transport.emit('ttol_waiting', {'game_id': game_id, 'phase': 'guess'}, to=sid)
+
+        if game.guess_a is not None and game.guess_b is not None:
+            finish_ttol_game(game_id)
 
+# ============== Game Registry ==============
+
+NO_RESPONSE = ['(No response)', '(No response)', '(No response)']
+
+games.register(GameType(
+    'rps', 'RPS', RPSGame, start=start_rps_game, finish=finish_game,
+    state_fields=lambda g: {'choice_a': g.choice_a, 'choice_b': g.choice_b},
+))
+games.register(GameType('bomb', 'Bomb', BombGame, start=start_bomb_game, finish=finish_bomb_game))
+games.register(GameType(
+    'tap', 'Tap Race', TapGame, start=start_tap_game, finish=finish_tap_game,
+    state_fields=lambda g: {'count_a': g.count_a, 'count_b': g.count_b},
+))
+games.register(GameType(
+    'ttol', 'TTOL', TTOLGame, start=start_ttol_game, finish=finish_ttol_game,
+    state_fields=lambda g: {
+        'statements_a': g.statements_a or NO_RESPONSE, 'statements_b': g.statements_b or NO_RESPONSE,
+        'lie_index_a': g.lie_index_a, 'lie_index_b': g.lie_index_b,
+        'guess_a': g.guess_a, 'guess_b': g.guess_b, 'a_correct': False, 'b_correct': False,
+    },
+))
+
+# ============== Metrics ==============
+
+handler_metrics.gauge('connected_clients', 'Sessions with at least one socket.', lambda: len(connected_clients))
+handler_metrics.gauge('disconnect_timers', 'Sessions waiting out the reconnect grace period.',
+                      lambda: len(disconnect_timers))
+handler_metrics.gauge('active_games', 'In-flight games by type.', lambda: games.counts(), label='game_type')
+handler_metrics.gauge('pending_timers', 'Timers waiting in the scheduler.', lambda: scheduler.stats()['pending'])
+handler_metrics.gauge('db_pool_idle', 'Idle pooled database connections.', lambda: models.get_pool_stats()['idle'])
+handler_metrics.gauge('db_pool_in_use', 'Checked-out database connections.', lambda: models.get_pool_stats()['in_use'])
+handler_metrics.gauge('db_pool_waits', 'Checkouts that waited for a free connection since start.',
+                      lambda: models.get_pool_stats()['waits'])
+handler_metrics.gauge('hub_lag_p99_seconds', 'Heartbeat oversleep, p99 of the last minute.',
+                      lambda: round(hub_watchdog.stats()['p99_ms'] / 1000, 4))
+handler_metrics.gauge('hub_stalls', 'Heartbeats later than HUB_LAG_THRESHOLD since start.',
+                      lambda: hub_watchdog.stalls)
+
+if metrics.ENABLED:
+    handler_metrics.instrument_socketio(socketio)
+    handler_metrics.instrument_flask(app)
 
 if __name__ == '__main__':
     socketio.run(app, debug=True, host='0.0.0.0', port=5001, allow_unsafe_werkzeug=True)
@@ -0,0 +1,107 @@
+"""ASGI server mode: python-socketio's AsyncServer on a plain asyncio loop.
+
+    uvicorn asgi:app --host 0.0.0.0 --port $PORT --no-access-log
+
+The default server (app.py under gunicorn's eventlet worker) depends on
+eventlet's monkey-patching. This one doesn't. The event handlers, game
+rules and presence bookkeeping are app.py's: every Socket.IO event is
+handed to its handler (app.SOCKET_EVENTS) on a pool of HANDLER_THREADS
+threads. models.py's blocking SQLite calls run there, off the event loop,
+and a slow commit holds up only the event that made it. Events of one
+socket are still handled one at a time, in the order they arrived. The
+handlers reach our clients through _LoopTransport, which passes every emit
+and room change back to the loop.
+
+app.py's Flask app serves the pages, the profile API and the admin
+dashboard on a thread pool (a2wsgi); game and housekeeping timers fire on
+its scheduler thread. Those threads share app.py's in-memory state with
+the handler thread, which is why the stores it uses are locked.
+
+One worker only: the Redis-backed multi-worker mode (MESSAGE_QUEUE) isn't
+supported here.
+"""
+import os
+os.environ['SERVER_MODE'] = 'asgi'  # before app.py is imported: no eventlet monkey-patching
+
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+import socketio
+from a2wsgi import WSGIMiddleware
+
+import app as flask_side
+import metrics
+import sharedstate
+
+if sharedstate.enabled():
+    raise RuntimeError('asgi.py runs a single worker; unset MESSAGE_QUEUE or use the eventlet server')
+
+HTTP_THREADS = int(os.environ.get('HTTP_THREADS', 10))  # threads running Flask requests
+HANDLER_THREADS = int(os.environ.get('HANDLER_THREADS', 8))  # Socket.IO events handled at once
+
+sio = socketio.AsyncServer(async_mode='asgi', cors_allowed_origins='*', ping_timeout=60, ping_interval=25)
+
+_loop = None
+_handlers = ThreadPoolExecutor(max_workers=HANDLER_THREADS, thread_name_prefix='socket-events')
+_in_order = {}  # sid -> asyncio.Lock; FIFO, so each socket's events run in arrival order
+
+
+class _LoopTransport:
+    """app.py's transport here: emits and room changes run on the loop, in the order they were made."""
+
+    def emit(self, event, data=None, to=None):
+        self._submit(sio.emit(event, data, to=to))
+
+    def enter_room(self, sid, room):
+        self._submit(sio.enter_room(sid, room))
+
+    def leave_room(self, sid, room):
+        self._submit(sio.leave_room(sid, room))
+
+    def _submit(self, coro):
+        if _loop is None:
+            coro.close()  # not serving yet, so there is nobody to send to
+            return
+        asyncio.run_coroutine_threadsafe(coro, _loop)
+
+
+flask_side.transport = _LoopTransport()
+
+
+def _dispatch(event, handler):
+    """A coroutine handler for sio that runs app.py's handler(sid, data) on the handler threads."""
+    if metrics.ENABLED:
+        handler = flask_side.handler_metrics.wrap('socket', event, handler)
+
+    @functools.wraps(handler)
+    async def on_event(sid, data=None):
+        lock = _in_order.setdefault(sid, asyncio.Lock())
+        try:
+            async with lock:
+                return await _loop.run_in_executor(_handlers, handler, sid, data)
+        finally:
+            if event == 'disconnect':
+                _in_order.pop(sid, None)
+    return on_event
+
+
+for _event, _handler in flask_side.SOCKET_EVENTS.items():
+    if _event != 'connect':
+        sio.on(_event, _dispatch(_event, _handler))
+
+_on_connect = _dispatch('connect', flask_side.SOCKET_EVENTS['connect'])
+
+@sio.on('connect')
+async def handle_connect(sid, environ, auth=None):
+    await _on_connect(sid, auth)
+
+
+async def _startup():
+    global _loop
+    _loop = asyncio.get_running_loop()
+    flask_side.hub_watchdog.start_asyncio(_loop)
+
+
+app = socketio.ASGIApp(sio, other_asgi_app=WSGIMiddleware(flask_side.app, workers=HTTP_THREADS),
+                       on_startup=_startup)
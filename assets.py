@@ -0,0 +1,165 @@
+"""Fingerprinted, precompressed static assets.
+
+At startup every file under static/ (except user uploads and files that
+must keep a stable URL) is read once, named after a hash of its content
+and compressed with gzip and, when the brotli package is installed,
+brotli. JavaScript is minified first when rjsmin is installed (see
+minify_js). Templates link to them with asset_url('style.css'), which
+returns /assets/style.<hash>.css; those URLs never change content, so
+they are served with a one-year immutable Cache-Control.
+"""
+import gzip
+import hashlib
+import mimetypes
+import os
+
+from flask import Response, abort, request, url_for
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import rjsmin
+except ImportError:
+    rjsmin = None
+
+ASSET_URL = '/assets'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+COMPRESSIBLE = ('text/', 'application/javascript', 'application/json', 'image/svg+xml')
+STABLE_URLS = {'sw.js', 'manifest.json'}  # referenced by fixed URL from outside our templates
+SKIP_DIRS = {'uploads'}
+
+
+def minify_js(data):
+    """Transform for .js files: strip comments and whitespace (no-op without rjsmin)."""
+    if rjsmin is None:
+        return data
+    return rjsmin.jsmin(data.decode('utf-8')).encode('utf-8')
+
+
+class Asset:
+    __slots__ = ('name', 'hashed_name', 'mimetype', 'etag', 'mtime', 'variants')
+
+    def __init__(self, name, hashed_name, mimetype, etag, mtime, variants):
+        self.name = name
+        self.hashed_name = hashed_name
+        self.mimetype = mimetype
+        self.etag = etag
+        self.mtime = mtime
+        self.variants = variants  # encoding ('br', 'gzip', 'identity') -> bytes
+
+
+class AssetManifest:
+    """Logical name -> fingerprinted Asset, built from a static folder.
+
+    transforms maps a file extension to a function applied to the file's
+    bytes before hashing (e.g. a minifier).
+    """
+
+    def __init__(self, static_folder, transforms=None):
+        self.static_folder = static_folder
+        self.transforms = transforms or {}
+        self.auto_reload = False  # re-read changed files on lookup; init_app() follows app.debug
+        self._app = None
+        self._by_name = {}
+        self._by_hashed = {}
+
+    def build(self):
+        """(Re)build every asset. Returns the number of files processed."""
+        for root, dirs, files in os.walk(self.static_folder):
+            dirs[:] = [d for d in dirs if d not in SKIP_DIRS and not d.startswith('.')]
+            for filename in files:
+                path = os.path.join(root, filename)
+                name = os.path.relpath(path, self.static_folder).replace(os.sep, '/')
+                if name in STABLE_URLS or filename.startswith('.'):
+                    continue
+                self._load(name, path)
+        return len(self._by_name)
+
+    def _load(self, name, path):
+        with open(path, 'rb') as f:
+            data = f.read()
+        mtime = os.path.getmtime(path)
+        base, ext = os.path.splitext(name)
+        transform = self.transforms.get(ext)
+        if transform is not None:
+            data = transform(data)
+
+        digest = hashlib.sha256(data).hexdigest()[:12]
+        hashed_name = f'{base}.{digest}{ext}'
+        mimetype = mimetypes.guess_type(name)[0] or 'application/octet-stream'
+
+        variants = {'identity': data}
+        if mimetype.startswith(COMPRESSIBLE):
+            gz = gzip.compress(data, compresslevel=9, mtime=0)
+            if len(gz) < len(data):
+                variants['gzip'] = gz
+            if brotli is not None:
+                br = brotli.compress(data, quality=11)
+                if len(br) < len(data):
+                    variants['br'] = br
+
+        old = self._by_name.get(name)
+        if old is not None:
+            self._by_hashed.pop(old.hashed_name, None)
+        asset = Asset(name, hashed_name, mimetype, digest, mtime, variants)
+        self._by_name[name] = asset
+        self._by_hashed[hashed_name] = asset
+        return asset
+
+    def get(self, name):
+        asset = self._by_name.get(name)
+        if asset is not None and (self.auto_reload or (self._app is not None and self._app.debug)):
+            path = os.path.join(self.static_folder, name)
+            if os.path.exists(path) and os.path.getmtime(path) != asset.mtime:
+                asset = self._load(name, path)
+        return asset
+
+    def get_hashed(self, hashed_name):
+        return self._by_hashed.get(hashed_name)
+
+    def url(self, name):
+        """URL of an asset, falling back to the plain static URL for unknown files."""
+        asset = self.get(name)
+        if asset is None:
+            return url_for('static', filename=name)
+        return f'{ASSET_URL}/{asset.hashed_name}'
+
+    def urls(self):
+        """Every fingerprinted URL (for precaching)."""
+        return [self.url(name) for name in sorted(self._by_name)]
+
+    def stats(self) -> dict:
+        raw = sum(len(a.variants['identity']) for a in self._by_name.values())
+        best = sum(min(len(v) for v in a.variants.values()) for a in self._by_name.values())
+        return {'files': len(self._by_name), 'bytes': raw, 'compressed_bytes': best,
+                'brotli': brotli is not None, 'minify_js': rjsmin is not None}
+
+    def serve(self, hashed_name):
+        """Response for a fingerprinted URL, in the best encoding the client accepts."""
+        asset = self.get_hashed(hashed_name)
+        if asset is None:
+            abort(404)
+        if request.if_none_match.contains(asset.etag):
+            response = Response(status=304)
+        else:
+            for encoding in ('br', 'gzip', 'identity'):
+                if encoding in asset.variants and (encoding == 'identity' or request.accept_encodings[encoding] > 0):
+                    break
+            response = Response(asset.variants[encoding], mimetype=asset.mimetype)
+            if encoding != 'identity':
+                response.headers['Content-Encoding'] = encoding
+        response.set_etag(asset.etag)
+        response.headers['Cache-Control'] = IMMUTABLE
+        if len(asset.variants) > 1:
+            response.vary.add('Accept-Encoding')
+        return response
+
+    def init_app(self, app):
+        """Register the /assets route and the asset_url() template helper."""
+        self._app = app
+        app.add_url_rule(f'{ASSET_URL}/<path:hashed_name>', 'asset', self.serve)
+        app.add_template_global(self.url, 'asset_url')
+        self.build()
@@ -0,0 +1,270 @@
+"""Compare the eventlet and ASGI servers: concurrent connections and round-trip latency.
+
+Usage:
+    python benchmarks/bench_asgi.py [--servers eventlet,asgi] [--steps 250,500,1000,2000]
+                                    [--rate 200] [--seconds 15] [--slo-ms 100] [--out report.json]
+
+Each server is started the way loadtest.py starts it (gunicorn with one
+eventlet worker, or uvicorn asgi:app) in a throwaway copy of the tree. The
+number of open Socket.IO connections then rises step by step (--steps are
+totals; earlier connections stay open). At each step, with every connection
+held, --rate presence_sync requests per second go out over randomly chosen
+connections and each acknowledgement is timed.
+
+Per step the report has connect time p50/p99 and failures, probe latency
+p50/p95/p99 and failures, connections the server dropped, and the server's
+CPU share and resident memory. A server's capacity is the last step with
+under 1% failed connects and probes and a probe p99 within --slo-ms.
+
+The clients speak Engine.IO 4 over a raw websocket (asyncio and the
+websockets package), so one process holds thousands of them; raise
+`ulimit -n` above the largest step. gunicorn's eventlet worker accepts at
+most --worker-connections (1000 by default, as in the Procfile) clients at
+once. For gameplay latency under load, run loadtest.py --server asgi with
+an eventlet report as --baseline.
+"""
+import argparse
+import asyncio
+import itertools
+import json
+import random
+import time
+from datetime import datetime, timezone
+
+import websockets
+
+from loadtest import SERVER_LABELS, Server, git_commit, percentile
+
+CONNECT_TIMEOUT = 10.0
+PROBE_TIMEOUT = 5.0
+OPEN_CONCURRENCY = 50  # connection attempts in flight at once
+MAX_FAILURE_RATE = 0.01
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--servers', default='eventlet,asgi', help='server modes to compare, in order')
+    parser.add_argument('--steps', default='250,500,1000,2000', help='open connections per step')
+    parser.add_argument('--rate', type=float, default=200.0, help='probe requests per second')
+    parser.add_argument('--seconds', type=float, default=15.0, help='probing time per step')
+    parser.add_argument('--slo-ms', type=float, default=100.0, help='probe p99 budget')
+    parser.add_argument('--out', help='report path (default bench-asgi-<commit>.json)')
+    return parser.parse_args()
+
+
+class Connection:
+    """One Socket.IO client on a raw websocket: answers pings and matches acks to calls."""
+
+    def __init__(self):
+        self.ws = None
+        self.closed = False
+        self._ids = itertools.count(1)
+        self._acks = {}  # ack id -> future
+        self._reader = None
+
+    async def open(self, url):
+        self.ws = await websockets.connect(url, open_timeout=CONNECT_TIMEOUT, ping_interval=None, max_size=None)
+        if not (await self.ws.recv()).startswith('0'):  # Engine.IO handshake
+            raise ConnectionError('no Engine.IO handshake')
+        await self.ws.send('40')  # connect to the default namespace
+        while True:
+            packet = await self.ws.recv()
+            if packet.startswith('40'):
+                break
+            if packet.startswith('44'):
+                raise ConnectionError(packet)
+        self._reader = asyncio.create_task(self._read())
+
+    async def _read(self):
+        try:
+            async for packet in self.ws:
+                if packet == '2':
+                    await self.ws.send('3')
+                elif packet.startswith('43'):
+                    future = self._acks.pop(int(packet[2:packet.index('[')]), None)
+                    if future is not None and not future.done():
+                        future.set_result(None)
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.closed = True
+
+    async def call(self, event, data):
+        """Emit with an acknowledgement and wait for it."""
+        ack_id = next(self._ids)
+        future = self._acks[ack_id] = asyncio.get_running_loop().create_future()
+        await self.ws.send(f'42{ack_id}' + json.dumps([event, data]))
+        try:
+            await asyncio.wait_for(future, PROBE_TIMEOUT)
+        finally:
+            self._acks.pop(ack_id, None)
+
+    async def close(self):
+        if self.ws is not None:
+            await self.ws.close()
+        if self._reader is not None:
+            await self._reader
+
+
+def server_rss_mb(server):
+    try:
+        with open(f'/proc/{server.worker_pid()}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    return round(int(line.split()[1]) / 1024, 1)
+    except (OSError, IndexError, ValueError):
+        pass
+    return None
+
+
+async def open_connections(url, count, connections):
+    """Open count more connections. Returns (connect times in ms, failures)."""
+    times = []
+    failures = 0
+    limit = asyncio.Semaphore(OPEN_CONCURRENCY)
+
+    async def open_one():
+        nonlocal failures
+        async with limit:
+            connection = Connection()
+            start = time.perf_counter()
+            try:
+                await asyncio.wait_for(connection.open(url), CONNECT_TIMEOUT)
+            except (OSError, asyncio.TimeoutError, ConnectionError, websockets.WebSocketException):
+                failures += 1
+                return
+            times.append((time.perf_counter() - start) * 1000)
+            connections.append(connection)
+
+    await asyncio.gather(*(open_one() for _ in range(count)))
+    return times, failures
+
+
+async def probe(connections, rate, seconds):
+    """Send presence_sync calls at `rate` per second. Returns (latencies in ms, failures)."""
+    latencies = []
+    failures = 0
+    tasks = []
+
+    async def probe_one(connection):
+        nonlocal failures
+        start = time.perf_counter()
+        try:
+            await connection.call('presence_sync', {})
+            latencies.append((time.perf_counter() - start) * 1000)
+        except (asyncio.TimeoutError, websockets.ConnectionClosed):
+            failures += 1
+
+    interval = 1.0 / rate
+    next_at = time.perf_counter()
+    deadline = next_at + seconds
+    while next_at < deadline:
+        connection = random.choice(connections)
+        if connection.closed:
+            failures += 1
+        else:
+            tasks.append(asyncio.create_task(probe_one(connection)))
+        next_at += interval
+        await asyncio.sleep(max(0.0, next_at - time.perf_counter()))
+    await asyncio.gather(*tasks)
+    return latencies, failures
+
+
+def summary(samples):
+    return {'count': len(samples), 'p50': round(percentile(samples, 50), 2),
+            'p95': round(percentile(samples, 95), 2), 'p99': round(percentile(samples, 99), 2)}
+
+
+async def run_server(server, steps, args):
+    url = server.url.replace('http://', 'ws://') + '/socket.io/?EIO=4&transport=websocket'
+    connections = []
+    results = []
+    try:
+        for target in steps:
+            connect_ms, connect_failures = await open_connections(url, target - len(connections), connections)
+            cpu_before = server.worker_cpu_seconds()
+            started = time.perf_counter()
+            latencies, probe_failures = await probe(connections, args.rate, args.seconds)
+            elapsed = time.perf_counter() - started
+            cpu_after = server.worker_cpu_seconds()
+            step = {
+                'target': target,
+                'open': sum(1 for c in connections if not c.closed),
+                'dropped': sum(1 for c in connections if c.closed),
+                'connect_failures': connect_failures,
+                'connect_ms': summary(connect_ms),
+                'probe_failures': probe_failures,
+                'probe_ms': summary(latencies),
+                'server_cpu': (round((cpu_after - cpu_before) / elapsed, 3)
+                               if cpu_before is not None and cpu_after is not None else None),
+                'server_rss_mb': server_rss_mb(server),
+            }
+            results.append(step)
+            print_step(step)
+            connections = [c for c in connections if not c.closed]
+    finally:
+        await asyncio.gather(*(c.close() for c in connections), return_exceptions=True)
+    return results
+
+
+def capacity(steps, slo_ms):
+    """The largest step the server handled within the failure and latency budgets (0 if none)."""
+    best = 0
+    for step in steps:
+        attempted = max(step['connect_ms']['count'] + step['connect_failures'], 1)
+        probes = max(step['probe_ms']['count'] + step['probe_failures'], 1)
+        if (step['connect_failures'] / attempted > MAX_FAILURE_RATE
+                or step['probe_failures'] / probes > MAX_FAILURE_RATE
+                or step['probe_ms']['p99'] > slo_ms):
+            break
+        best = step['target']
+    return best
+
+
+def print_step(step):
+    cpu = f"{step['server_cpu']:.0%}" if step['server_cpu'] is not None else 'n/a'
+    print(f"{step['target']:>7}{step['open']:>7}{step['connect_failures']:>7}{step['dropped']:>7}"
+          f"{step['connect_ms']['p50']:>9.1f}{step['connect_ms']['p99']:>9.1f}"
+          f"{step['probe_ms']['p50']:>9.1f}{step['probe_ms']['p95']:>9.1f}{step['probe_ms']['p99']:>9.1f}"
+          f"{step['probe_failures']:>7}{cpu:>7}{step['server_rss_mb'] or 0:>8.0f}")
+
+
+def main():
+    args = parse_args()
+    steps = [int(s) for s in args.steps.split(',')]
+    modes = args.servers.split(',')
+    commit = git_commit()
+
+    results = {}
+    for mode in modes:
+        server = Server(mode)
+        server.start()
+        print(f'\n== {SERVER_LABELS[mode]} ({server.url}, log {server.log_path})')
+        print(f"{'conns':>7}{'open':>7}{'failed':>7}{'drop':>7}{'conn50':>9}{'conn99':>9}"
+              f"{'rtt50':>9}{'rtt95':>9}{'rtt99':>9}{'pfail':>7}{'cpu':>7}{'rss MB':>8}")
+        try:
+            results[mode] = asyncio.run(run_server(server, steps, args))
+        finally:
+            server.stop()
+
+    report = {
+        'commit': commit,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'config': {'steps': steps, 'rate': args.rate, 'seconds': args.seconds, 'slo_ms': args.slo_ms,
+                   'servers': {mode: SERVER_LABELS[mode] for mode in modes}},
+        'servers': {mode: {'steps': steps_, 'capacity': capacity(steps_, args.slo_ms)}
+                    for mode, steps_ in results.items()},
+    }
+    out = args.out or f'bench-asgi-{commit}.json'
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    print()
+    for mode, result in report['servers'].items():
+        print(f"{SERVER_LABELS[mode]:<26} capacity {result['capacity']} connections "
+              f"(p99 <= {args.slo_ms:.0f} ms, < {MAX_FAILURE_RATE:.0%} failures)")
+    print(f'report: {out}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,117 @@
+"""Benchmark hub stalls caused by SQLite calls, with and without the DB executor.
+
+Usage:
+    python benchmarks/bench_hub_stall.py [--executor tpool|inline] [--guests 50]
+                                         [--seconds 10] [--hold-ms 200]
+
+Runs the app in-process in a throwaway working directory. Green threads play
+guests hammering models.py (create_message commits, message and profile
+reads, the admin activity feed) while a separate process keeps grabbing the
+database write lock for --hold-ms every second, the way a second worker, a
+backup or a long WAL checkpoint would. A heartbeat green thread sleeps 10 ms
+at a time; how much it oversleeps is how long the hub was blocked. Use
+--executor inline to measure calling SQLite directly on the hub.
+"""
+import argparse
+import os
+import subprocess
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+# Holds the write lock for HOLD seconds, then lets go for the rest of the second
+LOCKER = """
+import sqlite3, sys, time
+hold = float(sys.argv[1])
+conn = sqlite3.connect('shamrock.db', isolation_level=None, timeout=30)
+while True:
+    conn.execute('BEGIN IMMEDIATE')
+    conn.execute("INSERT INTO settings (key, value) VALUES ('bench_lock', '1') "
+                 "ON CONFLICT(key) DO UPDATE SET value = value + 1")
+    time.sleep(hold)
+    conn.execute('COMMIT')
+    time.sleep(max(0.0, 1.0 - hold))
+"""
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--executor', choices=('tpool', 'inline'), default='tpool')
+    parser.add_argument('--guests', type=int, default=50)
+    parser.add_argument('--seconds', type=float, default=10.0)
+    parser.add_argument('--hold-ms', type=float, default=200.0, help='write lock hold time (0 = no contention)')
+    return parser.parse_args()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * pct / 100), len(values) - 1)]
+
+
+def main():
+    args = parse_args()
+    os.environ['DB_EXECUTOR'] = args.executor
+    os.chdir(tempfile.mkdtemp(prefix='shamrock-bench-'))
+    sys.path.insert(0, ROOT)
+    import app as shamrock  # noqa: E402 — env and cwd must be set first
+
+    socketio, models = shamrock.socketio, shamrock.models
+    sleep = socketio.sleep
+
+    sessions = [f'bench-{i:05d}' for i in range(args.guests)]
+    for i, session_id in enumerate(sessions):
+        models.create_profile(session_id, f'P{i}')
+
+    locker = None
+    if args.hold_ms > 0:
+        locker = subprocess.Popen([sys.executable, '-c', LOCKER, str(args.hold_ms / 1000)])
+        time.sleep(0.5)
+
+    lags = []
+    commits = []
+    calls = [0]
+    running = True
+
+    def heartbeat():
+        while running:
+            start = time.perf_counter()
+            sleep(0.01)
+            lags.append((time.perf_counter() - start - 0.01) * 1000)
+
+    def guest(index):
+        me, other = sessions[index], sessions[(index + 1) % len(sessions)]
+        while running:
+            start = time.perf_counter()
+            message_id = models.create_message(me, other, 'drink', 'Guinness')
+            commits.append((time.perf_counter() - start) * 1000)
+            models.get_message(message_id)
+            models.get_profiles([me, other])
+            if index % 10 == 0:
+                models.get_recent_activity(30)
+            calls[0] += 4
+            sleep(0.05)
+
+    socketio.start_background_task(heartbeat)
+    for i in range(len(sessions)):
+        socketio.start_background_task(guest, i)
+    started = time.perf_counter()
+    sleep(args.seconds)
+    running = False
+    elapsed = time.perf_counter() - started
+    sleep(0.5)
+    if locker is not None:
+        locker.terminate()
+
+    print(f'executor={models.DB_EXECUTOR} guests={args.guests} seconds={elapsed:.1f} hold={args.hold_ms:g}ms')
+    print(f'db calls/sec          {calls[0] / elapsed:10.0f}')
+    print(f'create_message p50/p99 {percentile(commits, 50):.1f} / {percentile(commits, 99):.1f} ms')
+    print(f'hub lag p50/p99/max    {percentile(lags, 50):.1f} / {percentile(lags, 99):.1f} / {max(lags or [0]):.1f} ms')
+    print(f'heartbeats > 50 ms     {sum(1 for lag in lags if lag > 50)} of {len(lags)}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,104 @@
+"""Benchmark history queries against row count, with and without the migration indexes.
+
+Usage:
+    python benchmarks/bench_queries.py [--rows 1000,10000,100000] [--repeat 50]
+
+Builds a throwaway SQLite database per row count, migrates it to the
+pre-index schema (version 2) and to the latest schema, fills it with
+synthetic messages / game results / activity, and prints the mean time
+per query in milliseconds.
+"""
+import argparse
+import os
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+import models  # noqa: E402
+
+USERS = 500
+PRE_INDEX_VERSION = 2
+
+QUERIES = {
+    'get_user_messages': (
+        'SELECT * FROM messages WHERE from_session = ? OR to_session = ? ORDER BY created_at DESC LIMIT 50',
+        lambda s: (s, s),
+    ),
+    'get_user_game_results': (
+        'SELECT * FROM game_results WHERE session_a = ? OR session_b = ? ORDER BY created_at DESC LIMIT 50',
+        lambda s: (s, s),
+    ),
+    'get_drink_stats': (
+        "SELECT content AS drink_name, COUNT(*) AS count FROM messages WHERE message_type = 'drink' "
+        'GROUP BY content ORDER BY count DESC LIMIT 10',
+        lambda s: (),
+    ),
+    'get_recent_activity': (
+        'SELECT * FROM activity_log ORDER BY created_at DESC LIMIT 50',
+        lambda s: (),
+    ),
+}
+
+
+def build_db(path, rows, schema_version):
+    conn = sqlite3.connect(path)
+    conn.row_factory = sqlite3.Row
+    models.run_migrations(conn, target=schema_version)
+
+    rnd = random.Random(42)
+    sessions = [f'session-{i:04d}' for i in range(USERS)]
+    drinks = ['Guinness', 'Mojito', 'IPA', 'Cola', 'Negroni', 'Cider']
+
+    def ts(i):
+        return f'2026-01-01 {i // 3600 % 24:02d}:{i // 60 % 60:02d}:{i % 60:02d}'
+
+    conn.executemany(
+        'INSERT INTO messages (from_session, to_session, message_type, content, status, created_at) VALUES (?, ?, ?, ?, ?, ?)',
+        ((rnd.choice(sessions), rnd.choice(sessions), rnd.choice(['drink', 'message']),
+          rnd.choice(drinks), 'pending', ts(i)) for i in range(rows)))
+    conn.executemany(
+        'INSERT INTO game_results (game_type, session_a, session_b, result, created_at) VALUES (?, ?, ?, ?, ?)',
+        ((rnd.choice(['rps', 'bomb', 'tap', 'ttol']), rnd.choice(sessions), rnd.choice(sessions),
+          'draw', ts(i)) for i in range(rows)))
+    conn.executemany(
+        'INSERT INTO activity_log (event_type, description, session_id, created_at) VALUES (?, ?, ?, ?)',
+        (('join', 'someone came online', rnd.choice(sessions), ts(i)) for i in range(rows)))
+    conn.commit()
+    conn.execute('ANALYZE')
+    return conn, sessions
+
+
+def time_query(conn, sql, params_for, sessions, repeat):
+    rnd = random.Random(7)
+    start = time.perf_counter()
+    for _ in range(repeat):
+        conn.execute(sql, params_for(rnd.choice(sessions))).fetchall()
+    return (time.perf_counter() - start) / repeat * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--rows', default='1000,10000,100000')
+    parser.add_argument('--repeat', type=int, default=50)
+    args = parser.parse_args()
+    row_counts = [int(r) for r in args.rows.split(',')]
+
+    print(f"{'query':<24}{'rows':>10}{'no index (ms)':>16}{'indexed (ms)':>16}{'speedup':>10}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for rows in row_counts:
+            results = {}
+            for label, version in (('plain', PRE_INDEX_VERSION), ('indexed', None)):
+                conn, sessions = build_db(os.path.join(tmp, f'{label}-{rows}.db'), rows, version)
+                results[label] = {name: time_query(conn, sql, params, sessions, args.repeat)
+                                  for name, (sql, params) in QUERIES.items()}
+                conn.close()
+            for name in QUERIES:
+                plain, indexed = results['plain'][name], results['indexed'][name]
+                print(f'{name:<24}{rows:>10}{plain:>16.3f}{indexed:>16.3f}{plain / indexed:>9.1f}x')
+
+
+if __name__ == '__main__':
+    main()
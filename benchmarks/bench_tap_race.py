@@ -0,0 +1,106 @@
+"""Load benchmark for Tap Race: many concurrent races, players tapping flat out.
+
+Usage:
+    python benchmarks/bench_tap_race.py [--races 50] [--seconds 5] [--hz 10]
+
+Runs the app in-process with Flask-SocketIO test clients (one per player) in
+a throwaway working directory. Each player taps at the client's 20 taps/sec
+limit. Reports server tap_update emits per second and event-loop lag, measured
+as the oversleep of a 10 ms heartbeat. Use --hz 0 to measure the old
+emit-on-every-tap behaviour.
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--races', type=int, default=50)
+    parser.add_argument('--seconds', type=float, default=5.0)
+    parser.add_argument('--hz', type=float, default=10.0, help='TAP_UPDATE_HZ (0 = emit per tap)')
+    return parser.parse_args()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * pct / 100), len(values) - 1)]
+
+
+def main():
+    args = parse_args()
+    os.environ['TAP_UPDATE_HZ'] = str(args.hz)
+    os.chdir(tempfile.mkdtemp(prefix='shamrock-bench-'))
+    sys.path.insert(0, ROOT)
+    import app as shamrock  # noqa: E402 — env and cwd must be set first
+
+    app, socketio, models = shamrock.app, shamrock.socketio, shamrock.models
+    sleep = socketio.sleep
+
+    players = []
+    for i in range(args.races * 2):
+        session_id = f'bench-{i:05d}'
+        models.create_profile(session_id, f'P{i}')
+        client = socketio.test_client(app)
+        client.emit('go_online', {'session_id': session_id})
+        players.append((session_id, client))
+
+    game_ids = []
+    for i in range(0, len(players), 2):
+        (sess_a, client_a), (sess_b, client_b) = players[i], players[i + 1]
+        client_a.emit('tap_challenge', {'to_session': sess_b})
+        game_id = next(e['args'][0]['game_id'] for e in client_a.get_received()
+                       if e['name'] == 'tap_challenge_sent')
+        client_b.emit('tap_response', {'game_id': game_id, 'accepted': True})
+        game_ids.append(game_id)
+    for _, client in players:
+        client.get_received()
+
+    lags = []
+    running = True
+
+    def heartbeat():
+        while running:
+            start = time.perf_counter()
+            sleep(0.01)
+            lags.append((time.perf_counter() - start - 0.01) * 1000)
+
+    taps = [0]
+    finished = [0]
+
+    def tapper(session_id, client, game_id):
+        deadline = time.perf_counter() + args.seconds
+        while time.perf_counter() < deadline:
+            client.emit('tap_tap', {'game_id': game_id, 'session_id': session_id})
+            taps[0] += 1
+            sleep(0.05)
+        finished[0] += 1
+
+    socketio.start_background_task(heartbeat)
+    started = time.perf_counter()
+    for i, (sess, client) in enumerate(players):
+        socketio.start_background_task(tapper, sess, client, game_ids[i // 2])
+    while finished[0] < len(players):
+        sleep(0.05)
+    elapsed = time.perf_counter() - started
+    sleep(0.2)  # let the last tick fire
+    running = False
+
+    updates = sum(1 for _, client in players for e in client.get_received() if e['name'] == 'tap_update')
+    for game_id in game_ids:
+        shamrock.finish_tap_game(game_id)
+
+    print(f'races={args.races} players={len(players)} seconds={elapsed:.1f} TAP_UPDATE_HZ={args.hz:g}')
+    print(f'taps/sec            {taps[0] / elapsed:10.0f}')
+    print(f'tap_update emits/sec {updates / elapsed:9.0f}')
+    print(f'loop lag p50/p99/max {percentile(lags, 50):.1f} / {percentile(lags, 99):.1f} / {max(lags or [0]):.1f} ms')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,523 @@
+"""Load test: simulated guests driving every Socket.IO event against a real server.
+
+Usage:
+    python benchmarks/loadtest.py [--steps 5,10,25,50] [--seconds 40] [--procs 4]
+                                  [--server eventlet|asgi] [--url http://127.0.0.1:5001]
+                                  [--out report.json] [--baseline older-report.json]
+
+Unless --url is given, a copy of the app is started in a throwaway directory:
+with --server eventlet (the default) the way the Procfile runs it, gunicorn
+with one eventlet worker; with --server asgi under uvicorn (asgi.py). Guests come
+in pairs. Each guest uploads a profile photo through /api/profile and goes
+online, then each pair loops through a drink offer (send_message /
+respond_message) and a full game of RPS, Two Truths One Lie, Tap Race and
+Bomb Pass. Every emit asks for an acknowledgement, so its latency is the
+round trip through the server's handler.
+
+The load rises step by step (--steps, in pairs). For each step the report has
+p50/p95/p99 latency per event type, client and server emits per second, the
+error count and, for a server started here, the worker's CPU use. The worker
+is saturated at the first step where throughput stops growing with the load,
+p95 breaks --slo-ms or more than 1% of emits fail.
+
+The JSON report carries REPORT_VERSION and the git commit it was run on;
+pass an older report as --baseline to print the p95 change per event (e.g.
+an eventlet run as the baseline of an asgi run).
+The load generator runs in --procs processes on the same machine, so leave
+the server some CPU. Needs the Socket.IO client: pip install "python-socketio[client]".
+"""
+import argparse
+import collections
+import io
+import json
+import os
+import random
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+
+import requests
+import socketio
+from PIL import Image
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+REPORT_VERSION = 1
+EXPECT_TIMEOUT = 20.0    # seconds to wait for a server event (a tap race takes 13)
+TAP_INTERVAL = 0.05      # the client's 20 taps/sec limit
+BOMB_COOLDOWN = 0.55     # the server ignores passes within 0.5s
+GROWTH_FLOOR = 0.5       # throughput must grow by half the load growth to count as scaling
+
+# How each server mode is started ({port} is filled in); run from a copy of the tree
+SERVER_COMMANDS = {
+    'eventlet': ['-m', 'gunicorn', '--worker-class', 'eventlet', '-w', '1', '--bind', '127.0.0.1:{port}', 'app:app'],
+    'asgi': ['-m', 'uvicorn', 'asgi:app', '--host', '127.0.0.1', '--port', '{port}', '--no-access-log'],
+}
+SERVER_LABELS = {'eventlet': 'gunicorn eventlet -w 1', 'asgi': 'uvicorn asgi:app'}
+
+
+def parse_args():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--steps', default='5,10,25,50', help='pairs of guests per step')
+    parser.add_argument('--seconds', type=float, default=40.0, help='length of each step')
+    parser.add_argument('--procs', type=int, default=min(4, os.cpu_count() or 1),
+                        help='load generator processes')
+    parser.add_argument('--server', choices=sorted(SERVER_COMMANDS), default='eventlet',
+                        help='how to start the server under test')
+    parser.add_argument('--url', help='test a running server instead of starting one')
+    parser.add_argument('--slo-ms', type=float, default=250.0, help='p95 latency budget')
+    parser.add_argument('--out', help='report path (default loadtest-<commit>.json)')
+    parser.add_argument('--baseline', help='earlier report to compare against')
+    return parser.parse_args()
+
+
+def percentile(values, pct):
+    if not values:
+        return 0.0
+    values = sorted(values)
+    return values[min(int(len(values) * pct / 100), len(values) - 1)]
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=ROOT,
+                                       stderr=subprocess.DEVNULL, text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return 'unknown'
+
+
+# ============== Simulated guests ==============
+
+class Timeout(Exception):
+    pass
+
+
+class Stats:
+    """Latency samples and counters of one load generator process."""
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.latency = collections.defaultdict(list)  # event -> [ms]
+        self.errors = collections.Counter()            # event -> failed emits / missed replies
+        self.sent = 0
+        self.received = 0
+
+    def record(self, event, ms):
+        with self.lock:
+            self.latency[event].append(ms)
+            self.sent += 1
+
+    def error(self, event):
+        with self.lock:
+            self.errors[event] += 1
+
+    def to_dict(self):
+        return {'latency': dict(self.latency), 'errors': dict(self.errors),
+                'sent': self.sent, 'received': self.received}
+
+
+def make_photo(seed):
+    """A noisy JPEG, so every guest's upload really gets decoded and resized."""
+    rnd = random.Random(seed)
+    image = Image.effect_noise((320, 320), 40).convert('RGB')
+    image.paste((rnd.randrange(256), rnd.randrange(256), rnd.randrange(256)), (0, 0, 160, 160))
+    buf = io.BytesIO()
+    image.save(buf, 'JPEG', quality=85)
+    return buf.getvalue()
+
+
+class Guest:
+    """One browser: a Socket.IO client plus an inbox of the events it received."""
+
+    def __init__(self, url, session_id, stats):
+        self.url = url
+        self.session_id = session_id
+        self.stats = stats
+        self.client = socketio.Client(reconnection=False)
+        self.client.on('*', self._receive)
+        self._inbox = collections.deque(maxlen=500)
+        self._cond = threading.Condition()
+
+    def _receive(self, event, data=None):
+        with self._cond:
+            self._inbox.append((event, data or {}))
+            self._cond.notify_all()
+        with self.stats.lock:
+            self.stats.received += 1
+
+    def check_in(self, name, photo):
+        start = time.perf_counter()
+        r = requests.post(self.url + '/api/profile', data={'session_id': self.session_id, 'name': name},
+                          files={'photo': ('photo.jpg', photo, 'image/jpeg')}, timeout=EXPECT_TIMEOUT)
+        if r.status_code != 200:
+            self.stats.error('http_profile')
+            raise Timeout('http_profile')
+        self.stats.record('http_profile', (time.perf_counter() - start) * 1000)
+
+        start = time.perf_counter()
+        self.client.connect(self.url, transports=['websocket'], wait_timeout=EXPECT_TIMEOUT)
+        self.stats.record('connect', (time.perf_counter() - start) * 1000)
+        self.call('go_online', {'session_id': self.session_id})
+        self.expect('online_success')
+
+    def call(self, event, data):
+        """Emit and wait for the server's acknowledgement; records the round trip."""
+        start = time.perf_counter()
+        try:
+            self.client.call(event, data, timeout=EXPECT_TIMEOUT)
+        except (socketio.exceptions.TimeoutError, socketio.exceptions.BadNamespaceError):
+            self.stats.error(event)
+            raise Timeout(event)
+        self.stats.record(event, (time.perf_counter() - start) * 1000)
+
+    def _take(self, event, game_id):
+        for i, (name, data) in enumerate(self._inbox):
+            if name == event and (game_id is None or data.get('game_id') == game_id):
+                del self._inbox[i]
+                return data
+        return None
+
+    def expect(self, event, game_id=None, timeout=EXPECT_TIMEOUT, required=True):
+        """Wait for an event from the server (optionally for one game)."""
+        deadline = time.monotonic() + timeout
+        with self._cond:
+            while True:
+                data = self._take(event, game_id)
+                remaining = deadline - time.monotonic()
+                if data is not None or remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+        if data is None and required:
+            self.stats.error(event)
+            raise Timeout(event)
+        return data
+
+    def seen(self, event, game_id):
+        with self._cond:
+            return any(n == event and d.get('game_id') == game_id for n, d in self._inbox)
+
+    def leave(self):
+        if self.client.connected:
+            try:
+                self.call('checkout', {'session_id': self.session_id})
+            except Timeout:
+                pass
+            self.client.disconnect()
+
+
+# ============== Scenarios ==============
+
+def offer_drink(a, b):
+    a.call('send_message', {'to_session': b.session_id, 'content': 'Guinness', 'message_type': 'drink'})
+    message = b.expect('incoming_message')
+    b.call('respond_message', {'message_id': message['message_id'], 'response': 'accepted',
+                               'from_session': a.session_id})
+    a.expect('message_response')
+
+
+def start_game(game_type, a, b):
+    """Challenge, accept and wait for both players to see the start. Returns the game_id."""
+    a.call(f'{game_type}_challenge', {'to_session': b.session_id, 'mode': 'fun'})
+    game_id = a.expect(f'{game_type}_challenge_sent')['game_id']
+    b.expect(f'{game_type}_incoming', game_id)
+    b.call(f'{game_type}_response', {'game_id': game_id, 'accepted': True})
+    a.expect(f'{game_type}_start', game_id)
+    b.expect(f'{game_type}_start', game_id)
+    return game_id
+
+
+def play_rps(a, b):
+    game_id = start_game('rps', a, b)
+    for guest in (a, b):
+        guest.call('rps_choice', {'game_id': game_id, 'session_id': guest.session_id,
+                                  'choice': random.choice(('rock', 'paper', 'scissors'))})
+    a.expect('rps_result', game_id)
+    b.expect('rps_result', game_id)
+
+
+def play_ttol(a, b):
+    game_id = start_game('ttol', a, b)
+    for guest in (a, b):
+        guest.call('ttol_submit', {'game_id': game_id, 'session_id': guest.session_id,
+                                   'statements': ['I ran a marathon', 'I have a cat', 'I met the Pope'],
+                                   'lie_index': random.randrange(3)})
+    a.expect('ttol_guess_phase', game_id)
+    b.expect('ttol_guess_phase', game_id)
+    for guest in (a, b):
+        guest.call('ttol_guess', {'game_id': game_id, 'session_id': guest.session_id,
+                                  'guess': random.randrange(3)})
+    a.expect('ttol_result', game_id)
+    b.expect('ttol_result', game_id)
+
+
+def play_tap(a, b):
+    game_id = start_game('tap', a, b)
+    time.sleep(3.0)  # countdown
+    while not a.seen('tap_result', game_id):
+        for guest in (a, b):
+            guest.call('tap_tap', {'game_id': game_id, 'session_id': guest.session_id})
+        time.sleep(TAP_INTERVAL)
+    a.expect('tap_result', game_id)
+    b.expect('tap_result', game_id)
+
+
+def play_bomb(a, b):
+    game_id = start_game('bomb', a, b)
+    holder, other = a, b  # the challenger holds the bomb first
+    while not a.seen('bomb_result', game_id):
+        time.sleep(BOMB_COOLDOWN)
+        holder.call('bomb_pass', {'game_id': game_id, 'session_id': holder.session_id})
+        if holder.expect('bomb_passed', game_id, timeout=2.0, required=False):
+            other.expect('bomb_passed', game_id, timeout=2.0, required=False)
+            holder, other = other, holder
+    a.expect('bomb_result', game_id)
+    b.expect('bomb_result', game_id)
+
+
+SCENARIOS = (offer_drink, play_rps, play_ttol, play_tap, play_bomb)
+
+
+def run_pair(url, prefix, deadline, stats):
+    a = Guest(url, f'{prefix}-a', stats)
+    b = Guest(url, f'{prefix}-b', stats)
+    try:
+        a.check_in('Load A', make_photo(prefix + 'a'))
+        b.check_in('Load B', make_photo(prefix + 'b'))
+        while time.monotonic() < deadline:
+            for scenario in SCENARIOS:
+                if time.monotonic() >= deadline:
+                    break
+                try:
+                    scenario(a, b)
+                except Timeout:
+                    pass  # counted; the server's own timers clean up the game
+            a, b = b, a  # take turns challenging
+    except (Timeout, socketio.exceptions.ConnectionError, requests.RequestException):
+        stats.error('check_in')
+    finally:
+        a.leave()
+        b.leave()
+
+
+def run_load(url, prefixes, seconds):
+    """One load generator process: a thread per pair. Returns Stats.to_dict()."""
+    stats = Stats()
+    deadline = time.monotonic() + seconds
+    threads = [threading.Thread(target=run_pair, args=(url, prefix, deadline, stats), daemon=True)
+               for prefix in prefixes]
+    for thread in threads:
+        thread.start()
+        time.sleep(0.02)  # don't open every socket in the same instant
+    for thread in threads:
+        thread.join(seconds + 4 * EXPECT_TIMEOUT)
+    return stats.to_dict()
+
+
+# ============== Server under test ==============
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+class Server:
+    """The app in one worker process (see SERVER_COMMANDS), in a throwaway copy of the tree."""
+
+    def __init__(self, mode='eventlet'):
+        self.mode = mode
+        self.workdir = tempfile.mkdtemp(prefix='shamrock-load-')
+        self.port = free_port()
+        self.url = f'http://127.0.0.1:{self.port}'
+        self.log_path = os.path.join(self.workdir, 'server.log')
+        self.proc = None
+
+    def start(self):
+        app_dir = os.path.join(self.workdir, 'app')
+        shutil.copytree(ROOT, app_dir, ignore=shutil.ignore_patterns(
+            '.git', 'benchmarks', '__pycache__', 'uploads', 'shamrock.db*'))
+        command = [arg.format(port=self.port) for arg in SERVER_COMMANDS[self.mode]]
+        self.proc = subprocess.Popen(
+            [sys.executable, *command],
+            cwd=app_dir, stdout=open(self.log_path, 'w'), stderr=subprocess.STDOUT)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                if requests.get(self.url + '/', timeout=1).ok:
+                    return
+            except requests.RequestException:
+                time.sleep(0.2)
+        raise RuntimeError(f'server did not come up, see {self.log_path}')
+
+    def worker_pid(self):
+        """The process serving requests: gunicorn's worker, or uvicorn itself (Linux only)."""
+        if self.mode != 'eventlet':
+            return self.proc.pid
+        with open(f'/proc/{self.proc.pid}/task/{self.proc.pid}/children') as f:
+            return int(f.read().split()[0])
+
+    def worker_cpu_seconds(self):
+        """User + system CPU time of the worker (Linux only, else None)."""
+        try:
+            with open(f'/proc/{self.worker_pid()}/stat') as f:
+                fields = f.read().rsplit(')', 1)[1].split()
+            return (int(fields[11]) + int(fields[12])) / os.sysconf('SC_CLK_TCK')
+        except (OSError, IndexError, ValueError):
+            return None
+
+    def stop(self):
+        if self.proc is not None:
+            self.proc.terminate()
+            try:
+                self.proc.wait(10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+        shutil.rmtree(self.workdir, ignore_errors=True)
+
+
+# ============== Steps and report ==============
+
+def run_step(url, pairs, seconds, procs, run_id, server=None):
+    prefixes = [f'load-{run_id}-{pairs}-{i}' for i in range(pairs)]
+    chunks = [prefixes[i::procs] for i in range(procs) if prefixes[i::procs]]
+    cpu_before = server.worker_cpu_seconds() if server else None
+    started = time.perf_counter()
+    with ProcessPoolExecutor(len(chunks)) as pool:
+        results = list(pool.map(run_load, [url] * len(chunks), chunks, [seconds] * len(chunks)))
+    elapsed = time.perf_counter() - started
+    cpu_after = server.worker_cpu_seconds() if server else None
+
+    latency = collections.defaultdict(list)
+    errors = collections.Counter()
+    for result in results:
+        for event, samples in result['latency'].items():
+            latency[event].extend(samples)
+        errors.update(result['errors'])
+    sent = sum(r['sent'] for r in results)
+    received = sum(r['received'] for r in results)
+    everything = [ms for event, samples in latency.items() if event != 'http_profile' for ms in samples]
+
+    def summary(samples):
+        return {'count': len(samples), 'p50': round(percentile(samples, 50), 2),
+                'p95': round(percentile(samples, 95), 2), 'p99': round(percentile(samples, 99), 2),
+                'max': round(max(samples or [0]), 2)}
+
+    return {
+        'pairs': pairs,
+        'guests': pairs * 2,
+        'seconds': round(elapsed, 2),
+        'client_emits_per_sec': round(sent / elapsed, 1),
+        'server_emits_per_sec': round(received / elapsed, 1),
+        'errors': dict(errors),
+        'error_rate': round(sum(errors.values()) / max(sent, 1), 4),
+        'worker_cpu': (round((cpu_after - cpu_before) / elapsed, 3)
+                       if cpu_before is not None and cpu_after is not None else None),
+        'latency_ms': {'all_socket_events': summary(everything),
+                       **{event: summary(samples) for event, samples in sorted(latency.items())}},
+    }
+
+
+def saturation(steps, slo_ms):
+    """The first step at which the worker stopped keeping up, and why (None if it never did)."""
+    previous = None
+    for step in steps:
+        reasons = []
+        if step['error_rate'] > 0.01:
+            reasons.append(f"{step['error_rate']:.1%} of emits failed")
+        if step['latency_ms']['all_socket_events']['p95'] > slo_ms:
+            reasons.append(f"p95 {step['latency_ms']['all_socket_events']['p95']:.0f} ms > {slo_ms:.0f} ms")
+        if previous:
+            load_growth = step['pairs'] / previous['pairs'] - 1
+            rate_growth = step['client_emits_per_sec'] / max(previous['client_emits_per_sec'], 1e-9) - 1
+            if load_growth > 0 and rate_growth < load_growth * GROWTH_FLOOR:
+                reasons.append(f'throughput grew {rate_growth:.0%} for {load_growth:.0%} more guests')
+        if reasons:
+            return {'pairs': step['pairs'], 'guests': step['guests'], 'reasons': reasons,
+                    'last_good_pairs': previous['pairs'] if previous else None}
+        previous = step
+    return None
+
+
+def print_step(step):
+    cpu = f"{step['worker_cpu']:.0%}" if step['worker_cpu'] is not None else 'n/a'
+    print(f"\n== {step['pairs']} pairs ({step['guests']} guests), {step['seconds']:.0f}s: "
+          f"{step['client_emits_per_sec']:.0f} client emits/s, {step['server_emits_per_sec']:.0f} server emits/s, "
+          f"worker CPU {cpu}, errors {sum(step['errors'].values())}")
+    print(f"{'event':<22}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'errors':>8}")
+    for event, s in step['latency_ms'].items():
+        print(f"{event:<22}{s['count']:>8}{s['p50']:>10.1f}{s['p95']:>10.1f}{s['p99']:>10.1f}"
+              f"{step['errors'].get(event, 0):>8}")
+
+
+def compare(report, baseline):
+    if baseline.get('report_version') != report['report_version']:
+        print(f"\nbaseline is report version {baseline.get('report_version')}, not {report['report_version']}; skipped")
+        return
+    old_steps = {step['pairs']: step for step in baseline['steps']}
+    print(f"\np95 against {baseline['commit']}:")
+    for step in report['steps']:
+        old = old_steps.get(step['pairs'])
+        if old is None:
+            continue
+        for event, s in step['latency_ms'].items():
+            before = old['latency_ms'].get(event)
+            if before and before['p95'] > 0:
+                change = s['p95'] / before['p95'] - 1
+                print(f"  {step['pairs']:>4} pairs  {event:<22}{before['p95']:>9.1f} -> {s['p95']:>9.1f} ms  {change:+.0%}")
+
+
+def main():
+    args = parse_args()
+    steps = [int(s) for s in args.steps.split(',')]
+    commit = git_commit()
+    run_id = f'{os.getpid()}{int(time.time()) % 100000}'
+
+    server = None
+    url = args.url
+    if url is None:
+        server = Server(args.server)
+        server.start()
+        url = server.url
+        print(f'server: {url} (log {server.log_path})')
+
+    results = []
+    try:
+        for pairs in steps:
+            step = run_step(url, pairs, args.seconds, min(args.procs, pairs), run_id, server)
+            print_step(step)
+            results.append(step)
+    finally:
+        if server is not None:
+            server.stop()
+
+    report = {
+        'report_version': REPORT_VERSION,
+        'commit': commit,
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'config': {'steps': steps, 'seconds': args.seconds, 'procs': args.procs, 'slo_ms': args.slo_ms,
+                   'server': 'external' if args.url else SERVER_LABELS[args.server]},
+        'steps': results,
+        'saturation': saturation(results, args.slo_ms),
+    }
+    out = args.out or f'loadtest-{commit}.json'
+    with open(out, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    sat = report['saturation']
+    if sat:
+        print(f"\nsaturated at {sat['pairs']} pairs ({sat['guests']} guests): {'; '.join(sat['reasons'])}")
+    else:
+        print(f'\nnot saturated up to {steps[-1]} pairs')
+    print(f'report: {out}')
+    if args.baseline:
+        with open(args.baseline) as f:
+            compare(report, json.load(f))
+
+
+if __name__ == '__main__':
+    main()
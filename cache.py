@@ -0,0 +1,91 @@
+"""Small in-process caches."""
+import threading
+from collections import OrderedDict
+
+
+class LRUCache:
+    """Bounded least-recently-used cache with hit/miss counters.
+
+    Values are stored as-is; callers that hand out mutable values should
+    copy them. Entries only leave the cache by eviction or invalidate().
+
+    A caller filling a miss takes generation() before reading the backing
+    store and passes it to put(). If the key was invalidated in between,
+    the value it read may already be stale, and put() drops it.
+    """
+
+    def __init__(self, max_size=1024):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0
+        self._invalidated = OrderedDict()  # key -> generation of its last invalidate(), bounded
+        self._floor = 0  # generation of the newest entry dropped from _invalidated
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale_puts = 0
+
+    def get(self, key, default=None):
+        with self._lock:
+            try:
+                value = self._data[key]
+            except KeyError:
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def generation(self):
+        """Token for a later put(): take it before reading the value being cached."""
+        with self._lock:
+            return self._generation
+
+    def put(self, key, value, generation=None):
+        with self._lock:
+            if generation is not None and (generation < self._floor
+                                           or self._invalidated.get(key, 0) > generation):
+                self.stale_puts += 1
+                return
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key):
+        with self._lock:
+            self._generation += 1
+            self._invalidated[key] = self._generation
+            self._invalidated.move_to_end(key)
+            if len(self._invalidated) > self.max_size:
+                # Forgetting a key's generation: refuse every put() from before it instead
+                self._floor = self._invalidated.popitem(last=False)[1]
+            if self._data.pop(key, None) is not None:
+                self.invalidations += 1
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __len__(self):
+        return len(self._data)
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._data),
+                'max_size': self.max_size,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / total * 100, 1) if total else 0.0,
+                'evictions': self.evictions,
+                'invalidations': self.invalidations,
+                'stale_puts': self.stale_puts,
+            }
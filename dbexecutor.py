@@ -0,0 +1,109 @@
+"""Run SQLite calls off the eventlet hub, one writer at a time.
+
+sqlite3 is C code that eventlet can't patch: a slow COMMIT, a WAL checkpoint
+or a busy wait on another process's write lock blocks the hub and every
+socket on it. ThreadedConnection wraps a connection so each call runs on a
+native thread (eventlet's tpool) while only the calling green thread waits.
+
+Reads from different green threads run in parallel. Writes take a
+process-wide green lock from their first writing statement until commit or
+rollback, so this process's connections never sit in SQLite's busy handler
+waiting for each other, which with many threads can starve one past its
+busy_timeout. Only other processes' writers are waited for inside SQLite.
+"""
+WRITE_VERBS = ('INSERT', 'UPDATE', 'DELETE', 'REPLACE', 'BEGIN', 'CREATE', 'ALTER', 'DROP')
+
+
+def _is_write(sql):
+    return sql.lstrip()[:7].upper().startswith(WRITE_VERBS)
+
+
+class ThreadedCursor:
+    __slots__ = ('_conn', '_cursor')
+
+    def __init__(self, conn, cursor):
+        self._conn = conn
+        self._cursor = cursor
+
+    def execute(self, sql, params=()):
+        self._conn._before(sql)
+        self._conn._run(self._cursor.execute, sql, params)
+        return self
+
+    def executemany(self, sql, seq_of_params):
+        self._conn._before(sql)
+        self._conn._run(self._cursor.executemany, sql, seq_of_params)
+        return self
+
+    def fetchone(self):
+        return self._conn._run(self._cursor.fetchone)
+
+    def fetchall(self):
+        return self._conn._run(self._cursor.fetchall)
+
+    @property
+    def lastrowid(self):
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self):
+        return self._cursor.rowcount
+
+
+class ThreadedConnection:
+    """The subset of sqlite3.Connection that models.py uses, run through `run`.
+
+    run(fn, *args) executes fn on a native thread and waits for it
+    cooperatively (tpool.execute). write_lock is shared by every
+    connection of the process.
+    """
+
+    def __init__(self, conn, run, write_lock):
+        self._conn = conn
+        self._run = run
+        self._write_lock = write_lock
+        self._writing = False
+
+    def _before(self, sql):
+        if not self._writing and _is_write(sql):
+            self._write_lock.acquire()
+            self._writing = True
+
+    def release_write(self):
+        """Let the next writer in (after commit, rollback or returning to the pool)."""
+        if self._writing:
+            self._writing = False
+            self._write_lock.release()
+
+    def cursor(self):
+        return ThreadedCursor(self, self._conn.cursor())
+
+    def execute(self, sql, params=()):
+        self._before(sql)
+        return ThreadedCursor(self, self._run(self._conn.execute, sql, params))
+
+    def executemany(self, sql, seq_of_params):
+        self._before(sql)
+        return ThreadedCursor(self, self._run(self._conn.executemany, sql, seq_of_params))
+
+    def commit(self):
+        try:
+            self._run(self._conn.commit)
+        finally:
+            if not self._conn.in_transaction:
+                self.release_write()
+
+    def rollback(self):
+        try:
+            self._run(self._conn.rollback)
+        finally:
+            if not self._conn.in_transaction:
+                self.release_write()
+
+    def close(self):
+        self.release_write()
+        self._run(self._conn.close)
+
+    @property
+    def in_transaction(self):
+        return self._conn.in_transaction
@@ -0,0 +1,217 @@
+"""Two-player game state and the registry shared by every game type.
+
+Every game follows the same lifecycle — challenge -> accept -> play ->
+resolve -> persist. The per-type rules (what "start" and "finish" mean)
+live in app.py and are registered here as a GameType.
+"""
+import threading
+import time
+from contextlib import nullcontext
+
+
+class Game:
+    """State common to every game. Subclasses add their own __slots__."""
+
+    __slots__ = ('game_id', 'game_type', 'session_a', 'session_b', 'mode', 'drink',
+                 'venue', 'started', 'timer', 'created_at')
+
+    def __init__(self, game_id, game_type, session_a, session_b, mode='fun', drink='', venue=None):
+        self.game_id = game_id
+        self.game_type = game_type
+        self.session_a = session_a
+        self.session_b = session_b
+        self.mode = mode
+        self.drink = drink
+        self.venue = venue
+        self.started = False
+        self.timer = None
+        self.created_at = time.time()
+
+    @property
+    def players(self):
+        return (self.session_a, self.session_b)
+
+    def opponent(self, session_id):
+        return self.session_b if session_id == self.session_a else self.session_a
+
+    def state(self) -> dict:
+        """Every field except the timer handle, for storing the game outside this process."""
+        return {name: getattr(self, name) for cls in type(self).__mro__
+                for name in getattr(cls, '__slots__', ()) if name != 'timer'}
+
+    @classmethod
+    def from_state(cls, state):
+        game = cls.__new__(cls)
+        game.timer = None
+        for name, value in state.items():
+            setattr(game, name, value)
+        return game
+
+    def payload(self, **extra):
+        """The fields every game event carries, plus any extras."""
+        return {
+            'game_id': self.game_id,
+            'session_a': self.session_a,
+            'session_b': self.session_b,
+            'mode': self.mode,
+            'drink': self.drink,
+            **extra,
+        }
+
+
+class RPSGame(Game):
+    __slots__ = ('choice_a', 'choice_b')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.choice_a = None
+        self.choice_b = None
+
+
+class BombGame(Game):
+    __slots__ = ('holder', 'last_pass_time')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.holder = None
+        self.last_pass_time = 0
+
+
+class TapGame(Game):
+    __slots__ = ('count_a', 'count_b', 'last_tap_a', 'last_tap_b')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.count_a = 0
+        self.count_b = 0
+        self.last_tap_a = 0
+        self.last_tap_b = 0
+
+
+class TTOLGame(Game):
+    __slots__ = ('phase', 'statements_a', 'statements_b', 'lie_index_a', 'lie_index_b',
+                 'guess_a', 'guess_b')
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.phase = 'write'
+        self.statements_a = None
+        self.statements_b = None
+        self.lie_index_a = None
+        self.lie_index_b = None
+        self.guess_a = None
+        self.guess_b = None
+
+
+class GameType:
+    """Registration record for one kind of game.
+
+    name doubles as the Socket.IO event prefix (rps_challenge, rps_start, ...).
+    start(game) runs when the challenge is accepted; finish(game_id) resolves
+    and persists it. state_fields(game) returns the type-specific fields a
+    {name}_result payload needs, for results that don't go through finish
+    (forfeits).
+    """
+
+    __slots__ = ('name', 'label', 'game_class', 'start', 'finish', 'state_fields')
+
+    def __init__(self, name, label, game_class, start, finish, state_fields=None):
+        self.name = name
+        self.label = label
+        self.game_class = game_class
+        self.start = start
+        self.finish = finish
+        self.state_fields = state_fields or (lambda game: {})
+
+
+class GameEngine:
+    """Registry of game types and in-flight games, indexed by game and by player.
+
+    Handlers change a game inside locked(game_id) and call save() when done.
+    save() is a no-op here, where get() hands out the live object; locked()
+    takes that game's own lock, because handlers and game timers run on
+    different threads under asgi.py. The shared engine in sharedstate.py
+    locks each game in Redis instead.
+    """
+
+    def __init__(self):
+        self._lock = threading.RLock()  # guards the indexes only; cleanup_stale() calls pop() under it
+        self._game_locks = {}  # game_id -> RLock, from create() until pop()
+        self.types = {}    # name -> GameType
+        self.games = {}    # game_id -> Game
+        self.by_user = {}  # session_id -> set of game_ids
+
+    def register(self, game_type):
+        self.types[game_type.name] = game_type
+        return game_type
+
+    def create(self, type_name, game_id, session_a, session_b, mode='fun', drink='', venue=None):
+        game = self.types[type_name].game_class(game_id, type_name, session_a, session_b, mode, drink, venue)
+        with self._lock:
+            self.games[game_id] = game
+            self._game_locks[game_id] = threading.RLock()
+            for session_id in game.players:
+                self.by_user.setdefault(session_id, set()).add(game_id)
+        return game
+
+    def get(self, game_id, type_name=None):
+        """Look up a game, optionally only if it is of the given type."""
+        game = self.games.get(game_id)
+        if game is None or (type_name is not None and game.game_type != type_name):
+            return None
+        return game
+
+    def save(self, game):
+        """Write back changes made to a game from get()."""
+
+    def locked(self, game_id):
+        """Context manager serialising changes to one game (a no-op once it is gone)."""
+        return self._game_locks.get(game_id) or nullcontext()
+
+    def pop(self, game_id, type_name=None):
+        """Remove a game from every index and cancel its timer."""
+        with self._lock:
+            game = self.get(game_id, type_name)
+            if game is None:
+                return None
+            del self.games[game_id]
+            self._game_locks.pop(game_id, None)
+            for session_id in game.players:
+                ids = self.by_user.get(session_id)
+                if ids is not None:
+                    ids.discard(game_id)
+                    if not ids:
+                        del self.by_user[session_id]
+            if game.timer:
+                game.timer.cancel()
+                game.timer = None
+        return game
+
+    def set_timer(self, game, timer):
+        """Replace a game's timer handle, cancelling the previous one."""
+        with self._lock:
+            if game.timer:
+                game.timer.cancel()
+            game.timer = timer
+
+    def games_for(self, session_id):
+        """All in-flight games a player is in — O(1) index lookup."""
+        with self._lock:
+            return [self.games[gid] for gid in self.by_user.get(session_id, ()) if gid in self.games]
+
+    def cleanup_stale(self, max_age):
+        """Drop every game older than max_age seconds in one pass. Returns the removed games."""
+        cutoff = time.time() - max_age
+        with self._lock:
+            stale = [gid for gid, game in self.games.items() if game.created_at < cutoff]
+            return [self.pop(gid) for gid in stale]
+
+    def counts(self) -> dict:
+        counts = {name: 0 for name in self.types}
+        with self._lock:
+            for game in self.games.values():
+                counts[game.game_type] = counts.get(game.game_type, 0) + 1
+        return counts
+
+    def __len__(self):
+        return len(self.games)
@@ -0,0 +1,146 @@
+"""Hub lag monitor and blocking-call detector.
+
+Every green thread shares one eventlet hub (every coroutine one asyncio
+event loop, in asgi.py), so a call that doesn't yield
+(CPU work, file I/O, C code eventlet can't patch) stalls every socket. A
+heartbeat green thread sleeps `interval` seconds at a time and records how
+much it overslept. A native watchdog thread checks on the heartbeat; once
+it is more than `threshold` seconds late, the hub is stuck in whatever
+green thread is running, so the watchdog grabs the stack of the hub's OS
+thread (sys._current_frames()). Stalls are grouped by the innermost frame
+in our own code, and offenders() lists the worst of them.
+"""
+import asyncio
+import os
+import sys
+import time
+import traceback
+from collections import deque
+
+try:
+    from eventlet import patcher
+except ImportError:
+    patcher = None
+
+APP_DIR = os.path.dirname(os.path.abspath(__file__))
+MAX_OFFENDERS = 50
+
+
+def _native(module):
+    """The unpatched module, for code that runs on a native thread."""
+    return patcher.original(module) if patcher is not None else __import__(module)
+
+
+class HubWatchdog:
+    def __init__(self, interval=0.05, threshold=0.1, window=1200):
+        self.interval = interval
+        self.threshold = threshold
+        self._lags = deque(maxlen=window)  # recent oversleeps in seconds
+        self._offenders = {}               # location -> stats dict
+        self._lock = _native('threading').Lock()
+        self._hub_thread = None
+        self._last_beat = time.monotonic()
+        self._pending = None               # (location, stack) captured for the current stall
+        self._captured = False
+        self.stalls = 0
+        self.max_lag = 0.0
+
+    def start(self, spawn, sleep):
+        """Start the heartbeat (spawn/sleep: socketio.start_background_task/sleep) and the watchdog thread."""
+        self._hub_thread = _native('threading').get_ident()
+        self._last_beat = time.monotonic()
+        spawn(self._heartbeat, sleep)
+        _native('threading').Thread(target=self._watch, name='hub-watchdog', daemon=True).start()
+
+    def start_asyncio(self, loop):
+        """Same for an asyncio event loop; call from the loop's thread. Returns the heartbeat task."""
+        self._hub_thread = _native('threading').get_ident()
+        self._last_beat = time.monotonic()
+        task = loop.create_task(self._async_heartbeat())
+        _native('threading').Thread(target=self._watch, name='hub-watchdog', daemon=True).start()
+        return task
+
+    def _heartbeat(self, sleep):
+        while True:
+            start = time.monotonic()
+            sleep(self.interval)
+            self._beat(start)
+
+    async def _async_heartbeat(self):
+        while True:
+            start = time.monotonic()
+            await asyncio.sleep(self.interval)
+            self._beat(start)
+
+    def _beat(self, start):
+        """Record one heartbeat that was meant to wake `interval` seconds after start."""
+        now = time.monotonic()
+        lag = max(0.0, now - start - self.interval)
+        self._last_beat = now
+        self._lags.append(lag)
+        self.max_lag = max(self.max_lag, lag)
+        if lag > self.threshold:
+            self._record_stall(lag)
+        elif self._captured:
+            with self._lock:  # caught a stall that ended just under the threshold
+                self._pending = None
+                self._captured = False
+
+    def _record_stall(self, lag):
+        with self._lock:
+            location, stack = self._pending or ('(not caught in the act)', '')
+            self._pending = None
+            self._captured = False
+            self.stalls += 1
+            entry = self._offenders.get(location)
+            if entry is None:
+                if len(self._offenders) >= MAX_OFFENDERS:
+                    del self._offenders[min(self._offenders, key=lambda k: self._offenders[k]['total'])]
+                entry = self._offenders[location] = {'location': location, 'count': 0, 'total': 0.0, 'max': 0.0}
+            entry['count'] += 1
+            entry['total'] += lag
+            entry['max'] = max(entry['max'], lag)
+            entry['last_seen'] = time.time()
+            if stack:
+                entry['stack'] = stack
+        print(f"Hub blocked for {lag * 1000:.0f}ms in {location}")
+
+    def _watch(self):
+        sleep = _native('time').sleep
+        poll = min(self.interval, self.threshold) / 2
+        while True:
+            sleep(poll)
+            late = time.monotonic() - self._last_beat - self.interval
+            if late > self.threshold and not self._captured:
+                self._capture()
+
+    def _capture(self):
+        frame = sys._current_frames().get(self._hub_thread)
+        if frame is None:
+            return
+        summary = traceback.extract_stack(frame, limit=40)
+        del frame
+        ours = [f for f in summary if f.filename.startswith(APP_DIR) and 'site-packages' not in f.filename]
+        culprit = (ours or summary)[-1]
+        filename = os.path.relpath(culprit.filename, APP_DIR) if ours else culprit.filename
+        location = f'{filename}:{culprit.lineno} in {culprit.name}'
+        stack = ''.join(traceback.format_list(summary[-15:]))
+        with self._lock:
+            self._pending = (location, stack)
+            self._captured = True
+
+    def offenders(self, limit=10) -> list:
+        """The locations that blocked the hub longest in total, worst first (times in ms)."""
+        with self._lock:
+            worst = sorted(self._offenders.values(), key=lambda e: e['total'], reverse=True)[:limit]
+            return [{**e, 'total': round(e['total'] * 1000), 'max': round(e['max'] * 1000),
+                     'stack': e.get('stack', '')} for e in worst]
+
+    def stats(self) -> dict:
+        lags = sorted(self._lags)
+
+        def pct(p):
+            return round(lags[min(int(len(lags) * p / 100), len(lags) - 1)] * 1000, 1) if lags else 0.0
+        return {'running': self._hub_thread is not None, 'p50_ms': pct(50), 'p99_ms': pct(99),
+                'max_ms': round(self.max_lag * 1000, 1), 'stalls': self.stalls,
+                'threshold_ms': round(self.threshold * 1000)}
@@ -0,0 +1,87 @@
+"""Profile photo pipeline: decode, strip metadata, auto-rotate and re-encode.
+
+Each upload is written as a few fixed-size square WebP renditions with
+content-hashed names, so they can be cached forever and shared between
+identical uploads. Pillow is optional — without it the original file is
+stored unchanged (still content-hashed) and every size points at it.
+"""
+import os
+
+try:
+    from PIL import Image, ImageOps
+except ImportError:
+    Image = None
+
+try:
+    from eventlet import patcher, tpool
+except ImportError:
+    patcher = tpool = None
+
+# name -> edge length in px. Avatars render at <= 64 CSS px, so thumb covers 2x screens
+PHOTO_SIZES = {'thumb': 128, 'large': 512}
+WEBP_QUALITY = 80
+MAX_PIXELS = 40_000_000  # refuse decompression bombs well before Pillow's own limit
+
+
+class InvalidImage(ValueError):
+    """The upload is not an image Pillow can decode."""
+
+
+def _render(source_path, path_for):
+    """Write every rendition of the source image. Runs in a worker thread."""
+    try:
+        with Image.open(source_path) as img:
+            if img.width * img.height > MAX_PIXELS:
+                raise InvalidImage('Image is too large')
+            img = ImageOps.exif_transpose(img)
+            img = img.convert('RGBA' if img.mode in ('RGBA', 'LA', 'P') else 'RGB')
+            for name, edge in PHOTO_SIZES.items():
+                path = path_for(name)
+                if os.path.exists(path):
+                    continue  # same content already rendered
+                rendition = ImageOps.fit(img, (edge, edge), Image.LANCZOS)
+                tmp = f'{path}.tmp'
+                # No exif= argument, so no metadata is carried over
+                rendition.save(tmp, 'WEBP', quality=WEBP_QUALITY, method=4)
+                os.replace(tmp, path)
+    except (OSError, SyntaxError, Image.DecompressionBombError) as e:
+        raise InvalidImage(str(e)) from e
+
+
+def save_photo(source_path, digest, ext, upload_dir, url_prefix):
+    """Store an uploaded photo from a temporary file. Returns {size name: url}.
+
+    digest is the hex content hash of the file, used to name the outputs.
+    Decoding and encoding run on eventlet's native thread pool under
+    eventlet, so the hub keeps serving sockets meanwhile. The header is
+    read first, so oversized dimensions are refused before decoding.
+    Raises InvalidImage if the file can't be decoded. The caller removes
+    source_path afterwards (it may already have been moved into place).
+    """
+    os.makedirs(upload_dir, exist_ok=True)
+    digest = digest[:16]
+
+    if Image is None:
+        filename = f'{digest}.{ext}'
+        path = os.path.join(upload_dir, filename)
+        if not os.path.exists(path):
+            os.replace(source_path, path)
+        return {name: f'{url_prefix}/{filename}' for name in PHOTO_SIZES}
+
+    def path_for(name):
+        return os.path.join(upload_dir, f'{digest}-{name}.webp')
+
+    if tpool is not None and patcher.is_monkey_patched('thread'):
+        tpool.execute(_render, source_path, path_for)
+    else:
+        _render(source_path, path_for)
+    return {name: f'{url_prefix}/{digest}-{name}.webp' for name in PHOTO_SIZES}
+
+
+def photo_paths(photo_urls, upload_dir, url_prefix):
+    """Files on disk behind a set of photo URLs."""
+    paths = set()
+    for url in (photo_urls or {}).values():
+        if url and url.startswith(url_prefix + '/'):
+            paths.add(os.path.join(upload_dir, url[len(url_prefix) + 1:]))
+    return paths
@@ -0,0 +1,155 @@
+"""Handler latency histograms, counters and gauges in Prometheus text format.
+
+instrument_socketio() and instrument_flask() wrap every registered Socket.IO
+handler and Flask view. Each call costs about two microseconds (two
+perf_counter() reads, a bisect and a dict update), so this stays on in
+production (METRICS=0 turns it off). Time spent
+holding a database connection (see models.get_db) is added up per call and
+recorded next to the handler's latency.
+
+Numbers are per process: with several workers, scrape each one.
+"""
+import bisect
+import functools
+import os
+import threading
+import time
+
+from werkzeug.exceptions import HTTPException
+
+ENABLED = os.environ.get('METRICS', '1') != '0'
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0)
+DB_BUCKETS = (0.0001, 0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1.0)
+
+# Database seconds of the handler running in each thread (green thread under
+# eventlet). A dict keyed by get_ident() is several times cheaper than a
+# patched threading.local.
+_db_time = {}
+_ident = threading.get_ident
+
+
+def add_db_time(seconds):
+    """Charge database time to the handler running in this thread, if any."""
+    key = _ident()
+    if key in _db_time:
+        _db_time[key] += seconds
+
+
+class Histogram:
+    """Fixed-bucket histogram. Counts are per bucket; render() makes them cumulative."""
+
+    __slots__ = ('bounds', 'counts', 'sum')
+
+    def __init__(self, bounds):
+        self.bounds = bounds
+        self.counts = [0] * (len(bounds) + 1)  # last one is +Inf
+        self.sum = 0.0
+
+    def observe(self, value):
+        self.counts[bisect.bisect_left(self.bounds, value)] += 1
+        self.sum += value
+
+    def lines(self, name, labels):
+        total = 0
+        for bound, count in zip(self.bounds + ('+Inf',), self.counts):
+            total += count
+            yield f'{name}_bucket{{{labels},le="{bound}"}} {total}'
+        yield f'{name}_sum{{{labels}}} {self.sum:.6f}'
+        yield f'{name}_count{{{labels}}} {total}'
+
+
+class HandlerStats:
+    __slots__ = ('calls', 'errors', 'latency', 'db')
+
+    def __init__(self):
+        self.calls = 0
+        self.errors = 0
+        self.latency = Histogram(LATENCY_BUCKETS)
+        self.db = Histogram(DB_BUCKETS)
+
+
+class Metrics:
+    """Per-handler stats plus gauges read at scrape time."""
+
+    def __init__(self, prefix='shamrock'):
+        self.prefix = prefix
+        self._handlers = {}  # (kind, name) -> HandlerStats
+        self._gauges = []    # (name, help, fn, label)
+
+    def wrap(self, kind, name, fn):
+        """fn, timed as handler `name` of `kind` ('socket' or 'http')."""
+        stats = self._handlers.setdefault((kind, name), HandlerStats())
+        perf_counter = time.perf_counter
+
+        @functools.wraps(fn)
+        def timed(*args, **kwargs):
+            key = _ident()
+            outer_db = _db_time.get(key)
+            _db_time[key] = 0.0
+            start = perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            except HTTPException as e:
+                if e.code >= 500:
+                    stats.errors += 1
+                raise
+            except Exception:
+                stats.errors += 1
+                raise
+            finally:
+                stats.latency.observe(perf_counter() - start)
+                db = _db_time.pop(key)
+                stats.db.observe(db)
+                stats.calls += 1
+                if outer_db is not None:
+                    _db_time[key] = outer_db + db
+        return timed
+
+    def instrument_socketio(self, socketio):
+        """Wrap every handler registered so far on a Flask-SocketIO server."""
+        for handlers in socketio.server.handlers.values():
+            for event, handler in handlers.items():
+                handlers[event] = self.wrap('socket', event, handler)
+
+    def instrument_flask(self, app):
+        """Wrap every view function registered so far (keyed by endpoint)."""
+        for endpoint, view in app.view_functions.items():
+            app.view_functions[endpoint] = self.wrap('http', endpoint, view)
+
+    def gauge(self, name, help_text, fn, label=None):
+        """Register a gauge. fn() returns a number, or a {label value: number} dict if label is set."""
+        self._gauges.append((name, help_text, fn, label))
+
+    def render(self) -> str:
+        """Everything in the Prometheus text exposition format."""
+        p = self.prefix
+        handlers = sorted(self._handlers.items())
+        out = [f'# HELP {p}_handler_calls_total Handler invocations.',
+               f'# TYPE {p}_handler_calls_total counter']
+        out += [f'{p}_handler_calls_total{{{_labels(k)}}} {s.calls}' for k, s in handlers]
+        out += [f'# HELP {p}_handler_errors_total Handler invocations that raised.',
+                f'# TYPE {p}_handler_errors_total counter']
+        out += [f'{p}_handler_errors_total{{{_labels(k)}}} {s.errors}' for k, s in handlers]
+        for metric, attr, help_text in (('handler_seconds', 'latency', 'Handler latency.'),
+                                        ('handler_db_seconds', 'db', 'Database time per handler call.')):
+            out += [f'# HELP {p}_{metric} {help_text}', f'# TYPE {p}_{metric} histogram']
+            for key, s in handlers:
+                out.extend(getattr(s, attr).lines(f'{p}_{metric}', _labels(key)))
+        for name, help_text, fn, label in self._gauges:
+            out += [f'# HELP {p}_{name} {help_text}', f'# TYPE {p}_{name} gauge']
+            value = fn()
+            if label is None:
+                out.append(f'{p}_{name} {value}')
+            else:
+                out += [f'{p}_{name}{{{label}="{_escape(k)}"}} {v}' for k, v in sorted(value.items())]
+        return '\n'.join(out) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(key):
+    kind, name = key
+    return f'kind="{kind}",handler="{_escape(name)}"'
@@ -1,161 +1,526 @@
 import sqlite3
 import json
+import itertools
+import threading
+import time
+from collections import deque
 from contextlib import contextmanager
 from datetime import datetime
 import os
 
+from cache import LRUCache
+from dbexecutor import ThreadedConnection
+import metrics
+from presence import PresenceStore
+import sharedstate
+from writebehind import WriteBehindQueue
+
+try:
+    from eventlet import patcher, tpool
+except ImportError:
+    patcher = tpool = None
+
 DATABASE = 'shamrock.db'
 
-@contextmanager
-def get_db():
-    """Get database connection as a context manager with error handling."""
-    conn = None
-    try:
-        conn = sqlite3.connect(DATABASE, timeout=10)
+# Venue that rows written before venues existed belong to, and the one a
+# guest joins when they arrive without a ?venue= link
+DEFAULT_VENUE = 'default'
+
+# Connection pool sizing
+POOL_MAX_IDLE = int(os.environ.get('DB_POOL_SIZE', 8))  # idle connections kept around
+POOL_MAX_SIZE = int(os.environ.get('DB_POOL_MAX', 32))  # open connections at most; checkouts beyond wait
+POOL_CHECKOUT_TIMEOUT = 10.0  # seconds to wait for a free connection before giving up
+POOL_HEALTH_CHECK_AFTER = 30.0  # seconds idle before a connection is pinged on checkout
+
+# Under eventlet, SQLite calls run on eventlet's native thread pool (see
+# dbexecutor.py): a slow COMMIT, a WAL checkpoint or a wait for another
+# writer's lock then blocks only the green thread that made the call, not the
+# hub. DB_EXECUTOR=inline calls SQLite directly (the only option without eventlet).
+_EVENTLET = tpool is not None and patcher.is_monkey_patched('thread')
+DB_EXECUTOR = os.environ.get('DB_EXECUTOR', 'tpool' if _EVENTLET else 'inline')
+
+
+class ConnectionPool:
+    """Bounded pool of SQLite connections.
+
+    PRAGMAs are applied once when a connection is created, so checking a
+    connection out is just a pop from the idle stack. At most max_size
+    connections are open at once: a checkout beyond that waits for one to
+    be released (counted in stats() as waits). Each thread (greenlet
+    under eventlet) keeps its checked-out connection while it is inside
+    get_db(), so nested get_db() calls share one connection.
+
+    With DB_EXECUTOR=tpool the pool hands out ThreadedConnections sharing
+    one write lock; the pool itself stays on the hub.
+    """
+
+    def __init__(self, database, max_idle=POOL_MAX_IDLE, max_size=POOL_MAX_SIZE):
+        self.database = database
+        self.max_idle = min(max_idle, max_size)
+        self.max_size = max_size
+        self._idle = deque()  # (conn, last_used)
+        self._lock = threading.Lock()
+        self._slots = threading.BoundedSemaphore(max_size)  # one per checked-out connection
+        self._local = threading.local()
+        self._write_lock = threading.Lock()  # one writing connection at a time (tpool executor)
+        self.hits = 0
+        self.misses = 0
+        self.discarded = 0
+        self.in_use = 0
+        self.waits = 0
+        self.wait_time = 0.0
+        self.timeouts = 0
+
+    def _connect(self):
+        conn = sqlite3.connect(self.database, timeout=10, check_same_thread=False)
         conn.row_factory = sqlite3.Row
         conn.execute('PRAGMA journal_mode=WAL')
         conn.execute('PRAGMA busy_timeout=5000')
-        yield conn
-    except sqlite3.Error as e:
-        print(f"Database error: {e}")
-        if conn:
-            conn.rollback()
-        raise
-    finally:
-        if conn:
-            conn.close()
-
-def init_db():
-    """Initialize the database."""
-    with get_db() as conn:
-        cursor = conn.cursor()
-
-        # Settings table (key-value)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS settings (
-                key TEXT PRIMARY KEY,
-                value TEXT NOT NULL
-            )
-        ''')
-
-        # Activity log
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS activity_log (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                event_type TEXT NOT NULL,
-                description TEXT NOT NULL,
-                session_id TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-
-        # Messages table - stores messages and drink offers (user-to-user)
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS messages (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                from_session TEXT NOT NULL,
-                to_session TEXT NOT NULL,
-                message_type TEXT NOT NULL,
-                content TEXT NOT NULL,
-                status TEXT DEFAULT 'pending',
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
+        if DB_EXECUTOR == 'tpool' and _EVENTLET:
+            return ThreadedConnection(conn, tpool.execute, self._write_lock)
+        return conn
 
-        # Profiles table - user profiles with name, photo, and online status
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS profiles (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                session_id TEXT UNIQUE NOT NULL,
-                name TEXT NOT NULL,
-                photo_url TEXT,
-                color_frame TEXT,
-                is_online BOOLEAN DEFAULT 0,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-
-        # Add columns if missing (existing DBs)
+    def _is_healthy(self, conn):
         try:
-            cursor.execute('ALTER TABLE profiles ADD COLUMN color_frame TEXT')
-        except sqlite3.OperationalError:
-            pass
+            conn.execute('SELECT 1')
+            return True
+        except sqlite3.Error:
+            return False
+
+    def acquire(self):
+        """Check out a connection, reusing an idle one when possible.
+
+        Waits while max_size connections are checked out; raises
+        sqlite3.OperationalError if none frees up within POOL_CHECKOUT_TIMEOUT.
+        """
+        if not self._slots.acquire(blocking=False):
+            start = time.perf_counter()
+            acquired = self._slots.acquire(timeout=POOL_CHECKOUT_TIMEOUT)
+            with self._lock:
+                self.waits += 1
+                self.wait_time += time.perf_counter() - start
+                if not acquired:
+                    self.timeouts += 1
+            if not acquired:
+                raise sqlite3.OperationalError('database connection pool exhausted')
+        with self._lock:
+            self.in_use += 1
         try:
-            cursor.execute('ALTER TABLE profiles ADD COLUMN is_online BOOLEAN DEFAULT 0')
-        except sqlite3.OperationalError:
-            pass
+            return self._checkout()
+        except BaseException:
+            self._free_slot()
+            raise
+
+    def _free_slot(self):
+        with self._lock:
+            self.in_use -= 1
+        self._slots.release()
+
+    def _checkout(self):
+        while True:
+            with self._lock:
+                if not self._idle:
+                    self.misses += 1
+                    break
+                conn, last_used = self._idle.pop()
+            if time.time() - last_used < POOL_HEALTH_CHECK_AFTER or self._is_healthy(conn):
+                with self._lock:
+                    self.hits += 1
+                return conn
+            self._close(conn)
+        return self._connect()
+
+    def release(self, conn):
+        """Return a connection to the pool, closing it if the pool is full."""
         try:
-            cursor.execute('ALTER TABLE profiles ADD COLUMN instagram TEXT')
-        except sqlite3.OperationalError:
-            pass
+            self._return(conn)
+        finally:
+            self._free_slot()
 
-        # Reset all users to offline on startup (in-memory state is fresh)
-        cursor.execute('UPDATE profiles SET is_online = 0')
+    def _return(self, conn):
+        try:
+            if conn.in_transaction:
+                conn.rollback()
+        except sqlite3.Error:
+            self._close(conn)
+            return
+        if isinstance(conn, ThreadedConnection):
+            conn.release_write()  # e.g. after a DDL statement, which commits by itself
+        with self._lock:
+            if len(self._idle) < self.max_idle:
+                self._idle.append((conn, time.time()))
+                return
+        self._close(conn)
+
+    def _close(self, conn):
+        with self._lock:
+            self.discarded += 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
 
-        conn.commit()
+    @contextmanager
+    def connection(self):
+        held = getattr(self._local, 'conn', None)
+        if held is not None:
+            # Nested get_db() in the same thread — reuse the outer connection
+            self._local.depth += 1
+            try:
+                yield held
+            finally:
+                self._local.depth -= 1
+            return
+        start = time.perf_counter()
+        conn = self.acquire()
+        self._local.conn = conn
+        self._local.depth = 1
+        try:
+            yield conn
+        finally:
+            self._local.conn = None
+            self._local.depth = 0
+            self.release(conn)
+            metrics.add_db_time(time.perf_counter() - start)
+
+    def is_nested(self) -> bool:
+        """True inside a get_db() block that shares an outer block's connection."""
+        return getattr(self._local, 'depth', 0) > 1
+
+    def close_all(self):
+        with self._lock:
+            idle, self._idle = list(self._idle), deque()
+        for conn, _ in idle:
+            try:
+                conn.close()
+            except sqlite3.Error:
+                pass
+
+    def stats(self) -> dict:
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'discarded': self.discarded,
+                'idle': len(self._idle),
+                'in_use': self.in_use,
+                'max_size': self.max_size,
+                'waits': self.waits,
+                'wait_ms': round(self.wait_time * 1000, 1),
+                'timeouts': self.timeouts,
+                'hit_rate': round(self.hits / total * 100, 1) if total else 0.0,
+            }
+
+
+_pool = ConnectionPool(DATABASE)
 
+@contextmanager
+def get_db():
+    """Get a pooled database connection as a context manager with error handling.
 
-# ============== User Online Status ==============
+    Only the outermost block rolls back on an error; a nested block leaves
+    the transaction to it, so the outer caller's uncommitted writes survive
+    an inner failure it catches.
+    """
+    with _pool.connection() as conn:
+        try:
+            yield conn
+        except sqlite3.Error as e:
+            print(f"Database error: {e}")
+            if not _pool.is_nested():
+                conn.rollback()
+            raise
+
+def get_pool_stats() -> dict:
+    """Connection pool hit/miss counters (for the admin dashboard)."""
+    return _pool.stats()
+
+# ============== Schema Migrations ==============
+
+def _add_column(cursor, table, column, decl):
+    """Add a column unless it already exists (DBs created before migrations)."""
+    cursor.execute(f'PRAGMA table_info({table})')
+    if column not in {row['name'] for row in cursor.fetchall()}:
+        cursor.execute(f'ALTER TABLE {table} ADD COLUMN {column} {decl}')
+
+def _migration_base_schema(cursor):
+    # Activity log
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS activity_log (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            event_type TEXT NOT NULL,
+            description TEXT NOT NULL,
+            session_id TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Messages table - stores messages and drink offers (user-to-user)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS messages (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            from_session TEXT NOT NULL,
+            to_session TEXT NOT NULL,
+            message_type TEXT NOT NULL,
+            content TEXT NOT NULL,
+            status TEXT DEFAULT 'pending',
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Profiles table - user profiles with name, photo, and online status
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS profiles (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            session_id TEXT UNIQUE NOT NULL,
+            name TEXT NOT NULL,
+            photo_url TEXT,
+            color_frame TEXT,
+            is_online BOOLEAN DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+    # Menu items (editable from the admin panel)
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS menu_items (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            name TEXT NOT NULL,
+            price TEXT NOT NULL,
+            category TEXT NOT NULL,
+            img TEXT DEFAULT '',
+            sort_order INTEGER DEFAULT 0
+        )
+    ''')
+
+    # Game results
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS game_results (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            game_type TEXT NOT NULL,
+            session_a TEXT NOT NULL,
+            session_b TEXT NOT NULL,
+            winner_session TEXT,
+            loser_session TEXT,
+            result TEXT NOT NULL,
+            mode TEXT DEFAULT 'fun',
+            details TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+    ''')
+
+def _migration_profile_columns(cursor):
+    _add_column(cursor, 'profiles', 'color_frame', 'TEXT')
+    _add_column(cursor, 'profiles', 'is_online', 'BOOLEAN DEFAULT 0')
+    _add_column(cursor, 'profiles', 'instagram', 'TEXT')
+
+def _migration_history_indexes(cursor):
+    # get_user_messages: from_session = ? OR to_session = ? ORDER BY created_at
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_messages_from ON messages (from_session, created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_messages_to ON messages (to_session, created_at)')
+    # get_drink_stats: covering index, the GROUP BY never touches the table
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_messages_type_content ON messages (message_type, content)')
+    # get_user_game_results: session_a = ? OR session_b = ? ORDER BY created_at
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_game_results_a ON game_results (session_a, created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_game_results_b ON game_results (session_b, created_at)')
+    # get_recent_activity: ORDER BY created_at DESC LIMIT ?
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_activity_created ON activity_log (created_at)')
+
+def _migration_photo_urls(cursor):
+    # JSON {size name: url} of the resized renditions; photo_url keeps the thumbnail
+    _add_column(cursor, 'profiles', 'photo_urls', 'TEXT')
+
+def _migration_venues(cursor):
+    # Every guest, message, game and log entry belongs to one venue
+    for table in ('profiles', 'messages', 'game_results', 'activity_log'):
+        _add_column(cursor, table, 'venue', f"TEXT NOT NULL DEFAULT '{DEFAULT_VENUE}'")
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_profiles_venue ON profiles (venue)')
+    # Admin dashboard, per venue: recent activity, drink stats, message count
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_activity_venue_created ON activity_log (venue, created_at)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_messages_venue_type_content ON messages (venue, message_type, content)')
+
+# Ordered list of (version, description, migration). Append only — never
+# edit or reorder a migration that has shipped.
+MIGRATIONS = [
+    (1, 'base schema', _migration_base_schema),
+    (2, 'profile columns', _migration_profile_columns),
+    (3, 'history indexes', _migration_history_indexes),
+    (4, 'responsive photo urls', _migration_photo_urls),
+    (5, 'venues', _migration_venues),
+]
+
+def get_schema_version(conn) -> int:
+    row = conn.execute("SELECT value FROM settings WHERE key = 'schema_version'").fetchone()
+    return int(row['value']) if row else 0
+
+def run_migrations(conn, target: int = None) -> int:
+    """Apply pending migrations up to target (default: latest). Returns the schema version."""
+    conn.execute('''
+        CREATE TABLE IF NOT EXISTS settings (
+            key TEXT PRIMARY KEY,
+            value TEXT NOT NULL
+        )
+    ''')
+    conn.commit()
+    version = get_schema_version(conn)
+    for number, description, migration in MIGRATIONS:
+        if number <= version or (target is not None and number > target):
+            continue
+        # IMMEDIATE takes the write lock up front, so workers starting together
+        # queue up here and re-check instead of failing on a lock upgrade
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            version = get_schema_version(conn)
+            if number <= version:
+                conn.rollback()
+                continue
+            migration(conn.cursor())
+            conn.execute("INSERT OR REPLACE INTO settings (key, value) VALUES ('schema_version', ?)", (str(number),))
+            conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+        version = number
+        print(f"Applied migration {number}: {description}")
+    return version
 
-def go_online(session_id: str):
-    """Mark a user as online."""
+def init_db():
+    """Initialize the database."""
     with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('UPDATE profiles SET is_online = 1 WHERE session_id = ?', (session_id,))
-        conn.commit()
+        run_migrations(conn)
 
-def go_offline(session_id: str):
-    """Mark a user as offline."""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('UPDATE profiles SET is_online = 0 WHERE session_id = ?', (session_id,))
+        # Reset all users to offline on startup (in-memory state is fresh)
+        conn.execute('UPDATE profiles SET is_online = 0')
         conn.commit()
 
-def get_active_users(exclude_session: str = None) -> list:
-    """Get all online users with their profiles."""
+
+# ============== User Online Status ==============
+# Presence lives in memory (in Redis with several workers, see sharedstate.py),
+# one store per venue; the profiles.is_online column is only an optional,
+# batched mirror for external tools.
+
+PRESENCE_WRITE_THROUGH = os.environ.get('PRESENCE_WRITE_THROUGH', '0') == '1'
+
+_presence_stores = {}  # venue -> PresenceStore, created by the first check-in
+_presence_lock = threading.Lock()  # guards _presence_stores and _presence_writes
+_no_presence = PresenceStore()  # always empty: read in place of a venue nobody has checked in to
+
+def _presence(venue: str, create=True):
+    """A venue's presence store. Only check-ins create one; readers pass
+    create=False, so a made-up ?venue= slug reads as empty instead of
+    leaving a store behind."""
+    store = _presence_stores.get(venue)
+    if store is None:
+        if not create and not sharedstate.presence_store_exists(venue):
+            return _no_presence
+        with _presence_lock:
+            store = _presence_stores.get(venue)
+            if store is None:
+                store = _presence_stores[venue] = sharedstate.create_presence_store(venue)
+    return store
+_presence_writes = {}  # session_id -> is_online, waiting for flush_presence_writes()
+
+def _queue_presence_write(session_id: str, is_online: bool):
+    if PRESENCE_WRITE_THROUGH:
+        with _presence_lock:
+            _presence_writes[session_id] = is_online
+
+def flush_presence_writes():
+    """Write queued is_online changes to SQLite in one transaction."""
+    global _presence_writes
+    with _presence_lock:
+        if not _presence_writes:
+            return
+        pending, _presence_writes = _presence_writes, {}
     try:
         with get_db() as conn:
-            cursor = conn.cursor()
-            if exclude_session:
-                cursor.execute('''
-                    SELECT session_id, name, photo_url, color_frame, instagram
-                    FROM profiles
-                    WHERE is_online = 1 AND session_id != ?
-                    ORDER BY created_at
-                ''', (exclude_session,))
-            else:
-                cursor.execute('''
-                    SELECT session_id, name, photo_url, color_frame, instagram
-                    FROM profiles
-                    WHERE is_online = 1
-                    ORDER BY created_at
-                ''')
-            return [dict(row) for row in cursor.fetchall()]
+            conn.executemany(
+                'UPDATE profiles SET is_online = ? WHERE session_id = ?',
+                [(int(online), sess) for sess, online in pending.items()]
+            )
+            conn.commit()
     except sqlite3.Error:
-        return []
+        # Mirror only — in-memory presence is authoritative. Keep the batch for
+        # the next flush, behind anything queued for the same guests meanwhile.
+        with _presence_lock:
+            _presence_writes = {**pending, **_presence_writes}
 
-def is_user_online(session_id: str) -> bool:
-    """Check if a user is online."""
+def _load_presence_profile(session_id: str):
+    """Read a profile into the presence store. Returns False if it doesn't exist."""
     try:
         with get_db() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT is_online FROM profiles WHERE session_id = ?', (session_id,))
+            cursor.execute(
+                f'SELECT id, {_PROFILE_COLUMNS}, created_at FROM profiles WHERE session_id = ?',
+                (session_id,)
+            )
             row = cursor.fetchone()
-            return bool(row and row['is_online'])
     except sqlite3.Error:
         return False
+    if not row:
+        return False
+    profile = _profile_from_row(row)
+    sort_key = (profile.pop('created_at') or '', profile.pop('id'))
+    _presence(profile['venue']).add(session_id, profile, sort_key)
+    return True
+
+def get_venue(session_id: str) -> str:
+    """The venue a guest checked in at (DEFAULT_VENUE if unknown)."""
+    profile = get_profile(session_id) if session_id else None
+    return profile['venue'] if profile else DEFAULT_VENUE
+
+def go_online(session_id: str):
+    """Mark a user as online in their venue."""
+    if session_id in _presence(get_venue(session_id), create=False):
+        return
+    if _load_presence_profile(session_id):
+        _queue_presence_write(session_id, True)
+
+def go_offline(session_id: str):
+    """Mark a user as offline."""
+    if _presence(get_venue(session_id), create=False).remove(session_id):
+        _queue_presence_write(session_id, False)
+
+def get_active_users(venue: str, exclude_session: str = None) -> list:
+    """Get the online users of one venue with their profiles."""
+    return _presence(venue, create=False).profiles(exclude_session)
+
+def is_user_online(session_id: str, venue: str) -> bool:
+    """Check if a user is online in the given venue."""
+    return session_id in _presence(venue, create=False)
+
+def get_presence_epoch(venue: str) -> str:
+    """Identifies a venue's presence feed; sequence numbers restart with it."""
+    return _presence(venue, create=False).epoch
+
+def get_presence_seq(venue: str) -> int:
+    """Sequence number of the latest presence change in a venue."""
+    return _presence(venue, create=False).seq
+
+def get_presence_changes(venue: str, since_seq: int):
+    """Presence deltas after since_seq, or None if the client needs a full snapshot."""
+    return _presence(venue, create=False).changes_since(since_seq)
+
+def take_presence_changes(venue: str):
+    """Presence deltas not yet broadcast (None if a snapshot is needed); marks them broadcast."""
+    return _presence(venue, create=False).take_unsent()
+
+def get_presence_snapshot(venue: str) -> dict:
+    """Full online list of a venue together with the sequence number it reflects."""
+    return _presence(venue, create=False).snapshot()
 
 
 # ============== Messages ==============
 
-def create_message(from_session, to_session, message_type, content):
+def create_message(from_session, to_session, message_type, content, venue=DEFAULT_VENUE):
     """Create a new message or drink offer."""
     with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute('''
-            INSERT INTO messages (from_session, to_session, message_type, content, status)
-            VALUES (?, ?, ?, ?, 'pending')
-        ''', (from_session, to_session, message_type, content))
+            INSERT INTO messages (from_session, to_session, message_type, content, status, venue)
+            VALUES (?, ?, ?, ?, 'pending', ?)
+        ''', (from_session, to_session, message_type, content, venue))
         message_id = cursor.lastrowid
         conn.commit()
         return message_id
@@ -180,53 +545,137 @@ def get_message(message_id):
 
 
 # ============== Profiles ==============
+# Profiles only change in create_profile() and delete_profile(), so reads are
+# served from an LRU cache that those two functions invalidate. Another
+# worker's writes can't invalidate it, so it is off by default with several.
+
+PROFILE_CACHE_SIZE = int(os.environ.get('PROFILE_CACHE_SIZE', 0 if sharedstate.enabled() else 2048))
+
+_PROFILE_COLUMNS = 'session_id, name, photo_url, photo_urls, color_frame, instagram, venue'
 
-def create_profile(session_id: str, name: str, photo_url: str = None, color_frame: str = None, instagram: str = None):
+def _profile_from_row(row) -> dict:
+    profile = dict(row)
+    profile['photo_urls'] = json.loads(profile['photo_urls']) if profile.get('photo_urls') else None
+    return profile
+
+_profile_cache = LRUCache(PROFILE_CACHE_SIZE)
+
+def create_profile(session_id: str, name: str, photo_url: str = None, color_frame: str = None, instagram: str = None,
+                   photo_urls: dict = None, venue: str = DEFAULT_VENUE):
     """Create or update a user profile."""
+    previous_venue = get_venue(session_id)
     with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute('''
-            INSERT OR REPLACE INTO profiles (session_id, name, photo_url, color_frame, instagram, is_online)
-            VALUES (?, ?, ?, ?, ?, 0)
-        ''', (session_id, name, photo_url, color_frame, instagram))
+            INSERT OR REPLACE INTO profiles (session_id, name, photo_url, color_frame, instagram, is_online, photo_urls, venue)
+            VALUES (?, ?, ?, ?, ?, 0, ?, ?)
+        ''', (session_id, name, photo_url, color_frame, instagram,
+              json.dumps(photo_urls) if photo_urls else None, venue))
         conn.commit()
+    _profile_cache.invalidate(session_id)
+    if session_id in _presence(previous_venue, create=False):
+        # Edited while online — stay online with the new details (user_updated),
+        # moving over if the guest switched venues
+        if previous_venue != venue:
+            _presence(previous_venue, create=False).remove(session_id)
+        _load_presence_profile(session_id)
+        _queue_presence_write(session_id, True)
 
 def get_profile(session_id: str):
     """Get a profile by session ID."""
+    profile = _profile_cache.get(session_id)
+    if profile is not None:
+        return dict(profile)
+    generation = _profile_cache.generation()
     try:
         with get_db() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT session_id, name, photo_url, color_frame, instagram FROM profiles WHERE session_id = ?', (session_id,))
+            cursor.execute(f'SELECT {_PROFILE_COLUMNS} FROM profiles WHERE session_id = ?', (session_id,))
             row = cursor.fetchone()
-            return dict(row) if row else None
     except sqlite3.Error:
         return None
+    if not row:
+        return None
+    profile = _profile_from_row(row)
+    _profile_cache.put(session_id, profile, generation)
+    return dict(profile)
+
+def get_profiles(session_ids) -> dict:
+    """Get many profiles, cached ones first and the rest in one query.
+
+    Returns {session_id: profile}; unknown ids are omitted.
+    """
+    profiles = {}
+    missing = []
+    for session_id in dict.fromkeys(s for s in session_ids if s):
+        profile = _profile_cache.get(session_id)
+        if profile is not None:
+            profiles[session_id] = dict(profile)
+        else:
+            missing.append(session_id)
+    if not missing:
+        return profiles
+    generation = _profile_cache.generation()
+    try:
+        with get_db() as conn:
+            cursor = conn.cursor()
+            placeholders = ','.join('?' * len(missing))
+            cursor.execute(
+                f'SELECT {_PROFILE_COLUMNS} FROM profiles WHERE session_id IN ({placeholders})',
+                missing
+            )
+            rows = cursor.fetchall()
+    except sqlite3.Error:
+        return profiles
+    for row in rows:
+        profile = _profile_from_row(row)
+        _profile_cache.put(profile['session_id'], profile, generation)
+        profiles[profile['session_id']] = dict(profile)
+    return profiles
 
 def delete_profile(session_id: str):
     """Delete a profile by session ID."""
+    venue = get_venue(session_id)
     with get_db() as conn:
         cursor = conn.cursor()
         cursor.execute('DELETE FROM profiles WHERE session_id = ?', (session_id,))
         conn.commit()
+    _profile_cache.invalidate(session_id)
+    _presence(venue, create=False).remove(session_id)
 
+def get_venues() -> list:
+    """Every venue that currently has a guest profile."""
+    try:
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute('SELECT DISTINCT venue FROM profiles ORDER BY venue')
+            return [row['venue'] for row in cursor.fetchall()]
+    except sqlite3.Error:
+        return []
 
-# ============== Menu Items ==============
 
-def init_menu_table():
-    """Create menu_items table if it doesn't exist."""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS menu_items (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                name TEXT NOT NULL,
-                price TEXT NOT NULL,
-                category TEXT NOT NULL,
-                img TEXT DEFAULT '',
-                sort_order INTEGER DEFAULT 0
+def is_photo_in_use(url: str, exclude_session: str = None) -> bool:
+    """True if a profile other than exclude_session still points at this photo URL.
+
+    Uploads are named by content hash, so two guests with the same photo share files.
+    """
+    try:
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(
+                'SELECT 1 FROM profiles WHERE session_id != ? AND (photo_url = ? OR photo_urls LIKE ?) LIMIT 1',
+                (exclude_session or '', url, f'%{json.dumps(url)}%')
             )
-        ''')
-        conn.commit()
+            return cursor.fetchone() is not None
+    except sqlite3.Error:
+        return True  # when in doubt, keep the file
+
+def get_profile_cache_stats() -> dict:
+    """Profile cache hit/miss counters (for the admin dashboard)."""
+    return _profile_cache.stats()
+
+
+# ============== Menu Items ==============
 
 def get_all_menu_items() -> list:
     """Get all menu items ordered by category then sort_order."""
@@ -287,11 +736,15 @@ def seed_menu_items(drinks: list):
 
 # ============== Stats ==============
 
-def count_messages() -> int:
+def count_messages(venue: str = None) -> int:
+    """Messages sent in one venue, or in all of them."""
     try:
         with get_db() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT COUNT(*) as cnt FROM messages')
+            if venue is None:
+                cursor.execute('SELECT COUNT(*) as cnt FROM messages')
+            else:
+                cursor.execute('SELECT COUNT(*) as cnt FROM messages WHERE venue = ?', (venue,))
             return cursor.fetchone()['cnt']
     except sqlite3.Error:
         return 0
@@ -316,74 +769,134 @@ def set_setting(key: str, value: str):
         conn.commit()
 
 
-# ============== Activity Log ==============
+# ============== Write-Behind Queue ==============
+# Activity log entries and game results are queued and committed in batches
+# by a background task (see app.py). WRITE_BEHIND=0 writes them inline.
+# Every queued record is keyed (table, venue, sessions), and a read flushes
+# only the records it could return.
 
-def log_activity(event_type: str, description: str, session_id: str = None):
-    try:
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute(
-                'INSERT INTO activity_log (event_type, description, session_id) VALUES (?, ?, ?)',
-                (event_type, description, session_id)
-            )
+WRITE_BEHIND = os.environ.get('WRITE_BEHIND', '1') == '1'
+
+def _write_batch(records):
+    """Commit (sql, params) records in one transaction, grouping runs of the same statement."""
+    with get_db() as conn:
+        try:
+            conn.execute('BEGIN')
+            for sql, group in itertools.groupby(records, key=lambda r: r[0]):
+                conn.executemany(sql, [params for _, params in group])
             conn.commit()
+        except sqlite3.Error:
+            conn.rollback()
+            raise
+
+def _is_transient_write_error(error):
+    """Locked or busy database, or an exhausted pool: worth retrying the same batch."""
+    return isinstance(error, sqlite3.OperationalError)
+
+_writes = WriteBehindQueue(
+    _write_batch,
+    is_transient=_is_transient_write_error,
+    interval=float(os.environ.get('WRITE_BEHIND_INTERVAL', 0.5)),
+    batch_size=int(os.environ.get('WRITE_BEHIND_BATCH', 100)),
+    max_size=int(os.environ.get('WRITE_BEHIND_MAX', 5000)),
+)
+
+def _submit_write(sql, params, key=None):
+    if WRITE_BEHIND:
+        _writes.submit(sql, params, key)
+        return
+    try:
+        _write_batch([(sql, params)])
     except sqlite3.Error:
-        pass  # Don't crash app if activity logging fails
+        pass  # Don't crash app if a fire-and-forget write fails
+
+def run_write_behind():
+    """Background writer loop — start once with socketio.start_background_task()."""
+    _writes.run()
+
+def flush_writes():
+    """Commit every queued write now (shutdown calls this)."""
+    _writes.flush()
+
+def _flush_writes_for(table, venue=None, session_id=None):
+    """Commit the queued writes to table for one venue and/or guest, so a read sees them."""
+    if WRITE_BEHIND:
+        _writes.flush(lambda key: _key_matches(key, table, venue, session_id))
+
+def _key_matches(key, table, venue, session_id):
+    return (key is not None and key[0] == table
+            and (venue is None or key[1] == venue)
+            and (session_id is None or session_id in key[2]))
+
+def _timestamp():
+    """Now, in the format SQLite's CURRENT_TIMESTAMP defaults use.
 
-def get_recent_activity(limit: int = 50) -> list:
+    Queued rows carry the time they were submitted, not the time their batch
+    commits, so they sort correctly against rows written straight away.
+    """
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.gmtime())
+
+def get_write_stats() -> dict:
+    """Write-behind queue depth and backpressure counters (for the admin dashboard)."""
+    return {'enabled': WRITE_BEHIND, **_writes.stats()}
+
+
+# ============== Activity Log ==============
+
+def log_activity(event_type: str, description: str, session_id: str = None, venue: str = DEFAULT_VENUE):
+    _submit_write(
+        'INSERT INTO activity_log (event_type, description, session_id, venue, created_at) VALUES (?, ?, ?, ?, ?)',
+        (event_type, description, session_id, venue, _timestamp()),
+        key=('activity_log', venue, (session_id,))
+    )
+
+def get_recent_activity(limit: int = 50, venue: str = None) -> list:
+    """Newest activity log entries of one venue, or of all of them."""
+    _flush_writes_for('activity_log', venue)
     try:
         with get_db() as conn:
             cursor = conn.cursor()
-            cursor.execute('SELECT * FROM activity_log ORDER BY created_at DESC LIMIT ?', (limit,))
+            if venue is None:
+                cursor.execute('SELECT * FROM activity_log ORDER BY created_at DESC LIMIT ?', (limit,))
+            else:
+                cursor.execute(
+                    'SELECT * FROM activity_log WHERE venue = ? ORDER BY created_at DESC LIMIT ?',
+                    (venue, limit)
+                )
             return [dict(row) for row in cursor.fetchall()]
     except sqlite3.Error:
         return []
 
-def clear_activity_log():
+def clear_activity_log(venue: str = None):
+    if WRITE_BEHIND:
+        _writes.discard(lambda key: _key_matches(key, 'activity_log', venue, None))
     with get_db() as conn:
         cursor = conn.cursor()
-        cursor.execute('DELETE FROM activity_log')
+        if venue is None:
+            cursor.execute('DELETE FROM activity_log')
+        else:
+            cursor.execute('DELETE FROM activity_log WHERE venue = ?', (venue,))
         conn.commit()
 
 
 # ============== Game Results ==============
 
-def init_game_results_table():
-    """Create game_results table if it doesn't exist."""
-    with get_db() as conn:
-        cursor = conn.cursor()
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS game_results (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                game_type TEXT NOT NULL,
-                session_a TEXT NOT NULL,
-                session_b TEXT NOT NULL,
-                winner_session TEXT,
-                loser_session TEXT,
-                result TEXT NOT NULL,
-                mode TEXT DEFAULT 'fun',
-                details TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        conn.commit()
-
-def save_game_result(game_type, session_a, session_b, winner_session, loser_session, result, mode='fun', details=None):
+def save_game_result(game_type, session_a, session_b, winner_session, loser_session, result, mode='fun', details=None,
+                     venue=DEFAULT_VENUE):
     """Save a game result."""
     details_json = json.dumps(details) if details else None
-    try:
-        with get_db() as conn:
-            cursor = conn.cursor()
-            cursor.execute('''
-                INSERT INTO game_results (game_type, session_a, session_b, winner_session, loser_session, result, mode, details)
-                VALUES (?, ?, ?, ?, ?, ?, ?, ?)
-            ''', (game_type, session_a, session_b, winner_session, loser_session, result, mode, details_json))
-            conn.commit()
-    except sqlite3.Error:
-        pass
+    _submit_write(
+        '''INSERT INTO game_results (game_type, session_a, session_b, winner_session, loser_session, result, mode, details,
+                                    venue, created_at)
+           VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)''',
+        (game_type, session_a, session_b, winner_session, loser_session, result, mode, details_json, venue,
+         _timestamp()),
+        key=('game_results', venue, (session_a, session_b))
+    )
 
 def get_user_game_results(session_id, limit=50):
     """Get all game results involving a specific user."""
+    _flush_writes_for('game_results', session_id=session_id)
     try:
         with get_db() as conn:
             cursor = conn.cursor()
@@ -411,21 +924,64 @@ def get_user_messages(session_id, limit=50):
         return []
 
 
+# ============== User Activity ==============
+
+def get_user_activity(session_id, limit=50, before=None):
+    """Get a user's drinks and games merged newest-first, with the other person's profile.
+
+    before is the (created_at, kind, id) of the last row of the previous page.
+    """
+    _flush_writes_for('game_results', session_id=session_id)
+    params = {'s': session_id, 'limit': limit}
+    cursor_clause = ''
+    if before:
+        cursor_clause = 'WHERE (a.created_at, a.kind, a.id) < (:before_at, :before_kind, :before_id)'
+        params.update(before_at=before[0], before_kind=before[1], before_id=before[2])
+    try:
+        with get_db() as conn:
+            cursor = conn.cursor()
+            cursor.execute(f'''
+                SELECT a.*, p.name AS other_name, p.photo_url AS other_photo
+                FROM (
+                    SELECT 'drink' AS kind, id, created_at, from_session, status,
+                           NULL AS game_type, NULL AS winner_session, NULL AS loser_session,
+                           NULL AS mode, NULL AS details,
+                           CASE WHEN from_session = :s THEN to_session ELSE from_session END AS other_session
+                    FROM messages
+                    WHERE from_session = :s OR to_session = :s
+                    UNION ALL
+                    SELECT 'game' AS kind, id, created_at, NULL, NULL,
+                           game_type, winner_session, loser_session, mode, details,
+                           CASE WHEN session_a = :s THEN session_b ELSE session_a END
+                    FROM game_results
+                    WHERE session_a = :s OR session_b = :s
+                ) a
+                LEFT JOIN profiles p ON p.session_id = a.other_session
+                {cursor_clause}
+                ORDER BY a.created_at DESC, a.kind DESC, a.id DESC
+                LIMIT :limit
+            ''', params)
+            return [dict(row) for row in cursor.fetchall()]
+    except sqlite3.Error:
+        return []
+
+
 # ============== Drink Stats ==============
 
-def get_drink_stats(limit: int = 10) -> list:
-    """Get top drinks by number of times sent."""
+def get_drink_stats(limit: int = 10, venue: str = None) -> list:
+    """Get top drinks by number of times sent, in one venue or in all of them."""
+    venue_clause = '' if venue is None else 'AND venue = :venue'
     try:
         with get_db() as conn:
             cursor = conn.cursor()
-            cursor.execute('''
+            cursor.execute(f'''
                 SELECT content as drink_name, COUNT(*) as count
                 FROM messages
-                WHERE message_type = 'drink'
+                WHERE message_type = 'drink' {venue_clause}
                 GROUP BY content
                 ORDER BY count DESC
-                LIMIT ?
-            ''', (limit,))
+                LIMIT :limit
+            ''', {'limit': limit, 'venue': venue})
             return [dict(row) for row in cursor.fetchall()]
     except sqlite3.Error:
         return []
@@ -0,0 +1,213 @@
+"""In-memory presence bookkeeping for connected Socket.IO clients.
+
+sharedstate.py has Redis-backed versions for running several workers.
+"""
+import threading
+import uuid
+from collections import deque
+
+
+class ClientRegistry:
+    """Two-way map between session_ids and their Socket.IO socket ids.
+
+    A session may have several sockets (one per open tab). A session stays
+    registered with no sockets while its disconnect grace timer is running,
+    until remove_session() is called. Safe to share between threads (under
+    asgi.py, handlers, timers and admin requests each run on their own).
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._sockets = {}   # session_id -> set of socket_ids
+        self._sessions = {}  # socket_id -> session_id
+
+    def bind(self, session_id, socket_id):
+        """Attach a socket to a session (moving it off any previous session)."""
+        with self._lock:
+            previous = self._sessions.get(socket_id)
+            if previous is not None and previous != session_id:
+                self._sockets.get(previous, set()).discard(socket_id)
+            self._sessions[socket_id] = session_id
+            self._sockets.setdefault(session_id, set()).add(socket_id)
+
+    def unbind_socket(self, socket_id):
+        """Detach a socket. Returns its session_id (or None); the session stays registered."""
+        with self._lock:
+            session_id = self._sessions.pop(socket_id, None)
+            if session_id is not None:
+                self._sockets.get(session_id, set()).discard(socket_id)
+            return session_id
+
+    def remove_session(self, session_id):
+        """Forget a session and all of its sockets. Returns the removed socket ids."""
+        with self._lock:
+            sockets = self._sockets.pop(session_id, set())
+            for socket_id in sockets:
+                self._sessions.pop(socket_id, None)
+            return sockets
+
+    def session_for(self, socket_id):
+        """O(1) lookup of the session that owns a socket."""
+        return self._sessions.get(socket_id)
+
+    def sockets_for(self, session_id):
+        with self._lock:
+            return set(self._sockets.get(session_id, ()))
+
+    def has_sockets(self, session_id):
+        return bool(self._sockets.get(session_id))
+
+    def sessions(self):
+        with self._lock:
+            return list(self._sockets)
+
+    def clear(self):
+        with self._lock:
+            self._sockets.clear()
+            self._sessions.clear()
+
+    def __contains__(self, session_id):
+        return session_id in self._sockets
+
+    def __len__(self):
+        return len(self._sockets)
+
+
+class PresenceStore:
+    """Authoritative set of online users, kept in memory.
+
+    Profiles are ordered by (created_at, id) like the old SQL query. The
+    ordered list is rebuilt lazily, only after a join or leave, so reads
+    between changes return the cached snapshot.
+
+    Every change is also appended to a short, sequence-numbered feed of
+    user_joined / user_updated / user_left deltas, so clients can catch up
+    on what they missed instead of re-downloading the whole list. Like
+    ClientRegistry, safe to share between threads.
+    """
+
+    def __init__(self, history=500):
+        self._lock = threading.RLock()
+        self._online = {}     # session_id -> (sort_key, profile dict)
+        self._ordered = None  # cached list of profile dicts, None when stale
+        self.epoch = uuid.uuid4().hex[:8]  # new per process, so seqs from a previous run are never replayed
+        self.seq = 0
+        self._sent_seq = 0
+        self._changes = deque(maxlen=history)
+
+    def _record(self, event, payload):
+        self.seq += 1
+        self._changes.append({'seq': self.seq, 'event': event, **payload})
+
+    def add(self, session_id, profile, sort_key):
+        with self._lock:
+            previous = self._online.get(session_id)
+            self._online[session_id] = (sort_key, dict(profile))
+            self._ordered = None
+            if previous is None:
+                self._record('user_joined', {'user': dict(profile)})
+            elif previous[1] != profile:
+                self._record('user_updated', {'user': dict(profile)})
+
+    def remove(self, session_id):
+        """Drop a user. Returns True if they were online."""
+        with self._lock:
+            if self._online.pop(session_id, None) is None:
+                return False
+            self._ordered = None
+            self._record('user_left', {'session_id': session_id})
+            return True
+
+    def get(self, session_id):
+        entry = self._online.get(session_id)
+        return dict(entry[1]) if entry else None
+
+    def profiles(self, exclude_session=None):
+        with self._lock:
+            if self._ordered is None:
+                self._ordered = [p for _, p in sorted(self._online.values(), key=lambda e: e[0])]
+            ordered = self._ordered
+        return [dict(p) for p in ordered if p['session_id'] != exclude_session]
+
+    def changes_since(self, seq):
+        """Deltas after seq, or None if they have already fallen out of the feed."""
+        with self._lock:
+            if seq >= self.seq:
+                return []
+            if not self._changes or self._changes[0]['seq'] > seq + 1:
+                return None
+            return [c for c in self._changes if c['seq'] > seq]
+
+    def take_unsent(self):
+        """Changes since the last take_unsent() (None if they fell out of the feed); marks them sent."""
+        with self._lock:
+            sent, self._sent_seq = self._sent_seq, self.seq
+            return self.changes_since(sent)
+
+    def snapshot(self):
+        with self._lock:
+            return {'epoch': self.epoch, 'seq': self.seq, 'users': self.profiles()}
+
+    def clear(self):
+        with self._lock:
+            for session_id in list(self._online):
+                self.remove(session_id)
+
+    def __contains__(self, session_id):
+        return session_id in self._online
+
+    def __len__(self):
+        return len(self._online)
+
+
+class PresenceBroadcaster:
+    """Coalesces bursts of presence changes into a single broadcast per venue.
+
+    request(venue) marks that venue's presence as dirty. The first request
+    in a quiet period schedules one send() after `window` seconds; requests
+    that arrive in the meantime ride along with it, and send() gets the set
+    of venues that changed. A window of 0 sends immediately.
+    """
+
+    def __init__(self, send, window, call_later):
+        self._send = send
+        self.window = window
+        self._call_later = call_later
+        self._lock = threading.Lock()
+        self._pending = False
+        self._dirty = set()
+        self.requested = 0
+        self.broadcasts = 0
+
+    def request(self, venue):
+        with self._lock:
+            self.requested += 1
+            self._dirty.add(venue)
+            if self._pending:
+                return
+            self._pending = window_open = self.window > 0
+        if window_open:
+            self._call_later(self.window, self._flush_pending)
+        else:
+            self.flush()
+
+    def _flush_pending(self):
+        with self._lock:
+            self._pending = False
+        self.flush()
+
+    def flush(self):
+        with self._lock:
+            venues, self._dirty = self._dirty, set()
+            self.broadcasts += len(venues)
+        if venues:
+            self._send(venues)
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                'requested': self.requested,
+                'broadcasts': self.broadcasts,
+                'avoided': max(self.requested - self.broadcasts, 0),
+                'window_ms': int(self.window * 1000),
+            }
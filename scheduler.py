@@ -0,0 +1,110 @@
+"""Single-task timer scheduler.
+
+All game, disconnect and housekeeping timeouts share one heap, driven by one
+background task, instead of one threading.Timer (and one green thread) each.
+"""
+import heapq
+import itertools
+import threading
+import time
+
+
+class TimerHandle:
+    """A scheduled callback. cancel() is safe to call more than once."""
+
+    __slots__ = ('when', 'callback', 'args', 'cancelled', '_scheduler')
+
+    def __init__(self, when, callback, args, scheduler):
+        self.when = when
+        self.callback = callback
+        self.args = args
+        self.cancelled = False
+        self._scheduler = scheduler
+
+    def cancel(self):
+        self._scheduler._on_cancel(self)
+
+
+class Scheduler:
+    """Heap of pending timers, run by a single loop (see run())."""
+
+    def __init__(self, max_idle=60.0):
+        self._heap = []  # (when, seq, handle)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+        self._wakeup = threading.Event()
+        self._max_idle = max_idle
+        self._cancelled_in_heap = 0
+        self.fired = 0
+        self.cancelled = 0
+        self.errors = 0
+
+    def call_later(self, delay, callback, *args):
+        """Run callback(*args) after delay seconds. Returns a cancellable TimerHandle."""
+        handle = TimerHandle(time.monotonic() + delay, callback, args, self)
+        with self._lock:
+            heapq.heappush(self._heap, (handle.when, next(self._seq), handle))
+            earliest = self._heap[0][2] is handle
+        if earliest:
+            self._wakeup.set()
+        return handle
+
+    def _on_cancel(self, handle):
+        # Checked under the lock: a handle _pop_due() has already taken is
+        # marked cancelled there and is no longer counted in the heap
+        with self._lock:
+            if handle.cancelled:
+                return
+            handle.cancelled = True
+            self.cancelled += 1
+            self._cancelled_in_heap += 1
+            # Drop dead entries once they make up most of the heap
+            if self._cancelled_in_heap > 64 and self._cancelled_in_heap * 2 > len(self._heap):
+                self._heap = [entry for entry in self._heap if not entry[2].cancelled]
+                heapq.heapify(self._heap)
+                self._cancelled_in_heap = 0
+
+    def _pop_due(self, now):
+        due = []
+        with self._lock:
+            while self._heap and self._heap[0][0] <= now:
+                handle = heapq.heappop(self._heap)[2]
+                if handle.cancelled:
+                    self._cancelled_in_heap -= 1
+                    continue
+                handle.cancelled = True  # fired handles can no longer be cancelled
+                due.append(handle)
+            next_when = self._heap[0][0] if self._heap else None
+        return due, next_when
+
+    def run_due(self):
+        """Fire every timer that is due. Returns seconds until the next one (or None)."""
+        now = time.monotonic()
+        due, next_when = self._pop_due(now)
+        for handle in due:
+            self.fired += 1
+            try:
+                handle.callback(*handle.args)
+            except Exception as e:
+                self.errors += 1
+                print(f"Scheduled callback {getattr(handle.callback, '__name__', handle.callback)} failed: {e}")
+        return None if next_when is None else max(next_when - time.monotonic(), 0)
+
+    def run(self):
+        """Scheduler loop — start once with socketio.start_background_task()."""
+        while True:
+            delay = self.run_due()
+            timeout = self._max_idle if delay is None else min(delay, self._max_idle)
+            if timeout > 0:
+                self._wakeup.wait(timeout)
+            self._wakeup.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            pending = len(self._heap) - self._cancelled_in_heap
+        return {
+            'pending': pending,
+            'fired': self.fired,
+            'cancelled': self.cancelled,
+            'errors': self.errors,
+        }
@@ -0,0 +1,405 @@
+"""Cross-worker state for running several worker processes.
+
+Set MESSAGE_QUEUE=redis://host:6379/0 and Socket.IO fan-out goes through
+Redis pub/sub, while presence, the socket registry and in-flight games
+live in Redis instead of one process's memory. Each worker still runs its
+own timers; every timer callback re-reads the shared state, so a timer
+whose game was finished on another worker is a no-op.
+
+Leave MESSAGE_QUEUE unset for the default single-worker, in-memory mode.
+"""
+import json
+import os
+import time
+from contextlib import contextmanager
+
+from games import GameEngine
+from presence import ClientRegistry, PresenceStore
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+MESSAGE_QUEUE = os.environ.get('MESSAGE_QUEUE', '')
+KEY_PREFIX = os.environ.get('SHARED_STATE_PREFIX', 'shamrock:')
+GAME_LOCK_TIMEOUT = 5.0  # seconds; a crashed worker can't hold a game forever
+WORKER_TTL = float(os.environ.get('WORKER_TTL', 30))  # seconds a worker's heartbeat lasts
+
+_client = None
+
+
+def enabled() -> bool:
+    return bool(MESSAGE_QUEUE)
+
+
+def get_client():
+    """The process-wide Redis client (created on first use)."""
+    global _client
+    if _client is None:
+        if redis is None:
+            raise RuntimeError('MESSAGE_QUEUE is set but the redis package is not installed')
+        _client = redis.Redis.from_url(MESSAGE_QUEUE, decode_responses=True)
+    return _client
+
+
+class RedisClientRegistry(ClientRegistry):
+    """ClientRegistry shared by every worker.
+
+    Socket ids are unique across workers, so the session -> sockets sets
+    live in Redis. The socket -> session map stays local: a socket only
+    ever sends events to the worker it is connected to.
+
+    Each worker also records the sockets it holds, and the sessions whose
+    disconnect timer it runs, under its worker_id, and keeps a heartbeat
+    key alive with heartbeat(). When a worker dies or is redeployed, its
+    sockets would otherwise stay in the sets for good, and their guests
+    online; sweep_dead_workers() clears them out.
+    """
+
+    def __init__(self, client, prefix=KEY_PREFIX):
+        super().__init__()
+        self._redis = client
+        self.worker_id = os.urandom(6).hex()
+        self._all = f'{prefix}clients'
+        self._key = f'{prefix}clients:' + '{}'
+        self._waiting = f'{prefix}disconnecting'  # session_id -> worker running its disconnect timer
+        self._workers = f'{prefix}workers'
+        self._alive_key = f'{prefix}workers:' + '{}' + ':alive'
+        self._owned_key = f'{prefix}workers:' + '{}' + ':sockets'  # socket_id -> session_id
+        self._owned = self._owned_key.format(self.worker_id)
+
+    def bind(self, session_id, socket_id):
+        previous = self._sessions.get(socket_id)
+        pipe = self._redis.pipeline()
+        if previous is not None and previous != session_id:
+            pipe.srem(self._key.format(previous), socket_id)
+        pipe.sadd(self._key.format(session_id), socket_id)
+        pipe.sadd(self._all, session_id)
+        pipe.hset(self._owned, socket_id, session_id)
+        pipe.hdel(self._waiting, session_id)
+        pipe.execute()
+        self._sessions[socket_id] = session_id
+
+    def unbind_socket(self, socket_id):
+        session_id = self._sessions.pop(socket_id, None)
+        if session_id is not None:
+            pipe = self._redis.pipeline()
+            pipe.srem(self._key.format(session_id), socket_id)
+            pipe.hdel(self._owned, socket_id)
+            pipe.scard(self._key.format(session_id))
+            if not pipe.execute()[2]:
+                # Its last socket: this worker's disconnect timer now decides
+                self._redis.hset(self._waiting, session_id, self.worker_id)
+        return session_id
+
+    def remove_session(self, session_id):
+        pipe = self._redis.pipeline()
+        pipe.smembers(self._key.format(session_id))
+        pipe.delete(self._key.format(session_id))
+        pipe.srem(self._all, session_id)
+        pipe.hdel(self._waiting, session_id)
+        sockets = pipe.execute()[0]
+        if sockets:
+            self._redis.hdel(self._owned, *sockets)
+        for socket_id in sockets:
+            self._sessions.pop(socket_id, None)
+        return sockets
+
+    def heartbeat(self):
+        """Mark this worker alive for WORKER_TTL seconds; repeat well within that."""
+        pipe = self._redis.pipeline()
+        pipe.set(self._alive_key.format(self.worker_id), 1, px=int(WORKER_TTL * 1000))
+        pipe.sadd(self._workers, self.worker_id)
+        pipe.execute()
+
+    def retire(self):
+        """Give up the heartbeat on a clean shutdown, so the next sweep needn't wait out the TTL."""
+        self._redis.delete(self._alive_key.format(self.worker_id))
+
+    def sweep_dead_workers(self):
+        """Forget the sockets of every worker whose heartbeat has lapsed.
+
+        Returns the sessions left registered with no socket and no live worker
+        timing their disconnect. They are now this worker's to time out.
+        """
+        dead = {worker for worker in self._redis.smembers(self._workers)
+                if worker != self.worker_id and not self._redis.exists(self._alive_key.format(worker))}
+        candidates = set()
+        for worker in dead:
+            owned = self._owned_key.format(worker)
+            sockets = self._redis.hgetall(owned)
+            pipe = self._redis.pipeline()
+            for socket_id, session_id in sockets.items():
+                pipe.srem(self._key.format(session_id), socket_id)
+            pipe.delete(owned)
+            pipe.srem(self._workers, worker)
+            pipe.execute()
+            candidates.update(sockets.values())
+        for session_id, worker in self._redis.hgetall(self._waiting).items():
+            if worker != self.worker_id and not self._redis.exists(self._alive_key.format(worker)):
+                candidates.add(session_id)
+        orphans = [s for s in candidates if s in self and not self.has_sockets(s)]
+        if orphans:
+            self._redis.hset(self._waiting, mapping={s: self.worker_id for s in orphans})
+        return orphans
+
+    def sockets_for(self, session_id):
+        return self._redis.smembers(self._key.format(session_id))
+
+    def has_sockets(self, session_id):
+        return self._redis.scard(self._key.format(session_id)) > 0
+
+    def sessions(self):
+        return list(self._redis.smembers(self._all))
+
+    def clear(self):
+        sessions = self._redis.smembers(self._all)
+        if sessions:
+            self._redis.delete(self._all, *(self._key.format(s) for s in sessions))
+        self._redis.delete(self._waiting, self._owned)
+        self._sessions.clear()
+
+    def __contains__(self, session_id):
+        return bool(self._redis.sismember(self._all, session_id))
+
+    def __len__(self):
+        return self._redis.scard(self._all)
+
+
+# Write a game back only while it is still in flight, never re-creating one
+# that another worker has finished meanwhile
+_SAVE_GAME = """
+if redis.call('HEXISTS', KEYS[1], ARGV[1]) == 1 then redis.call('HSET', KEYS[1], ARGV[1], ARGV[2]) end
+"""
+
+# Returns [previously broadcast seq, current seq] and marks everything up to
+# the current seq as broadcast, so only one worker sends each change
+_TAKE_UNSENT = """
+local seq = tonumber(redis.call('GET', KEYS[1]) or '0')
+local sent = tonumber(redis.call('GET', KEYS[2]) or '0')
+if seq > sent then redis.call('SET', KEYS[2], seq) end
+return {sent, seq}
+"""
+
+
+class RedisPresenceStore(PresenceStore):
+    """PresenceStore shared by every worker.
+
+    The online set is a hash of session_id -> [sort_key, profile], the
+    change feed a capped list. profiles() keeps a local copy of the sorted
+    list and only rebuilds it when the shared sequence number has moved.
+    """
+
+    def __init__(self, client, history=500, prefix=KEY_PREFIX):
+        self._redis = client
+        self._history = history
+        self._online_key = f'{prefix}presence:online'
+        self._seq_key = f'{prefix}presence:seq'
+        self._sent_key = f'{prefix}presence:sent'
+        self._changes_key = f'{prefix}presence:changes'
+        epoch_key = f'{prefix}presence:epoch'
+        client.set(epoch_key, os.urandom(4).hex(), nx=True)
+        self.epoch = client.get(epoch_key)  # shared, so seqs mean the same on every worker
+        self._ordered = None
+        self._ordered_seq = None
+        self._take_unsent = client.register_script(_TAKE_UNSENT)
+
+    @property
+    def seq(self):
+        return int(self._redis.get(self._seq_key) or 0)
+
+    def _record(self, pipe, event, payload):
+        """Append a change to the feed inside a WATCHed pipeline (already in MULTI)."""
+        seq = int(pipe.get(self._seq_key) or 0) + 1
+        pipe.multi()
+        pipe.set(self._seq_key, seq)
+        pipe.rpush(self._changes_key, json.dumps({'seq': seq, 'event': event, **payload}))
+        pipe.ltrim(self._changes_key, -self._history, -1)
+        return pipe
+
+    def add(self, session_id, profile, sort_key):
+        entry = json.dumps([list(sort_key), profile])
+
+        def update(pipe):
+            raw = pipe.hget(self._online_key, session_id)
+            previous = json.loads(raw)[1] if raw else None
+            if previous is not None and previous == profile:
+                pipe.multi()
+                pipe.hset(self._online_key, session_id, entry)
+                return
+            event = 'user_joined' if previous is None else 'user_updated'
+            self._record(pipe, event, {'user': dict(profile)})
+            pipe.hset(self._online_key, session_id, entry)
+
+        self._redis.transaction(update, self._online_key, self._seq_key)
+
+    def remove(self, session_id):
+        removed = []
+
+        def update(pipe):
+            removed.clear()
+            if not pipe.hexists(self._online_key, session_id):
+                return
+            self._record(pipe, 'user_left', {'session_id': session_id})
+            pipe.hdel(self._online_key, session_id)
+            removed.append(True)
+
+        self._redis.transaction(update, self._online_key, self._seq_key)
+        return bool(removed)
+
+    def get(self, session_id):
+        raw = self._redis.hget(self._online_key, session_id)
+        return json.loads(raw)[1] if raw else None
+
+    def profiles(self, exclude_session=None):
+        seq = self.seq
+        if self._ordered is None or self._ordered_seq != seq:
+            entries = [json.loads(raw) for raw in self._redis.hvals(self._online_key)]
+            self._ordered = [p for _, p in sorted(entries, key=lambda e: e[0])]
+            self._ordered_seq = seq
+        return [dict(p) for p in self._ordered if p['session_id'] != exclude_session]
+
+    def changes_since(self, seq):
+        if seq >= self.seq:
+            return []
+        changes = [json.loads(raw) for raw in self._redis.lrange(self._changes_key, 0, -1)]
+        if not changes or changes[0]['seq'] > seq + 1:
+            return None
+        return [c for c in changes if c['seq'] > seq]
+
+    def take_unsent(self):
+        sent, seq = self._take_unsent(keys=[self._seq_key, self._sent_key])
+        if seq <= sent:
+            return []
+        return self.changes_since(sent)
+
+    def clear(self):
+        for session_id in self._redis.hkeys(self._online_key):
+            self.remove(session_id)
+
+    def __contains__(self, session_id):
+        return bool(self._redis.hexists(self._online_key, session_id))
+
+    def __len__(self):
+        return self._redis.hlen(self._online_key)
+
+
+class RedisGameEngine(GameEngine):
+    """GameEngine whose games live in Redis.
+
+    get() returns a fresh copy, so handlers change a game inside
+    locked(game_id) and write it back with save(). pop() is atomic: when
+    two workers race to finish a game, only one of them gets it. Timer
+    handles stay local to the worker that armed them.
+    """
+
+    def __init__(self, client, prefix=KEY_PREFIX):
+        super().__init__()
+        self._redis = client
+        self._games_key = f'{prefix}games'
+        self._user_key = f'{prefix}games:user:' + '{}'
+        self._lock_key = f'{prefix}games:lock:' + '{}'
+        self._timers = {}  # game_id -> TimerHandle armed on this worker
+        self._save = client.register_script(_SAVE_GAME)
+
+    def _load(self, raw):
+        state = json.loads(raw)
+        return self.types[state['game_type']].game_class.from_state(state)
+
+    def create(self, type_name, game_id, session_a, session_b, mode='fun', drink='', venue=None):
+        game = self.types[type_name].game_class(game_id, type_name, session_a, session_b, mode, drink, venue)
+        pipe = self._redis.pipeline()
+        pipe.hset(self._games_key, game_id, json.dumps(game.state()))
+        for session_id in game.players:
+            pipe.sadd(self._user_key.format(session_id), game_id)
+        pipe.execute()
+        return game
+
+    def save(self, game):
+        self._save(keys=[self._games_key], args=[game.game_id, json.dumps(game.state())])
+
+    @contextmanager
+    def locked(self, game_id):
+        with self._redis.lock(self._lock_key.format(game_id), timeout=GAME_LOCK_TIMEOUT,
+                              blocking_timeout=GAME_LOCK_TIMEOUT):
+            yield
+
+    def get(self, game_id, type_name=None):
+        if not game_id:
+            return None
+        raw = self._redis.hget(self._games_key, game_id)
+        if raw is None:
+            return None
+        game = self._load(raw)
+        if type_name is not None and game.game_type != type_name:
+            return None
+        return game
+
+    def pop(self, game_id, type_name=None):
+        game = self.get(game_id, type_name)
+        if game is None:
+            if game_id and not self._redis.hexists(self._games_key, game_id):
+                self._cancel_timer(game_id)  # finished on another worker; drop our timer too
+            return None
+        self._cancel_timer(game_id)
+        if not self._redis.hdel(self._games_key, game_id):
+            return None  # another worker finished it first
+        pipe = self._redis.pipeline()
+        for session_id in game.players:
+            pipe.srem(self._user_key.format(session_id), game_id)
+        pipe.execute()
+        return game
+
+    def _cancel_timer(self, game_id):
+        timer = self._timers.pop(game_id, None)
+        if timer:
+            timer.cancel()
+
+    def set_timer(self, game, timer):
+        self._cancel_timer(game.game_id)
+        self._timers[game.game_id] = timer
+
+    def games_for(self, session_id):
+        game_ids = list(self._redis.smembers(self._user_key.format(session_id)))
+        if not game_ids:
+            return []
+        return [self._load(raw) for raw in self._redis.hmget(self._games_key, game_ids) if raw]
+
+    def _all(self):
+        return [self._load(raw) for raw in self._redis.hvals(self._games_key)]
+
+    def cleanup_stale(self, max_age):
+        cutoff = time.time() - max_age
+        stale = [game.game_id for game in self._all() if game.created_at < cutoff]
+        return [game for game in (self.pop(gid) for gid in stale) if game]
+
+    def counts(self) -> dict:
+        counts = {name: 0 for name in self.types}
+        for game in self._all():
+            counts[game.game_type] = counts.get(game.game_type, 0) + 1
+        return counts
+
+    def __len__(self):
+        return self._redis.hlen(self._games_key)
+
+
+def create_presence_store(venue):
+    """A venue's presence store; each venue has its own keys, sequence and feed."""
+    if enabled():
+        return RedisPresenceStore(get_client(), prefix=f'{KEY_PREFIX}venue:{venue}:')
+    return PresenceStore()
+
+
+def presence_store_exists(venue):
+    """Whether a worker has created this venue's presence store (never, in memory mode)."""
+    return enabled() and bool(get_client().exists(f'{KEY_PREFIX}venue:{venue}:presence:epoch'))
+
+
+def create_client_registry():
+    return RedisClientRegistry(get_client()) if enabled() else ClientRegistry()
+
+
+def create_game_engine():
+    return RedisGameEngine(get_client()) if enabled() else GameEngine()
+
@@ -1,4 +1,48 @@
 // Shamrock App - Shared utilities
-// Most page-specific logic is in the templates
+// Loaded on every page by base.html, which provides the toast container and confirm modal.
+// Page-specific logic lives in static/js/.
 
-console.log('Shamrock App loaded');
+// ===== Confirm Dialog =====
+function showConfirm(message, onConfirm, confirmText = 'Send ✓', cancelText = 'Cancel') {
+    document.getElementById('confirm-message').textContent = message;
+    document.getElementById('confirm-ok').textContent = confirmText;
+    document.getElementById('confirm-cancel').textContent = cancelText;
+    document.getElementById('confirm-modal').classList.remove('hidden');
+
+    const confirmHandler = () => {
+        document.getElementById('confirm-modal').classList.add('hidden');
+        onConfirm();
+        cleanup();
+    };
+    const cancelHandler = () => {
+        document.getElementById('confirm-modal').classList.add('hidden');
+        cleanup();
+    };
+    const cleanup = () => {
+        document.getElementById('confirm-ok').removeEventListener('click', confirmHandler);
+        document.getElementById('confirm-cancel').removeEventListener('click', cancelHandler);
+    };
+    document.getElementById('confirm-ok').addEventListener('click', confirmHandler);
+    document.getElementById('confirm-cancel').addEventListener('click', cancelHandler);
+}
+
+
+// ===== Toast =====
+function showToast(message, type = 'info') {
+    const container = document.getElementById('toast-container');
+    const toast = document.createElement('div');
+    toast.className = `toast toast-${type}`;
+    toast.textContent = message;
+    container.appendChild(toast);
+    setTimeout(() => {
+        toast.classList.add('fade-out');
+        setTimeout(() => toast.remove(), 300);
+    }, 3000);
+}
+
+
+function escapeHtml(text) {
+    const div = document.createElement('div');
+    div.textContent = text;
+    return div.innerHTML;
+}
@@ -0,0 +1,115 @@
+// People page - game challenges: setup steps, waiting modal, how-to-play.
+// The games themselves live in static/js/games/ and are loaded on demand.
+
+// ===== Challenge Waiting Modal =====
+let challengeWaitingGameType = null;
+
+function showChallengeWaiting(targetName, gameLabel) {
+    document.getElementById('challenge-waiting-message').textContent =
+        `Waiting for ${targetName}...`;
+    document.getElementById('challenge-waiting-detail').textContent =
+        `${gameLabel} challenge sent`;
+    document.getElementById('challenge-waiting-modal').classList.remove('hidden');
+    challengeWaitingGameType = gameLabel;
+}
+
+function hideChallengeWaiting() {
+    document.getElementById('challenge-waiting-modal').classList.add('hidden');
+    challengeWaitingGameType = null;
+}
+
+document.getElementById('challenge-waiting-cancel').addEventListener('click', hideChallengeWaiting);
+
+
+// ===== Game setup (Action Modal) =====
+Object.entries(gameLabels).forEach(([type, label]) => {
+    document.getElementById(`${type}-btn`).addEventListener('click', () => {
+        document.getElementById('action-step').classList.add('hidden');
+        Object.keys(gameLabels).forEach(other => {
+            document.getElementById(`${other}-setup-step`).classList.toggle('hidden', other !== type);
+        });
+        loadGame(type).catch(() => {});  // fetch the game while the player picks a mode
+    });
+
+    document.querySelectorAll(`.${type}-mode-btn`).forEach(btn => {
+        btn.addEventListener('click', () => {
+            const mode = btn.dataset.mode;
+            socket.emit(`${type}_challenge`, {
+                to_session: targetSession,
+                mode: mode,
+                drink: mode === 'drink' ? 'drink' : '',
+            });
+            closeActionModal();
+            showChallengeWaiting(userName(targetSession), label);
+        });
+    });
+});
+
+// ===== Games ended because the other player left =====
+Object.keys(gameLabels).forEach(type => {
+    socket.on(`${type}_result`, (data) => {
+        if (data.result === 'cancelled') {
+            document.getElementById(`${type}-incoming-modal`).classList.add('hidden');
+        }
+        if (data.forfeit) showToast(data.message, 'info');
+    });
+});
+
+
+// ===== How to Play =====
+const gameRules = {
+    rps: {
+        title: '✊ Rock Paper Scissors',
+        body: `<p><strong>How it works:</strong></p>
+<p>1. Choose your mode: <em>Just for Fun</em> or <em>Play for a Drink</em> (loser buys).</p>
+<p>2. Both players pick Rock, Paper, or Scissors.</p>
+<p>3. Rock beats Scissors, Scissors beats Paper, Paper beats Rock.</p>
+<p>4. You have <strong>30 seconds</strong> to choose or you forfeit!</p>`
+    },
+    bomb: {
+        title: '💣 Bomb Pass',
+        body: `<p><strong>How it works:</strong></p>
+<p>1. A bomb starts with the challenger.</p>
+<p>2. Tap <strong>PASS!</strong> to throw it to your opponent.</p>
+<p>3. They pass it back, you pass it again — back and forth!</p>
+<p>4. The bomb has a <strong>secret fuse</strong> (8–15 seconds). Whoever is holding it when it explodes <strong>loses</strong>!</p>
+<p>5. There's a 0.5s cooldown between passes — timing is everything.</p>`
+    },
+    tap: {
+        title: '👆 Tap Race',
+        body: `<p><strong>How it works:</strong></p>
+<p>1. After a 3-second countdown, both players tap as fast as they can!</p>
+<p>2. You have <strong>10 seconds</strong> to get the most taps.</p>
+<p>3. Watch your runner race up the track with each tap.</p>
+<p>4. Highest tap count wins!</p>`
+    },
+    ttol: {
+        title: '🤥 2 Truths 1 Lie',
+        body: `<p><strong>How it works:</strong></p>
+<p>1. <strong>Write Phase</strong> (90s): Both players write 3 statements — 2 truths and 1 lie. Tap the lie to mark it.</p>
+<p>2. <strong>Guess Phase</strong> (60s): You see your opponent's 3 statements. Tap the one you think is the lie!</p>
+<p>3. If you spot their lie and they miss yours — you win! If you both guess right (or both wrong), it's a draw.</p>`
+    },
+};
+
+document.querySelectorAll('.how-to-play-btn').forEach(btn => {
+    btn.addEventListener('click', (e) => {
+        e.stopPropagation();
+        const game = btn.dataset.game;
+        const rules = gameRules[game];
+        if (!rules) return;
+        document.getElementById('htp-title').textContent = rules.title;
+        document.getElementById('htp-body').innerHTML = rules.body;
+        document.getElementById('how-to-play-modal').classList.remove('hidden');
+    });
+});
+
+document.getElementById('how-to-play-close').addEventListener('click', () => {
+    document.getElementById('how-to-play-modal').classList.add('hidden');
+});
+document.querySelector('#how-to-play-modal .modal-backdrop').addEventListener('click', () => {
+    document.getElementById('how-to-play-modal').classList.add('hidden');
+});
+
+// Every page script has registered its handlers by now
+socket.connect();
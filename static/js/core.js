@@ -0,0 +1,144 @@
+// People page - core: session, profile cache, socket, browser notifications,
+// and the lazy loader for game code (static/js/games/*.js).
+
+// Check session
+const sessionId = localStorage.getItem('shamrockSession');
+if (!sessionId) {
+    window.location.href = '/';
+}
+
+const myName = localStorage.getItem('shamrockProfileName') || 'You';
+document.getElementById('my-name').textContent = myName;
+
+let targetSession = null;
+
+// Profile cache: session_id -> {name, photo_url, color_frame}
+const userProfiles = {};
+
+function userName(sessId) {
+    const p = userProfiles[sessId];
+    return p ? p.name : 'Someone';
+}
+
+
+// ===== Browser Notifications (persistent banner) =====
+(function() {
+    const banner = document.getElementById('notif-banner');
+    const enableBtn = document.getElementById('notif-enable-btn');
+    const bannerText = document.getElementById('notif-banner-text');
+
+    function updateBanner() {
+        if (!('Notification' in window)) return; // not supported
+        if (Notification.permission === 'granted') {
+            banner.classList.add('hidden');
+            return;
+        }
+        if (Notification.permission === 'denied') {
+            bannerText.textContent = "Notifications are blocked — you'll miss drink offers and game invites!";
+            enableBtn.textContent = 'Fix It';
+            banner.classList.remove('hidden');
+        } else {
+            // 'default' — can still request
+            bannerText.textContent = "Notifications are off — you'll miss drink offers and game invites!";
+            enableBtn.textContent = 'Turn On';
+            banner.classList.remove('hidden');
+        }
+    }
+
+    enableBtn.addEventListener('click', () => {
+        if (Notification.permission === 'denied') {
+            // Can't re-request, show instructions
+            const isIOS = /iPad|iPhone|iPod/.test(navigator.userAgent) && !window.MSStream;
+            const isAndroid = /Android/.test(navigator.userAgent);
+            let msg = '';
+            if (isIOS) {
+                msg = 'Go to Settings → Safari → Notifications → turn ON';
+            } else if (isAndroid) {
+                msg = 'Tap the lock icon in the address bar → Permissions → Allow notifications';
+            } else {
+                msg = 'Click the lock icon next to the URL → Notifications → Allow';
+            }
+            alert(msg);
+        } else {
+            Notification.requestPermission().then((perm) => {
+                if (perm === 'granted') {
+                    banner.classList.add('hidden');
+                    if (navigator.serviceWorker && navigator.serviceWorker.controller) {
+                        navigator.serviceWorker.ready.then(reg => {
+                            reg.showNotification('Shamrock', { body: 'Notifications enabled! 🎉', icon: '/static/icon-192.png' });
+                        });
+                    }
+                }
+                updateBanner();
+            });
+        }
+    });
+
+    updateBanner();
+})();
+
+function sendBrowserNotification(title, body) {
+    if ('Notification' in window && Notification.permission === 'granted' && document.hidden) {
+        if (navigator.serviceWorker && navigator.serviceWorker.controller) {
+            navigator.serviceWorker.ready.then(reg => {
+                reg.showNotification(title, { body, icon: '/static/icon-192.png' });
+            });
+        } else {
+            const n = new Notification(title, { body, icon: '/static/icon-192.png' });
+            n.onclick = () => { window.focus(); n.close(); };
+            setTimeout(() => n.close(), 8000);
+        }
+    }
+}
+
+
+// ===== Socket Connection =====
+// Connected by challenges.js, the last page script, once every handler is registered
+const socket = io({ autoConnect: false });
+
+// ===== Lazy game code =====
+// Each game's script is only fetched when it's first needed: when we open its
+// setup step, or when the first event for that game arrives (e.g. rps_incoming).
+// Events that arrive while the script is loading are replayed to the handlers
+// it registers, in order. Game scripts are plain scripts sharing this page's
+// globals (socket, sessionId, userName, showToast, ...).
+const gameScripts = window.SHAMROCK_GAME_SCRIPTS || {};  // type -> fingerprinted URL
+const gameLabels = {
+    rps: 'Rock Paper Scissors',
+    bomb: 'Bomb Pass',
+    tap: 'Tap Race',
+    ttol: '2 Truths 1 Lie',
+};
+const gameLoads = {};   // type -> Promise
+const gameLoaded = {};  // type -> true once the script has run
+
+function loadGame(type) {
+    if (!gameLoads[type]) {
+        gameLoads[type] = new Promise((resolve, reject) => {
+            const script = document.createElement('script');
+            script.src = gameScripts[type];
+            script.onload = () => {
+                gameLoaded[type] = true;
+                resolve();
+            };
+            script.onerror = () => {
+                delete gameLoads[type];  // allow a retry
+                script.remove();
+                reject(new Error(`Could not load ${type}`));
+            };
+            document.head.appendChild(script);
+        });
+    }
+    return gameLoads[type];
+}
+
+socket.onAny((event, ...args) => {
+    const type = event.split('_')[0];
+    if (!(type in gameScripts) || gameLoaded[type]) return;
+    const existing = new Set(socket.listeners(event));
+    loadGame(type).then(() => {
+        socket.listeners(event).filter(fn => !existing.has(fn)).forEach(fn => fn(...args));
+    }).catch(() => {
+        showToast('Could not load the game. Check your connection.', 'error');
+    });
+});
@@ -0,0 +1,173 @@
+// Bomb Pass - loaded on demand by core.js.
+
+// ===== Bomb Pass =====
+let bombGameId = null;
+let bombOpponentSession = null;
+let bombIsAnimating = false;
+
+socket.on('bomb_error', (data) => { hideChallengeWaiting(); showToast(data.message, 'error'); });
+
+socket.on('bomb_declined', (data) => {
+    hideChallengeWaiting();
+    showToast(`${userName(data.from_session)} declined your Bomb Pass`, 'info');
+});
+
+socket.on('bomb_incoming', (data) => {
+    bombGameId = data.game_id;
+    const modeText = data.mode === 'drink' ? 'Loser buys the winner a drink!' : 'Just for fun!';
+    const bombPhoto = document.getElementById('bomb-incoming-photo');
+    bombPhoto.className = 'incoming-photo hidden';
+    if (data.from_photo) {
+        bombPhoto.src = data.from_photo;
+        bombPhoto.classList.remove('hidden');
+        const profile = userProfiles[data.from_session];
+        if (profile && profile.color_frame) bombPhoto.classList.add(`frame-${profile.color_frame}`);
+    }
+    const challenger = data.from_name || userName(data.from_session);
+    document.getElementById('bomb-incoming-message').textContent =
+        `${challenger} challenges you to Bomb Pass!`;
+    document.getElementById('bomb-incoming-detail').textContent = modeText;
+    document.getElementById('bomb-incoming-modal').classList.remove('hidden');
+    if (navigator.vibrate) navigator.vibrate([200, 100, 200]);
+    sendBrowserNotification('Bomb Pass Challenge!', `${challenger} wants to play! ${modeText}`);
+});
+
+document.getElementById('bomb-accept-btn').addEventListener('click', () => {
+    document.getElementById('bomb-incoming-modal').classList.add('hidden');
+    socket.emit('bomb_response', { game_id: bombGameId, accepted: true });
+});
+
+document.getElementById('bomb-decline-btn').addEventListener('click', () => {
+    document.getElementById('bomb-incoming-modal').classList.add('hidden');
+    socket.emit('bomb_response', { game_id: bombGameId, accepted: false });
+    bombGameId = null;
+});
+
+function setBombPosition(holder, animate) {
+    const isHolding = holder === sessionId;
+    const emoji = document.getElementById('bomb-emoji');
+    const statusText = document.getElementById('bomb-status-text');
+    const passBtn = document.getElementById('bomb-pass-btn');
+    const waiting = document.getElementById('bomb-waiting');
+    const playerYou = document.getElementById('bomb-player-you');
+    const playerThem = document.getElementById('bomb-player-them');
+
+    if (animate && !bombIsAnimating) {
+        bombIsAnimating = true;
+        const throwClass = isHolding ? 'bomb-throw-right-to-left' : 'bomb-throw-left-to-right';
+        emoji.classList.remove('bomb-shake', 'bomb-safe', 'bomb-at-you', 'bomb-at-them',
+            'bomb-throw-left-to-right', 'bomb-throw-right-to-left');
+        emoji.offsetHeight;
+        emoji.classList.add(throwClass);
+        setTimeout(() => {
+            emoji.classList.remove(throwClass);
+            bombIsAnimating = false;
+            applyBombState(isHolding, emoji, statusText, passBtn, waiting, playerYou, playerThem);
+        }, 400);
+    } else {
+        applyBombState(isHolding, emoji, statusText, passBtn, waiting, playerYou, playerThem);
+    }
+}
+
+function applyBombState(isHolding, emoji, statusText, passBtn, waiting, playerYou, playerThem) {
+    emoji.classList.remove('bomb-shake', 'bomb-safe', 'bomb-at-you', 'bomb-at-them');
+    if (isHolding) {
+        emoji.classList.add('bomb-shake', 'bomb-at-you');
+        statusText.textContent = "You're holding the bomb!";
+        statusText.className = 'bomb-status-text bomb-status-danger';
+        passBtn.classList.remove('hidden');
+        waiting.classList.add('hidden');
+        playerYou.classList.add('bomb-player-active');
+        playerThem.classList.remove('bomb-player-active');
+    } else {
+        emoji.classList.add('bomb-shake', 'bomb-at-them');
+        statusText.textContent = "They're holding it...";
+        statusText.className = 'bomb-status-text bomb-status-safe';
+        passBtn.classList.add('hidden');
+        waiting.classList.remove('hidden');
+        playerYou.classList.remove('bomb-player-active');
+        playerThem.classList.add('bomb-player-active');
+    }
+}
+
+socket.on('bomb_start', (data) => {
+    if (data.session_a !== sessionId && data.session_b !== sessionId) return;
+    hideChallengeWaiting();
+    bombGameId = data.game_id;
+    bombOpponentSession = data.session_a === sessionId ? data.session_b : data.session_a;
+
+    document.getElementById('bomb-them-label').textContent = userName(bombOpponentSession);
+    const modeText = data.mode === 'drink' ? `Playing for: ${data.drink}` : 'Just for fun';
+    document.getElementById('bomb-game-mode').textContent = modeText;
+
+    const fuseBar = document.getElementById('bomb-fuse-bar');
+    fuseBar.style.transition = 'none';
+    fuseBar.style.width = '100%';
+    fuseBar.offsetHeight;
+    fuseBar.style.transition = 'width 15s linear';
+    fuseBar.style.width = '0%';
+
+    setBombPosition(data.holder, false);
+    document.getElementById('bomb-game-modal').classList.remove('hidden');
+    if (navigator.vibrate) navigator.vibrate(100);
+});
+
+document.getElementById('bomb-pass-btn').addEventListener('click', () => {
+    if (!bombGameId || bombIsAnimating) return;
+    socket.emit('bomb_pass', {
+        game_id: bombGameId,
+        session_id: sessionId,
+    });
+    if (navigator.vibrate) navigator.vibrate(50);
+});
+
+socket.on('bomb_passed', (data) => {
+    setBombPosition(data.holder, true);
+    if (navigator.vibrate) navigator.vibrate(50);
+});
+
+socket.on('bomb_result', (data) => {
+    if (data.session_a !== sessionId && data.session_b !== sessionId) return;
+    document.getElementById('bomb-game-modal').classList.add('hidden');
+
+    if (data.result === 'cancelled') {
+        showToast(data.message || 'Game cancelled', 'info');
+        bombGameId = null;
+        return;
+    }
+
+    const resultIcon = document.getElementById('bomb-result-icon');
+    const resultTitle = document.getElementById('bomb-result-title');
+    const resultDrink = document.getElementById('bomb-result-drink');
+
+    if (data.result === 'win') {
+        resultIcon.textContent = '😅';
+        resultTitle.textContent = 'You survived!';
+        resultTitle.className = 'rps-result-title rps-result-win';
+    } else {
+        resultIcon.textContent = '💥';
+        resultTitle.textContent = 'BOOM! You exploded!';
+        resultTitle.className = 'rps-result-title rps-result-lose';
+        if (navigator.vibrate) navigator.vibrate([100, 50, 100, 50, 200]);
+    }
+
+    if (data.mode === 'drink' && data.drink) {
+        resultDrink.classList.remove('hidden', 'drink-winner', 'drink-loser');
+        if (data.result === 'win') {
+            resultDrink.classList.add('drink-winner');
+            resultDrink.textContent = `Go to the bar to collect your drink from ${userName(data.loser)}, or simply just meet up!`;
+        } else {
+            resultDrink.classList.add('drink-loser');
+            resultDrink.textContent = `Go to the bar now and buy ${userName(data.winner)} a drink, or simply just meet up!`;
+        }
+    } else {
+        resultDrink.classList.add('hidden');
+    }
+
+    document.getElementById('bomb-result-modal').classList.remove('hidden');
+    bombGameId = null;
+});
+
+document.getElementById('bomb-result-close').addEventListener('click', () => {
+    document.getElementById('bomb-result-modal').classList.add('hidden');
+});
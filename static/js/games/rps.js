@@ -0,0 +1,139 @@
+// Rock Paper Scissors - loaded on demand by core.js.
+
+// ===== Rock Paper Scissors =====
+let rpsGameId = null;
+let rpsOpponentSession = null;
+const choiceEmoji = { rock: '✊', paper: '✋', scissors: '✌️' };
+
+socket.on('rps_error', (data) => { hideChallengeWaiting(); showToast(data.message, 'error'); });
+
+socket.on('rps_declined', (data) => {
+    hideChallengeWaiting();
+    showToast(`${userName(data.from_session)} declined your challenge`, 'info');
+});
+
+socket.on('rps_incoming', (data) => {
+    rpsGameId = data.game_id;
+    const modeText = data.mode === 'drink' ? 'Loser buys the winner a drink!' : 'Just for fun!';
+    const rpsPhoto = document.getElementById('rps-incoming-photo');
+    rpsPhoto.className = 'incoming-photo hidden';
+    if (data.from_photo) {
+        rpsPhoto.src = data.from_photo;
+        rpsPhoto.classList.remove('hidden');
+        const profile = userProfiles[data.from_session];
+        if (profile && profile.color_frame) rpsPhoto.classList.add(`frame-${profile.color_frame}`);
+    }
+    const challenger = data.from_name || userName(data.from_session);
+    document.getElementById('rps-incoming-message').textContent =
+        `${challenger} challenges you to Rock Paper Scissors!`;
+    document.getElementById('rps-incoming-detail').textContent = modeText;
+    document.getElementById('rps-incoming-modal').classList.remove('hidden');
+    if (navigator.vibrate) navigator.vibrate([200, 100, 200]);
+    sendBrowserNotification('RPS Challenge!', `${challenger} wants to play! ${modeText}`);
+});
+
+document.getElementById('rps-accept-btn').addEventListener('click', () => {
+    document.getElementById('rps-incoming-modal').classList.add('hidden');
+    socket.emit('rps_response', { game_id: rpsGameId, accepted: true });
+});
+
+document.getElementById('rps-decline-btn').addEventListener('click', () => {
+    document.getElementById('rps-incoming-modal').classList.add('hidden');
+    socket.emit('rps_response', { game_id: rpsGameId, accepted: false });
+    rpsGameId = null;
+});
+
+socket.on('rps_start', (data) => {
+    if (data.session_a !== sessionId && data.session_b !== sessionId) return;
+    hideChallengeWaiting();
+    rpsGameId = data.game_id;
+    rpsOpponentSession = data.session_a === sessionId ? data.session_b : data.session_a;
+
+    document.getElementById('rps-game-vs').textContent = `vs ${userName(rpsOpponentSession)}`;
+    const modeText = data.mode === 'drink' ? `Playing for: ${data.drink}` : 'Just for fun';
+    document.getElementById('rps-game-mode').textContent = modeText;
+
+    document.getElementById('rps-choice-section').classList.remove('hidden');
+    document.getElementById('rps-waiting').classList.add('hidden');
+    document.querySelectorAll('.rps-choice-btn').forEach(b => {
+        b.classList.remove('selected', 'disabled');
+        b.disabled = false;
+    });
+    document.getElementById('rps-game-modal').classList.remove('hidden');
+});
+
+document.querySelectorAll('.rps-choice-btn').forEach(btn => {
+    btn.addEventListener('click', () => {
+        if (!rpsGameId) return;
+        document.querySelectorAll('.rps-choice-btn').forEach(b => {
+            b.disabled = true;
+            b.classList.add('disabled');
+        });
+        btn.classList.remove('disabled');
+        btn.classList.add('selected');
+        document.getElementById('rps-waiting').classList.remove('hidden');
+        socket.emit('rps_choice', {
+            game_id: rpsGameId,
+            choice: btn.dataset.choice,
+            session_id: sessionId,
+        });
+    });
+});
+
+socket.on('rps_result', (data) => {
+    if (data.session_a !== sessionId && data.session_b !== sessionId) return;
+    document.getElementById('rps-game-modal').classList.add('hidden');
+
+    if (data.result === 'cancelled') {
+        showToast(data.message || 'Game cancelled', 'info');
+        rpsGameId = null;
+        return;
+    }
+
+    const isA = data.session_a === sessionId;
+    const myChoice = isA ? data.choice_a : data.choice_b;
+    const theirChoice = isA ? data.choice_b : data.choice_a;
+    const opponentSession = isA ? data.session_b : data.session_a;
+
+    const resultIcon = document.getElementById('rps-result-icon');
+    const resultTitle = document.getElementById('rps-result-title');
+    const resultDrink = document.getElementById('rps-result-drink');
+
+    if (data.result === 'tie') {
+        resultIcon.textContent = '🤝';
+        resultTitle.textContent = "It's a tie!";
+        resultTitle.className = 'rps-result-title rps-result-tie';
+    } else if (data.result === 'win') {
+        resultIcon.textContent = '🎉';
+        resultTitle.textContent = 'You won!';
+        resultTitle.className = 'rps-result-title rps-result-win';
+    } else {
+        resultIcon.textContent = '😔';
+        resultTitle.textContent = 'You lost!';
+        resultTitle.className = 'rps-result-title rps-result-lose';
+    }
+
+    document.getElementById('rps-result-yours').textContent = myChoice ? choiceEmoji[myChoice] : '⏰';
+    document.getElementById('rps-result-theirs').textContent = theirChoice ? choiceEmoji[theirChoice] : '⏰';
+    document.getElementById('rps-result-them-label').textContent = userName(opponentSession);
+
+    if (data.mode === 'drink' && data.drink && data.result !== 'tie') {
+        resultDrink.classList.remove('hidden', 'drink-winner', 'drink-loser');
+        if (data.result === 'win') {
+            resultDrink.classList.add('drink-winner');
+            resultDrink.textContent = `Go to the bar to collect your drink from ${userName(data.loser)}, or simply just meet up!`;
+        } else {
+            resultDrink.classList.add('drink-loser');
+            resultDrink.textContent = `Go to the bar now and buy ${userName(data.winner)} a drink, or simply just meet up!`;
+        }
+    } else {
+        resultDrink.classList.add('hidden');
+    }
+
+    document.getElementById('rps-result-modal').classList.remove('hidden');
+    rpsGameId = null;
+});
+
+document.getElementById('rps-result-close').addEventListener('click', () => {
+    document.getElementById('rps-result-modal').classList.add('hidden');
+});
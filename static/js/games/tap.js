@@ -0,0 +1,211 @@
+// Tap Race - loaded on demand by core.js.
+
+// ===== Tap Race =====
+let tapGameId = null;
+let tapOpponentSession = null;
+let tapActive = false;
+let tapMyCount = 0;
+let tapImPlayerA = true;
+
+socket.on('tap_error', (data) => { hideChallengeWaiting(); showToast(data.message, 'error'); });
+
+socket.on('tap_declined', (data) => {
+    hideChallengeWaiting();
+    showToast(`${userName(data.from_session)} declined your Tap Race`, 'info');
+});
+
+socket.on('tap_incoming', (data) => {
+    tapGameId = data.game_id;
+    const modeText = data.mode === 'drink' ? 'Loser buys the winner a drink!' : 'Just for fun!';
+    const tapPhoto = document.getElementById('tap-incoming-photo');
+    tapPhoto.className = 'incoming-photo hidden';
+    if (data.from_photo) {
+        tapPhoto.src = data.from_photo;
+        tapPhoto.classList.remove('hidden');
+        const profile = userProfiles[data.from_session];
+        if (profile && profile.color_frame) tapPhoto.classList.add(`frame-${profile.color_frame}`);
+    }
+    const challenger = data.from_name || userName(data.from_session);
+    document.getElementById('tap-incoming-message').textContent =
+        `${challenger} challenges you to Tap Race!`;
+    document.getElementById('tap-incoming-detail').textContent = modeText;
+    document.getElementById('tap-incoming-modal').classList.remove('hidden');
+    if (navigator.vibrate) navigator.vibrate([200, 100, 200]);
+    sendBrowserNotification('Tap Race Challenge!', `${challenger} wants to race! ${modeText}`);
+});
+
+document.getElementById('tap-accept-btn').addEventListener('click', () => {
+    document.getElementById('tap-incoming-modal').classList.add('hidden');
+    socket.emit('tap_response', { game_id: tapGameId, accepted: true });
+});
+
+document.getElementById('tap-decline-btn').addEventListener('click', () => {
+    document.getElementById('tap-incoming-modal').classList.add('hidden');
+    socket.emit('tap_response', { game_id: tapGameId, accepted: false });
+    tapGameId = null;
+});
+
+socket.on('tap_start', (data) => {
+    if (data.session_a !== sessionId && data.session_b !== sessionId) return;
+    hideChallengeWaiting();
+    tapGameId = data.game_id;
+    tapOpponentSession = data.session_a === sessionId ? data.session_b : data.session_a;
+    tapImPlayerA = (data.session_a === sessionId);
+    tapActive = false;
+    tapMyCount = 0;
+
+    document.getElementById('tap-them-label').textContent = userName(tapOpponentSession).toUpperCase();
+    const modeText = data.mode === 'drink' ? `Playing for: ${data.drink}` : 'Just for fun';
+    document.getElementById('tap-game-mode').textContent = modeText;
+
+    document.getElementById('tap-count-you').textContent = '0';
+    document.getElementById('tap-count-them').textContent = '0';
+    document.getElementById('tap-track-you').style.height = '0%';
+    document.getElementById('tap-track-them').style.height = '0%';
+    document.getElementById('tap-runner-you').style.bottom = '0%';
+    document.getElementById('tap-runner-them').style.bottom = '0%';
+
+    const tapBtn = document.getElementById('tap-tap-btn');
+    tapBtn.classList.add('hidden');
+    tapBtn.disabled = true;
+
+    const arena = document.getElementById('tap-arena');
+    arena.classList.add('hidden');
+
+    const bar = document.getElementById('tap-progress-bar');
+    bar.style.transition = 'none';
+    bar.style.width = '100%';
+    bar.offsetHeight;
+
+    const countdown = document.getElementById('tap-countdown');
+    const countdownText = document.getElementById('tap-countdown-text');
+    countdown.classList.remove('hidden');
+
+    let count = 3;
+    countdownText.textContent = count;
+    countdownText.className = 'tap-countdown-text tap-countdown-pop';
+
+    const countInterval = setInterval(() => {
+        count--;
+        if (count > 0) {
+            countdownText.textContent = count;
+            countdownText.classList.remove('tap-countdown-pop');
+            countdownText.offsetHeight;
+            countdownText.classList.add('tap-countdown-pop');
+        } else if (count === 0) {
+            countdownText.textContent = 'GO!';
+            countdownText.classList.remove('tap-countdown-pop');
+            countdownText.offsetHeight;
+            countdownText.classList.add('tap-countdown-pop');
+        } else {
+            clearInterval(countInterval);
+            countdown.classList.add('hidden');
+            arena.classList.remove('hidden');
+            tapBtn.classList.remove('hidden');
+            tapBtn.disabled = false;
+            tapActive = true;
+            bar.style.transition = 'width 10s linear';
+            bar.style.width = '0%';
+            if (navigator.vibrate) navigator.vibrate(100);
+        }
+    }, 1000);
+
+    document.getElementById('tap-game-modal').classList.remove('hidden');
+});
+
+const tapBtnEl = document.getElementById('tap-tap-btn');
+function handleTap(e) {
+    e.preventDefault();
+    if (!tapActive || !tapGameId) return;
+    tapMyCount++;
+    document.getElementById('tap-count-you').textContent = tapMyCount;
+    const maxTaps = 150;
+    const pct = Math.min((tapMyCount / maxTaps) * 100, 100);
+    document.getElementById('tap-track-you').style.height = pct + '%';
+    document.getElementById('tap-runner-you').style.bottom = pct + '%';
+
+    const runner = document.getElementById('tap-runner-you');
+    runner.classList.remove('tap-runner-bounce');
+    runner.offsetHeight;
+    runner.classList.add('tap-runner-bounce');
+
+    const countEl = document.getElementById('tap-count-you');
+    countEl.classList.remove('tap-count-bump');
+    countEl.offsetHeight;
+    countEl.classList.add('tap-count-bump');
+
+    socket.emit('tap_tap', {
+        game_id: tapGameId,
+        session_id: sessionId,
+    });
+    if (navigator.vibrate) navigator.vibrate(10);
+}
+tapBtnEl.addEventListener('touchstart', handleTap, { passive: false });
+tapBtnEl.addEventListener('mousedown', handleTap);
+
+socket.on('tap_update', (data) => {
+    const theirCount = tapImPlayerA ? data.count_b : data.count_a;
+    document.getElementById('tap-count-them').textContent = theirCount;
+    const maxTaps = 150;
+    const theirPct = Math.min((theirCount / maxTaps) * 100, 100);
+    document.getElementById('tap-track-them').style.height = theirPct + '%';
+    document.getElementById('tap-runner-them').style.bottom = theirPct + '%';
+});
+
+socket.on('tap_result', (data) => {
+    if (data.session_a !== sessionId && data.session_b !== sessionId) return;
+    tapActive = false;
+    document.getElementById('tap-game-modal').classList.add('hidden');
+
+    if (data.result === 'cancelled') {
+        showToast(data.message || 'Game cancelled', 'info');
+        tapGameId = null;
+        return;
+    }
+
+    const resultIcon = document.getElementById('tap-result-icon');
+    const resultTitle = document.getElementById('tap-result-title');
+    const resultDrink = document.getElementById('tap-result-drink');
+    const resultScores = document.getElementById('tap-result-scores');
+
+    const myScore = tapImPlayerA ? data.count_a : data.count_b;
+    const theirScore = tapImPlayerA ? data.count_b : data.count_a;
+    resultScores.textContent = `You: ${myScore}  vs  ${userName(tapOpponentSession)}: ${theirScore}`;
+
+    if (data.result === 'draw') {
+        resultIcon.textContent = '🤝';
+        resultTitle.textContent = "It's a tie!";
+        resultTitle.className = 'rps-result-title';
+    } else if (data.result === 'win') {
+        resultIcon.textContent = '🏆';
+        resultTitle.textContent = 'You win!';
+        resultTitle.className = 'rps-result-title rps-result-win';
+    } else {
+        resultIcon.textContent = '😅';
+        resultTitle.textContent = 'So close!';
+        resultTitle.className = 'rps-result-title rps-result-lose';
+        if (navigator.vibrate) navigator.vibrate([100, 50, 100, 50, 200]);
+    }
+
+    if (data.mode === 'drink' && data.drink) {
+        resultDrink.classList.remove('hidden', 'drink-winner', 'drink-loser');
+        if (data.result === 'win') {
+            resultDrink.classList.add('drink-winner');
+            resultDrink.textContent = `Go to the bar to collect your drink from ${userName(data.loser)}, or simply just meet up!`;
+        } else if (data.result === 'lose') {
+            resultDrink.classList.add('drink-loser');
+            resultDrink.textContent = `Go to the bar now and buy ${userName(data.winner)} a drink, or simply just meet up!`;
+        } else {
+            resultDrink.textContent = `It's a tie — no one pays!`;
+        }
+    } else {
+        resultDrink.classList.add('hidden');
+    }
+
+    document.getElementById('tap-result-modal').classList.remove('hidden');
+    tapGameId = null;
+});
+
+document.getElementById('tap-result-close').addEventListener('click', () => {
+    document.getElementById('tap-result-modal').classList.add('hidden');
+});
@@ -0,0 +1,291 @@
+// 2 Truths 1 Lie - loaded on demand by core.js.
+
+// ===== 2 Truths 1 Lie =====
+let ttolGameId = null;
+let ttolOpponentSession = null;
+let ttolLieIndex = null;
+let ttolGuessIndex = null;
+
+
+socket.on('ttol_error', (data) => { hideChallengeWaiting(); showToast(data.message, 'error'); });
+
+socket.on('ttol_declined', (data) => {
+    hideChallengeWaiting();
+    showToast(`${userName(data.from_session)} declined your 2 Truths 1 Lie`, 'info');
+});
+
+socket.on('ttol_incoming', (data) => {
+    ttolGameId = data.game_id;
+    const modeText = data.mode === 'drink' ? 'Loser buys the winner a drink!' : 'Just for fun!';
+    const ttolPhoto = document.getElementById('ttol-incoming-photo');
+    ttolPhoto.className = 'incoming-photo hidden';
+    if (data.from_photo) {
+        ttolPhoto.src = data.from_photo;
+        ttolPhoto.classList.remove('hidden');
+        const profile = userProfiles[data.from_session];
+        if (profile && profile.color_frame) ttolPhoto.classList.add(`frame-${profile.color_frame}`);
+    }
+    const challenger = data.from_name || userName(data.from_session);
+    document.getElementById('ttol-incoming-message').textContent =
+        `${challenger} challenges you to 2 Truths 1 Lie!`;
+    document.getElementById('ttol-incoming-detail').textContent = modeText;
+    document.getElementById('ttol-incoming-modal').classList.remove('hidden');
+    if (navigator.vibrate) navigator.vibrate([200, 100, 200]);
+    sendBrowserNotification('2 Truths 1 Lie!', `${challenger} wants to play! ${modeText}`);
+});
+
+document.getElementById('ttol-accept-btn').addEventListener('click', () => {
+    document.getElementById('ttol-incoming-modal').classList.add('hidden');
+    socket.emit('ttol_response', { game_id: ttolGameId, accepted: true });
+});
+
+document.getElementById('ttol-decline-btn').addEventListener('click', () => {
+    document.getElementById('ttol-incoming-modal').classList.add('hidden');
+    socket.emit('ttol_response', { game_id: ttolGameId, accepted: false });
+    ttolGameId = null;
+});
+
+// TTOL Write Phase
+function ttolValidateForm() {
+    const allFilled = [0, 1, 2].every(i =>
+        document.getElementById(`ttol-stmt-${i}`).value.trim().length > 0
+    );
+    const lieMarked = ttolLieIndex !== null;
+    const btn = document.getElementById('ttol-submit-btn');
+    if (allFilled && lieMarked) {
+        btn.disabled = false;
+        btn.textContent = 'Submit!';
+    } else {
+        btn.disabled = true;
+        btn.textContent = 'Fill all 3 & mark the lie';
+    }
+}
+
+[0, 1, 2].forEach(i => {
+    document.getElementById(`ttol-stmt-${i}`).addEventListener('input', ttolValidateForm);
+});
+
+document.querySelectorAll('.ttol-lie-toggle').forEach(btn => {
+    btn.addEventListener('click', () => {
+        const idx = parseInt(btn.dataset.idx);
+        document.querySelectorAll('.ttol-lie-toggle').forEach(b => {
+            b.textContent = '✓ TRUTH';
+            b.classList.remove('active');
+        });
+        document.querySelectorAll('.ttol-statement-row').forEach(r => {
+            r.classList.remove('ttol-row-lie');
+        });
+        ttolLieIndex = idx;
+        btn.textContent = '✗ LIE';
+        btn.classList.add('active');
+        document.getElementById(`ttol-row-${idx}`).classList.add('ttol-row-lie');
+        if (navigator.vibrate) navigator.vibrate(15);
+        ttolValidateForm();
+    });
+});
+
+socket.on('ttol_start', (data) => {
+    if (data.session_a !== sessionId && data.session_b !== sessionId) return;
+    hideChallengeWaiting();
+    ttolGameId = data.game_id;
+    ttolOpponentSession = data.session_a === sessionId ? data.session_b : data.session_a;
+    ttolLieIndex = null;
+    ttolGuessIndex = null;
+
+    document.getElementById('ttol-write-vs').textContent = `vs ${userName(ttolOpponentSession)}`;
+    const modeText = data.mode === 'drink' ? `Playing for: ${data.drink}` : 'Just for fun';
+    document.getElementById('ttol-write-mode').textContent = modeText;
+
+    for (let i = 0; i < 3; i++) {
+        const input = document.getElementById(`ttol-stmt-${i}`);
+        input.value = '';
+        input.disabled = false;
+    }
+    document.querySelectorAll('.ttol-lie-toggle').forEach(btn => {
+        btn.textContent = '✓ TRUTH';
+        btn.classList.remove('active');
+        btn.disabled = false;
+    });
+    document.querySelectorAll('.ttol-statement-row').forEach(r => {
+        r.classList.remove('ttol-row-lie');
+    });
+    document.getElementById('ttol-submit-btn').disabled = true;
+    document.getElementById('ttol-submit-btn').textContent = 'Fill all 3 & mark the lie';
+    document.getElementById('ttol-submit-btn').classList.remove('hidden');
+    document.getElementById('ttol-write-waiting').classList.add('hidden');
+
+    const bar = document.getElementById('ttol-write-timer-bar');
+    bar.style.transition = 'none';
+    bar.style.width = '100%';
+    bar.offsetHeight;
+    bar.style.transition = 'width 90s linear';
+    bar.style.width = '0%';
+
+    document.getElementById('ttol-write-modal').classList.remove('hidden');
+    setTimeout(() => document.getElementById('ttol-stmt-0').focus(), 300);
+});
+
+document.getElementById('ttol-submit-btn').addEventListener('click', () => {
+    const statements = [0, 1, 2].map(i => document.getElementById(`ttol-stmt-${i}`).value.trim());
+    if (statements.some(s => s.length === 0) || ttolLieIndex === null) return;
+
+    socket.emit('ttol_submit', {
+        game_id: ttolGameId,
+        session_id: sessionId,
+        statements: statements,
+        lie_index: ttolLieIndex,
+    });
+
+    document.getElementById('ttol-submit-btn').classList.add('hidden');
+    document.getElementById('ttol-write-waiting').classList.remove('hidden');
+    for (let i = 0; i < 3; i++) {
+        document.getElementById(`ttol-stmt-${i}`).disabled = true;
+    }
+    document.querySelectorAll('.ttol-lie-toggle').forEach(btn => btn.disabled = true);
+});
+
+socket.on('ttol_waiting', () => {});
+
+// TTOL Guess Phase
+socket.on('ttol_guess_phase', (data) => {
+    document.getElementById('ttol-write-modal').classList.add('hidden');
+    ttolGuessIndex = null;
+
+    document.getElementById('ttol-guess-vs').textContent =
+        `${userName(data.opponent_session)}'s Statements`;
+
+    const container = document.getElementById('ttol-guess-cards');
+    container.innerHTML = data.statements.map((stmt, i) => `
+        <div class="ttol-guess-card ttol-card-entrance" data-idx="${i}" style="animation-delay: ${i * 0.12}s">
+            <span class="ttol-guess-card-number">${i + 1}</span>
+            <span class="ttol-guess-card-text">${escapeHtml(stmt)}</span>
+        </div>
+    `).join('');
+
+    container.querySelectorAll('.ttol-guess-card').forEach(card => {
+        card.addEventListener('click', () => {
+            ttolGuessIndex = parseInt(card.dataset.idx);
+            container.querySelectorAll('.ttol-guess-card').forEach(c => c.classList.remove('selected'));
+            card.classList.add('selected');
+            document.getElementById('ttol-guess-btn').disabled = false;
+            if (navigator.vibrate) navigator.vibrate(15);
+        });
+    });
+
+    document.getElementById('ttol-guess-btn').disabled = true;
+    document.getElementById('ttol-guess-btn').classList.remove('hidden');
+    document.getElementById('ttol-guess-waiting').classList.add('hidden');
+
+    const bar = document.getElementById('ttol-guess-timer-bar');
+    bar.style.transition = 'none';
+    bar.style.width = '100%';
+    bar.offsetHeight;
+    bar.style.transition = 'width 60s linear';
+    bar.style.width = '0%';
+
+    document.getElementById('ttol-guess-modal').classList.remove('hidden');
+    if (navigator.vibrate) navigator.vibrate(100);
+});
+
+document.getElementById('ttol-guess-btn').addEventListener('click', () => {
+    if (ttolGuessIndex === null) return;
+    socket.emit('ttol_guess', {
+        game_id: ttolGameId,
+        session_id: sessionId,
+        guess: ttolGuessIndex,
+    });
+    document.getElementById('ttol-guess-btn').classList.add('hidden');
+    document.getElementById('ttol-guess-waiting').classList.remove('hidden');
+    document.querySelectorAll('.ttol-guess-card').forEach(c => {
+        c.style.pointerEvents = 'none';
+    });
+});
+
+// TTOL Result
+socket.on('ttol_result', (data) => {
+    if (data.session_a !== sessionId && data.session_b !== sessionId) return;
+    document.getElementById('ttol-write-modal').classList.add('hidden');
+    document.getElementById('ttol-guess-modal').classList.add('hidden');
+
+    if (data.result === 'cancelled') {
+        showToast(data.message || 'Game cancelled', 'info');
+        ttolGameId = null;
+        return;
+    }
+
+    const resultIcon = document.getElementById('ttol-result-icon');
+    const resultTitle = document.getElementById('ttol-result-title');
+    const resultDrink = document.getElementById('ttol-result-drink');
+
+    if (data.result === 'draw') {
+        resultIcon.textContent = '🤝';
+        resultTitle.textContent = "It's a draw!";
+        resultTitle.className = 'rps-result-title rps-result-tie';
+    } else if (data.result === 'win') {
+        resultIcon.textContent = '🎉';
+        resultTitle.textContent = 'You spotted the lie!';
+        resultTitle.className = 'rps-result-title rps-result-win';
+    } else {
+        resultIcon.textContent = '😔';
+        resultTitle.textContent = 'They spotted yours!';
+        resultTitle.className = 'rps-result-title rps-result-lose';
+        if (navigator.vibrate) navigator.vibrate([100, 50, 100, 50, 200]);
+    }
+
+    const isA = data.session_a === sessionId;
+    const myStatements = isA ? data.statements_a : data.statements_b;
+    const myLieIdx = isA ? data.lie_index_a : data.lie_index_b;
+    const theirStatements = isA ? data.statements_b : data.statements_a;
+    const theirLieIdx = isA ? data.lie_index_b : data.lie_index_a;
+    const myGuess = isA ? data.guess_a : data.guess_b;
+    const theirGuess = isA ? data.guess_b : data.guess_a;
+    const opponentSession = isA ? data.session_b : data.session_a;
+
+    const revealHtml = `
+        <div class="ttol-reveal-section">
+            <p class="ttol-reveal-label">${escapeHtml(userName(opponentSession))}'s statements:</p>
+            ${theirStatements.map((s, i) => `
+                <div class="ttol-reveal-stmt ${i === theirLieIdx ? 'ttol-reveal-lie' : 'ttol-reveal-truth'}
+                    ${i === myGuess ? 'ttol-reveal-guessed' : ''}"
+                    style="animation-delay: ${i * 0.15}s">
+                    <span class="ttol-reveal-tag">${i === theirLieIdx ? '✗ LIE' : '✓ TRUTH'}</span>
+                    <span class="ttol-reveal-text">${escapeHtml(s)}</span>
+                    ${i === myGuess ? '<span class="ttol-reveal-your-guess">👈 Your guess</span>' : ''}
+                </div>
+            `).join('')}
+        </div>
+        <div class="ttol-reveal-section">
+            <p class="ttol-reveal-label">Your statements:</p>
+            ${myStatements.map((s, i) => `
+                <div class="ttol-reveal-stmt ${i === myLieIdx ? 'ttol-reveal-lie' : 'ttol-reveal-truth'}
+                    ${i === theirGuess ? 'ttol-reveal-guessed' : ''}"
+                    style="animation-delay: ${(i + 3) * 0.15}s">
+                    <span class="ttol-reveal-tag">${i === myLieIdx ? '✗ LIE' : '✓ TRUTH'}</span>
+                    <span class="ttol-reveal-text">${escapeHtml(s)}</span>
+                    ${i === theirGuess ? '<span class="ttol-reveal-their-guess">Their guess</span>' : ''}
+                </div>
+            `).join('')}
+        </div>
+    `;
+    document.getElementById('ttol-result-reveal').innerHTML = revealHtml;
+
+    if (data.mode === 'drink' && data.drink && data.result !== 'draw') {
+        resultDrink.classList.remove('hidden', 'drink-winner', 'drink-loser');
+        if (data.result === 'win') {
+            resultDrink.classList.add('drink-winner');
+            resultDrink.textContent = `Go to the bar to collect your drink from ${userName(data.loser)}, or simply just meet up!`;
+        } else {
+            resultDrink.classList.add('drink-loser');
+            resultDrink.textContent = `Go to the bar now and buy ${userName(data.winner)} a drink, or simply just meet up!`;
+        }
+    } else {
+        resultDrink.classList.add('hidden');
+    }
+
+    document.getElementById('ttol-result-modal').classList.remove('hidden');
+    ttolGameId = null;
+});
+
+document.getElementById('ttol-result-close').addEventListener('click', () => {
+    document.getElementById('ttol-result-modal').classList.add('hidden');
+});
@@ -0,0 +1,159 @@
+// People page - drink offers: action modal, incoming offer queue, checkout.
+
+// ===== Notification Queue =====
+const incomingQueue = [];
+let processingIncoming = false;
+
+
+// ===== Message Events =====
+socket.on('send_success', () => {
+    showToast('Drink offer sent! 🍻', 'success');
+});
+
+socket.on('send_error', (data) => {
+    showToast(data.message, 'error');
+});
+
+socket.on('incoming_message', (data) => {
+    incomingQueue.push(data);
+    if (!processingIncoming) {
+        showNextIncoming();
+    }
+});
+
+socket.on('message_response', (data) => {
+    const who = data.responder_name || 'They';
+    if (data.type === 'accepted') {
+        showToast(`${who} accepted! Meet them at the bar table 🥂`, 'success');
+        sendBrowserNotification('Drink Accepted! 🥂', `${who} accepted! Meet at the bar table`);
+    } else {
+        showToast(`${who} declined your drink offer`, 'info');
+        sendBrowserNotification('Drink Declined', `${who} declined your drink offer`);
+    }
+});
+
+socket.on('response_confirmed', (data) => {
+    if (data.type === 'accepted') {
+        showToast('Meet at the bar table to get your drink! 🥂', 'success');
+    }
+});
+
+socket.on('admin_broadcast', (data) => {
+    showToast(data.message, 'info');
+});
+
+
+// ===== Action Modal =====
+function openActionModal() {
+    const profile = userProfiles[targetSession];
+    document.getElementById('target-name').textContent = profile ? profile.name : 'Someone';
+
+    const igEl = document.getElementById('target-instagram');
+    if (profile && profile.instagram) {
+        igEl.textContent = '@' + profile.instagram;
+        igEl.classList.remove('hidden');
+    } else {
+        igEl.classList.add('hidden');
+    }
+
+    document.getElementById('action-step').classList.remove('hidden');
+
+    document.getElementById('action-modal').classList.remove('hidden');
+}
+
+function closeActionModal() {
+    Object.keys(gameLabels).forEach(type => {
+        document.getElementById(`${type}-setup-step`).classList.add('hidden');
+    });
+    document.getElementById('action-modal').classList.add('hidden');
+}
+
+document.querySelector('.modal-close').addEventListener('click', closeActionModal);
+document.querySelector('#action-modal .modal-backdrop').addEventListener('click', closeActionModal);
+
+// Buy a Drink -> confirm and send
+document.getElementById('buy-drink-btn').addEventListener('click', () => {
+    showConfirm(`Buy a drink for ${userName(targetSession)}?`, () => {
+        socket.emit('send_message', {
+            to_session: targetSession,
+            message_type: 'drink',
+            content: 'a drink',
+        });
+        closeActionModal();
+    });
+});
+
+
+// ===== Incoming Notification Queue =====
+function showNextIncoming() {
+    if (incomingQueue.length === 0) {
+        processingIncoming = false;
+        return;
+    }
+    processingIncoming = true;
+    const data = incomingQueue[0];
+
+    const incomingPhoto = document.getElementById('incoming-photo');
+    incomingPhoto.className = 'incoming-photo hidden';
+    if (data.from_photo) {
+        incomingPhoto.src = data.from_photo;
+        incomingPhoto.classList.remove('hidden');
+        const profile = userProfiles[data.from_session];
+        const fc = profile ? profile.color_frame : null;
+        if (fc) incomingPhoto.classList.add(`frame-${fc}`);
+    }
+    document.getElementById('incoming-icon').textContent = '🍺';
+    const senderName = data.from_name || userName(data.from_session);
+    document.getElementById('incoming-message').textContent =
+        `${senderName} wants to buy you a drink!`;
+    document.getElementById('incoming-note').textContent = 'Meet at the bar table to get your drink!';
+
+    const queueCountEl = document.getElementById('incoming-queue-count');
+    if (incomingQueue.length > 1) {
+        queueCountEl.textContent = `+${incomingQueue.length - 1} more incoming`;
+        queueCountEl.classList.remove('hidden');
+    } else {
+        queueCountEl.classList.add('hidden');
+    }
+
+    document.getElementById('incoming-modal').classList.remove('hidden');
+    if (navigator.vibrate) navigator.vibrate([200, 100, 200]);
+
+    sendBrowserNotification(
+        `${senderName} wants to buy you a drink!`,
+        'Meet at the bar table to get your drink!'
+    );
+}
+
+function handleIncomingResponse(response) {
+    const current = incomingQueue.shift();
+    if (current) {
+        socket.emit('respond_message', {
+            message_id: current.message_id,
+            response: response,
+            from_session: current.from_session,
+        });
+    }
+    document.getElementById('incoming-modal').classList.add('hidden');
+    if (incomingQueue.length > 0) {
+        setTimeout(showNextIncoming, 400);
+    } else {
+        processingIncoming = false;
+    }
+}
+
+document.getElementById('accept-btn').addEventListener('click', () => handleIncomingResponse('accepted'));
+document.getElementById('decline-btn').addEventListener('click', () => handleIncomingResponse('declined'));
+
+
+// ===== Checkout =====
+document.getElementById('checkout-btn').addEventListener('click', () => {
+    showConfirm('Leave Shamrock?', () => {
+        socket.emit('checkout', { session_id: sessionId });
+        localStorage.removeItem('shamrockSession');
+        localStorage.removeItem('shamrockProfileName');
+        localStorage.removeItem('shamrockProfilePhoto');
+        localStorage.removeItem('shamrockColorFrame');
+        window.location.href = '/';
+    }, 'Check Out', 'Stay');
+});
@@ -0,0 +1,145 @@
+// People page - connection lifecycle and the presence feed / people grid.
+
+// ===== Connection =====
+let hasConnected = false;
+socket.on('connect', () => {
+    console.log('Connected to server');
+    document.getElementById('connection-status').classList.add('hidden');
+    if (!hasConnected) {
+        // First connect — use go_online to log activity
+        socket.emit('go_online', { session_id: sessionId });
+        hasConnected = true;
+    } else {
+        // Reconnect after disconnect — use rejoin
+        socket.emit('rejoin', { session_id: sessionId });
+    }
+});
+
+socket.on('disconnect', () => {
+    document.getElementById('connection-status').classList.remove('hidden');
+});
+
+socket.on('online_success', () => {
+    console.log('Online!');
+    socket.emit('presence_sync', { since: presenceSeq, epoch: presenceEpoch });
+});
+
+socket.on('rejoin_success', () => {
+    console.log('Rejoined!');
+    socket.emit('presence_sync', { since: presenceSeq, epoch: presenceEpoch });
+});
+
+socket.on('rejoin_failed', () => {
+    localStorage.removeItem('shamrockSession');
+    localStorage.removeItem('shamrockProfileName');
+    localStorage.removeItem('shamrockProfilePhoto');
+    localStorage.removeItem('shamrockColorFrame');
+    window.location.href = '/';
+});
+
+socket.on('kicked', () => {
+    localStorage.removeItem('shamrockSession');
+    localStorage.removeItem('shamrockProfileName');
+    localStorage.removeItem('shamrockProfilePhoto');
+    localStorage.removeItem('shamrockColorFrame');
+    window.location.href = '/';
+});
+
+
+// ===== Presence Feed =====
+// Server sends a full snapshot (users_update) once, then batches of
+// numbered deltas. If a delta arrives out of sequence we ask to be caught up.
+let presenceEpoch = null;
+let presenceSeq = -1;
+let onlineUsers = [];
+
+socket.on('users_update', (snapshot) => {
+    presenceEpoch = snapshot.epoch;
+    presenceSeq = snapshot.seq;
+    onlineUsers = snapshot.users;
+    renderPeople(onlineUsers);
+});
+
+function applyPresenceDelta(delta) {
+    if (delta.event === 'user_joined') {
+        onlineUsers = onlineUsers.filter(u => u.session_id !== delta.user.session_id);
+        onlineUsers.push(delta.user);
+    } else if (delta.event === 'user_updated') {
+        onlineUsers = onlineUsers.map(u => u.session_id === delta.user.session_id ? delta.user : u);
+    } else if (delta.event === 'user_left') {
+        onlineUsers = onlineUsers.filter(u => u.session_id !== delta.session_id);
+    }
+}
+
+socket.on('presence_batch', (batch) => {
+    if (presenceSeq < 0) return;
+    let changed = false;
+    for (const delta of batch.changes) {
+        if (delta.seq <= presenceSeq) continue;
+        if (delta.seq !== presenceSeq + 1) {
+            socket.emit('presence_sync', { since: presenceSeq, epoch: presenceEpoch });
+            break;
+        }
+        presenceSeq = delta.seq;
+        applyPresenceDelta(delta);
+        changed = true;
+    }
+    if (changed) renderPeople(onlineUsers);
+});
+
+// Avatars render at 64px; let high-density screens pick the large rendition
+function avatarSrcset(u) {
+    const urls = u.photo_urls;
+    if (!urls || !urls.large || urls.large === urls.thumb) return '';
+    return ` srcset="${urls.thumb} 128w, ${urls.large} 512w" sizes="64px"`;
+}
+
+function renderPeople(users) {
+    const grid = document.getElementById('people-grid');
+    const emptyState = document.getElementById('empty-state');
+
+    // Update profile cache
+    users.forEach(u => {
+        userProfiles[u.session_id] = {
+            name: u.name,
+            photo_url: u.photo_url,
+            photo_urls: u.photo_urls,
+            color_frame: u.color_frame,
+            instagram: u.instagram,
+        };
+    });
+
+    // Filter out ourselves
+    const others = users.filter(u => u.session_id !== sessionId);
+
+    if (others.length === 0) {
+        emptyState.classList.remove('hidden');
+        grid.innerHTML = '';
+        return;
+    }
+    emptyState.classList.add('hidden');
+
+    grid.innerHTML = others.map(u => {
+        const fc = u.color_frame ? ` frame-${u.color_frame}` : '';
+        let avatarHtml;
+        if (u.photo_url) {
+            avatarHtml = `<img class="person-avatar${fc}" src="${u.photo_url}"${avatarSrcset(u)} alt="">`;
+        } else {
+            avatarHtml = `<div class="person-avatar person-avatar-placeholder${fc}">${u.name[0]}</div>`;
+        }
+        return `
+            <div class="person-card" data-session="${u.session_id}">
+                ${avatarHtml}
+                <span class="person-name">${u.name}</span>
+            </div>
+        `;
+    }).join('');
+
+    // Click handlers
+    grid.querySelectorAll('.person-card').forEach(card => {
+        card.addEventListener('click', () => {
+            targetSession = card.dataset.session;
+            openActionModal();
+        });
+    });
+}
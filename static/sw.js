@@ -1,21 +1,134 @@
 // Service Worker for Shamrock PWA
 // Required for iOS notifications in Add-to-Home-Screen mode
+//
+// Served through the /sw.js route, which fills in VERSION and PRECACHE_URLS.
+// Any change to a page template or static asset changes VERSION, so the
+// browser installs a fresh copy of the app shell.
 
-const CACHE_NAME = 'shamrock-v1';
+const VERSION = '__SW_VERSION__';
+const PRECACHE_URLS = __PRECACHE_URLS__;
 
-// Install — cache essential assets
+const SHELL_CACHE = `shamrock-shell-${VERSION}`;
+const AVATAR_CACHE = 'shamrock-avatars';
+const API_CACHE = 'shamrock-api';
+const CURRENT_CACHES = [SHELL_CACHE, AVATAR_CACHE, API_CACHE];
+const MAX_AVATARS = 300;
+const NAVIGATION_TIMEOUT_MS = 2500;  // then fall back to the cached page
+
+// Install — precache the app shell (pages, fingerprinted assets, socket.io client)
 self.addEventListener('install', (event) => {
-    self.skipWaiting();
+    event.waitUntil(
+        caches.open(SHELL_CACHE)
+            .then((cache) => cache.addAll(PRECACHE_URLS))
+            .then(() => self.skipWaiting())
+    );
 });
 
-// Activate — clean old caches
+// Activate — drop caches from previous versions
 self.addEventListener('activate', (event) => {
-    event.waitUntil(clients.claim());
+    event.waitUntil(
+        caches.keys()
+            .then((keys) => Promise.all(
+                keys.filter((key) => !CURRENT_CACHES.includes(key)).map((key) => caches.delete(key))
+            ))
+            .then(() => clients.claim())
+    );
 });
 
-// Fetch — pass through (no offline caching needed)
+// Cache-first: fingerprinted assets never change within a version
+function cacheFirst(request, cacheName) {
+    return caches.open(cacheName).then((cache) =>
+        cache.match(request).then((cached) => cached || fetch(request).then((response) => {
+            if (response.ok) cache.put(request, response.clone());
+            return response;
+        }))
+    );
+}
+
+// Stale-while-revalidate: answer from cache at once, refresh it in the background
+function staleWhileRevalidate(event, cacheName) {
+    return caches.open(cacheName).then((cache) =>
+        cache.match(event.request).then((cached) => {
+            const refresh = fetch(event.request).then((response) => {
+                if (response.ok) {
+                    cache.put(event.request, response.clone()).then(() => trimCache(cache, MAX_AVATARS));
+                }
+                return response;
+            });
+            if (cached) {
+                event.waitUntil(refresh.catch(() => {}));
+                return cached;
+            }
+            return refresh;
+        })
+    );
+}
+
+// Network-first: fresh data when online, the last good response when not
+function networkFirst(request, cacheName) {
+    return caches.open(cacheName).then((cache) =>
+        fetch(request).then((response) => {
+            if (response.ok) cache.put(request, response.clone());
+            return response;
+        }).catch(() => cache.match(request).then((cached) => cached || Promise.reject(new Error('offline'))))
+    );
+}
+
+// Pages: network-first so a deploy is picked up at once, but give up quickly on bad Wi-Fi
+function navigationNetworkFirst(request) {
+    return caches.open(SHELL_CACHE).then((cache) => {
+        const cachedPage = () => cache.match(request, { ignoreSearch: true });
+        const network = fetch(request).then((response) => {
+            if (response.ok) cache.put(new URL(request.url).pathname, response.clone());
+            return response;
+        });
+        const timeout = new Promise((resolve) => setTimeout(resolve, NAVIGATION_TIMEOUT_MS))
+            .then(cachedPage)
+            .then((cached) => cached || network);
+        return Promise.race([network, timeout]).catch(() =>
+            cachedPage().then((cached) => cached || Promise.reject(new Error('offline')))
+        );
+    });
+}
+
+function trimCache(cache, maxEntries) {
+    return cache.keys().then((keys) => {
+        if (keys.length <= maxEntries) return;
+        return Promise.all(keys.slice(0, keys.length - maxEntries).map((key) => cache.delete(key)));
+    });
+}
+
 self.addEventListener('fetch', (event) => {
-    event.respondWith(fetch(event.request));
+    const request = event.request;
+    if (request.method !== 'GET') return;
+
+    const url = new URL(request.url);
+    const sameOrigin = url.origin === self.location.origin;
+
+    // Live traffic and the admin area always go straight to the network
+    if (sameOrigin && (url.pathname.startsWith('/socket.io/') || url.pathname.startsWith('/admin'))) return;
+
+    if (request.mode === 'navigate') {
+        if (sameOrigin && PRECACHE_URLS.includes(url.pathname)) {
+            event.respondWith(navigationNetworkFirst(request));
+        }
+        return;
+    }
+
+    if (!sameOrigin) {
+        if (PRECACHE_URLS.includes(request.url)) {
+            event.respondWith(cacheFirst(request, SHELL_CACHE));
+        }
+        return;
+    }
+
+    if (url.pathname.startsWith('/static/uploads/')) {
+        event.respondWith(staleWhileRevalidate(event, AVATAR_CACHE));
+    } else if (url.pathname.startsWith('/api/')) {
+        event.respondWith(networkFirst(request, API_CACHE));
+    } else if (url.pathname.startsWith('/assets/') || PRECACHE_URLS.includes(url.pathname)) {
+        event.respondWith(cacheFirst(request, SHELL_CACHE));
+    }
 });
 
 // Handle push events (for future server push support)
@@ -0,0 +1,54 @@
+"""LRUCache: eviction order, invalidation and fills that race an invalidation."""
+from cache import LRUCache
+
+
+def test_least_recently_used_entry_is_evicted():
+    cache = LRUCache(max_size=2)
+    cache.put('a', 1)
+    cache.put('b', 2)
+    assert cache.get('a') == 1  # a is now the most recent
+    cache.put('c', 3)
+    assert 'b' not in cache
+    assert cache.get('a') == 1 and cache.get('c') == 3
+    assert cache.stats()['evictions'] == 1
+
+
+def test_hits_misses_and_invalidations_are_counted():
+    cache = LRUCache()
+    cache.put('a', 1)
+    cache.get('a')
+    assert cache.get('missing', 'default') == 'default'
+    cache.invalidate('a')
+    cache.invalidate('a')
+    stats = cache.stats()
+    assert (stats['hits'], stats['misses'], stats['invalidations'], stats['size']) == (1, 1, 1, 0)
+
+
+def test_fill_started_before_an_invalidation_is_dropped():
+    cache = LRUCache()
+    generation = cache.generation()  # reader misses and starts its query...
+    cache.invalidate('a')            # ...a writer commits and invalidates meanwhile
+    cache.put('a', 'stale row', generation)
+    assert 'a' not in cache
+    assert cache.stats()['stale_puts'] == 1
+    cache.put('a', 'fresh row', cache.generation())
+    assert cache.get('a') == 'fresh row'
+
+
+def test_invalidating_another_key_does_not_block_a_fill():
+    cache = LRUCache()
+    generation = cache.generation()
+    cache.invalidate('b')
+    cache.put('a', 1, generation)
+    assert cache.get('a') == 1
+
+
+def test_fills_older_than_a_forgotten_generation_are_refused():
+    cache = LRUCache(max_size=2)
+    generation = cache.generation()
+    for key in ('x', 'y', 'z'):  # more invalidations than the cache remembers
+        cache.invalidate(key)
+    cache.put('a', 1, generation)
+    assert 'a' not in cache
+    cache.put('a', 1, cache.generation())
+    assert 'a' in cache
@@ -0,0 +1,225 @@
+"""Multi-worker mode: two gunicorn eventlet workers sharing one Redis.
+
+A throwaway copy of the app is started twice, on two ports, with
+MESSAGE_QUEUE pointing at a local Redis server run by redislite. One guest
+is connected to each worker, and everything that crosses between them
+(presence, a challenge, its response, the result) must reach the guest on
+the other worker. A third worker is killed outright, to check that the
+survivors take its guests offline.
+
+    pip install pytest redislite "python-socketio[client]" requests
+    python -m pytest tests
+"""
+import io
+import os
+import queue
+import shutil
+import signal
+import socket
+import subprocess
+import sys
+import time
+
+import pytest
+
+redislite = pytest.importorskip('redislite')
+requests = pytest.importorskip('requests')
+socketio = pytest.importorskip('socketio')
+Image = pytest.importorskip('PIL.Image')
+
+ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+TIMEOUT = 10.0
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(('127.0.0.1', 0))
+        return s.getsockname()[1]
+
+
+def wait_until_up(url, proc, log_path):
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            break
+        try:
+            if requests.get(url + '/', timeout=1).ok:
+                return
+        except requests.RequestException:
+            time.sleep(0.2)
+    with open(log_path) as f:
+        pytest.fail(f'worker at {url} did not come up:\n{f.read()}')
+
+
+@pytest.fixture(scope='module')
+def redis_url(tmp_path_factory):
+    port = free_port()
+    server = redislite.Redis(str(tmp_path_factory.mktemp('redis') / 'redis.db'),
+                             serverconfig={'port': str(port), 'bind': '127.0.0.1'})
+    yield f'redis://127.0.0.1:{port}/0'
+    server.shutdown()
+
+
+@pytest.fixture(scope='module')
+def start_worker(tmp_path_factory, redis_url):
+    """start_worker(name) runs one more worker on the shared copy of the app; returns (url, process)."""
+    app_dir = tmp_path_factory.mktemp('workers') / 'app'
+    shutil.copytree(ROOT, app_dir, ignore=shutil.ignore_patterns(
+        '.git', 'benchmarks', 'tests', '__pycache__', 'uploads', 'shamrock.db*'))
+    # Short heartbeat and disconnect grace, so a dead worker's guests go offline within TIMEOUT
+    env = {**os.environ, 'MESSAGE_QUEUE': redis_url, 'METRICS': '0',
+           'WORKER_TTL': '1.5', 'DISCONNECT_GRACE': '1'}
+    procs = []
+
+    def start(name):
+        port = free_port()
+        log_path = app_dir / f'{name}.log'
+        proc = subprocess.Popen(
+            [sys.executable, '-m', 'gunicorn', '--worker-class', 'eventlet', '-w', '1',
+             '--bind', f'127.0.0.1:{port}', 'app:app'],
+            cwd=app_dir, env=env, stdout=open(log_path, 'w'), stderr=subprocess.STDOUT,
+            start_new_session=True)  # its own process group, so the gunicorn worker can be killed too
+        procs.append(proc)
+        url = f'http://127.0.0.1:{port}'
+        wait_until_up(url, proc, log_path)
+        return url, proc
+
+    try:
+        yield start
+    finally:
+        for proc in procs:
+            if proc.poll() is None:
+                proc.terminate()
+            try:
+                proc.wait(10)
+            except subprocess.TimeoutExpired:
+                proc.kill()
+
+
+@pytest.fixture(scope='module')
+def workers(start_worker):
+    """URLs of two workers running one copy of the app (one database, one Redis)."""
+    return [start_worker(f'worker{n}')[0] for n in range(2)]
+
+
+def photo():
+    buf = io.BytesIO()
+    Image.new('RGB', (64, 64), (0, 128, 0)).save(buf, 'JPEG')
+    return buf.getvalue()
+
+
+class Guest:
+    """A checked-in guest with a socket on one worker, recording every event it gets."""
+
+    def __init__(self, url, session_id, name):
+        self.session_id = session_id
+        self.events = queue.Queue()
+        r = requests.post(url + '/api/profile', data={'session_id': session_id, 'name': name},
+                          files={'photo': ('photo.jpg', photo(), 'image/jpeg')}, timeout=TIMEOUT)
+        assert r.status_code == 200, r.text
+        self.client = socketio.Client(reconnection=False)
+        self.client.on('*', lambda event, data=None: self.events.put((event, data or {})))
+        self.client.connect(url, transports=['websocket'], wait_timeout=TIMEOUT)
+        self.emit('go_online', {'session_id': session_id})
+        self.expect('online_success')
+
+    def emit(self, event, data):
+        self.client.emit(event, data)
+
+    def expect(self, event, check=lambda data: True):
+        """The next `event` whose payload passes check (other events are skipped)."""
+        deadline = time.monotonic() + TIMEOUT
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                name, data = self.events.get(timeout=max(remaining, 0))
+            except queue.Empty:
+                pytest.fail(f'{self.session_id} never got {event}')
+            if name == event and check(data):
+                return data
+
+    def expect_presence(self, event, session_id):
+        """Wait for a presence delta (or a snapshot that reflects it) about session_id."""
+        deadline = time.monotonic() + TIMEOUT
+        while True:
+            remaining = deadline - time.monotonic()
+            try:
+                name, data = self.events.get(timeout=max(remaining, 0))
+            except queue.Empty:
+                pytest.fail(f'{self.session_id} never saw {event} for {session_id}')
+            if name == 'presence_batch':
+                for change in data['changes']:
+                    subject = change.get('session_id') or change.get('user', {}).get('session_id')
+                    if change['event'] == event and subject == session_id:
+                        return
+            elif name == 'users_update':
+                online = {u['session_id'] for u in data['users']}
+                if (session_id in online) == (event != 'user_left'):
+                    return
+
+    def close(self):
+        if self.client.connected:
+            self.client.disconnect()
+
+
+def test_guests_on_different_workers_see_each_other_and_play(workers):
+    url_a, url_b = workers
+    run = os.urandom(3).hex()
+    a = Guest(url_a, f'mw-{run}-a', 'Alice')
+    b = Guest(url_b, f'mw-{run}-b', 'Bob')
+    try:
+        # Presence: b came online on worker B; a is told through the message queue
+        a.expect_presence('user_joined', b.session_id)
+        users = requests.get(url_a + '/api/users', params={'venue': 'default'}, timeout=TIMEOUT).json()
+        assert {a.session_id, b.session_id} <= {u['session_id'] for u in users}
+
+        # Challenge from worker A to a guest on worker B
+        a.emit('rps_challenge', {'to_session': b.session_id, 'mode': 'fun'})
+        game_id = a.expect('rps_challenge_sent')['game_id']
+        incoming = b.expect('rps_incoming', lambda d: d['game_id'] == game_id)
+        assert incoming['from_session'] == a.session_id
+        assert incoming['from_name'] == 'Alice'
+
+        # The response is handled on worker B; both players start
+        b.emit('rps_response', {'game_id': game_id, 'accepted': True})
+        a.expect('rps_start', lambda d: d['game_id'] == game_id)
+        b.expect('rps_start', lambda d: d['game_id'] == game_id)
+
+        # One choice per worker; whichever worker resolves it, both get the result
+        a.emit('rps_choice', {'game_id': game_id, 'session_id': a.session_id, 'choice': 'rock'})
+        b.emit('rps_choice', {'game_id': game_id, 'session_id': b.session_id, 'choice': 'scissors'})
+        result_a = a.expect('rps_result', lambda d: d['game_id'] == game_id)
+        result_b = b.expect('rps_result', lambda d: d['game_id'] == game_id)
+        assert result_a['result'] == 'win' and result_b['result'] == 'lose'
+        assert result_a['winner'] == result_b['winner'] == a.session_id
+
+        # Leaving on worker B shows up on worker A too
+        b.emit('checkout', {'session_id': b.session_id})
+        b.expect('checkout_success')
+        a.expect_presence('user_left', b.session_id)
+    finally:
+        a.close()
+        b.close()
+
+
+def test_guests_of_a_dead_worker_go_offline(workers, start_worker):
+    url_a = workers[0]
+    url_dead, dead = start_worker('dead')
+    run = os.urandom(3).hex()
+    a = Guest(url_a, f'mw-{run}-a', 'Alice')
+    c = Guest(url_dead, f'mw-{run}-c', 'Cara')
+    try:
+        a.expect_presence('user_joined', c.session_id)
+
+        # The worker dies without cleaning up; its socket id stays in Redis
+        os.killpg(dead.pid, signal.SIGKILL)
+        dead.wait()
+
+        # Cara's page reconnects to a live worker, then she closes the tab.
+        # Her old socket must not keep her online.
+        back = Guest(url_a, c.session_id, 'Cara')
+        back.close()
+        a.expect_presence('user_left', c.session_id)
+    finally:
+        a.close()
+        c.close()
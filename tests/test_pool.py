@@ -0,0 +1,92 @@
+"""ConnectionPool and get_db(): reuse, the max_size cap and nested blocks."""
+import sqlite3
+import threading
+
+import pytest
+
+import models
+from models import ConnectionPool
+
+
+@pytest.fixture
+def pool(tmp_path):
+    pool = ConnectionPool(str(tmp_path / 'pool.db'), max_idle=2, max_size=2)
+    yield pool
+    pool.close_all()
+
+
+@pytest.fixture
+def db(pool, monkeypatch):
+    """get_db() on a scratch database with one table, t(x UNIQUE)."""
+    monkeypatch.setattr(models, '_pool', pool)
+    with models.get_db() as conn:
+        conn.execute('CREATE TABLE t (x INTEGER UNIQUE)')
+        conn.commit()
+    return pool
+
+
+def rows():
+    with models.get_db() as conn:
+        return [row[0] for row in conn.execute('SELECT x FROM t ORDER BY x')]
+
+
+def test_released_connection_is_reused(pool):
+    with pool.connection() as first:
+        pass
+    with pool.connection() as second:
+        pass
+    assert second is first
+    stats = pool.stats()
+    assert (stats['misses'], stats['hits'], stats['in_use']) == (1, 1, 0)
+
+
+def test_nested_blocks_share_the_outer_connection(pool):
+    with pool.connection() as outer:
+        assert not pool.is_nested()
+        with pool.connection() as inner:
+            assert inner is outer
+            assert pool.is_nested()
+        assert not pool.is_nested()
+        assert pool.stats()['in_use'] == 1
+    assert pool.stats()['in_use'] == 0
+
+
+def test_checkout_beyond_max_size_waits_for_a_release(pool):
+    first, second = pool.acquire(), pool.acquire()
+    threading.Timer(0.05, pool.release, (first,)).start()
+    third = pool.acquire()
+    assert third is first
+    stats = pool.stats()
+    assert (stats['waits'], stats['timeouts'], stats['in_use']) == (1, 0, 2)
+    pool.release(second)
+    pool.release(third)
+
+
+def test_checkout_gives_up_when_the_pool_stays_exhausted(pool, monkeypatch):
+    monkeypatch.setattr(models, 'POOL_CHECKOUT_TIMEOUT', 0.05)
+    held = [pool.acquire(), pool.acquire()]
+    with pytest.raises(sqlite3.OperationalError, match='exhausted'):
+        pool.acquire()
+    assert pool.stats()['timeouts'] == 1
+    for conn in held:
+        pool.release(conn)
+    assert pool.stats()['in_use'] == 0
+    pool.release(pool.acquire())  # the failed checkout didn't leak a slot
+
+
+def test_error_in_a_nested_block_keeps_the_outer_transaction(db):
+    with models.get_db() as conn:
+        conn.execute('INSERT INTO t VALUES (1)')
+        with pytest.raises(sqlite3.IntegrityError):
+            with models.get_db() as inner:
+                inner.execute('INSERT INTO t VALUES (1)')
+        conn.commit()
+    assert rows() == [1]
+
+
+def test_error_in_the_outermost_block_rolls_back(db):
+    with pytest.raises(sqlite3.IntegrityError):
+        with models.get_db() as conn:
+            conn.execute('INSERT INTO t VALUES (2)')
+            conn.execute('INSERT INTO t VALUES (2)')
+    assert rows() == []
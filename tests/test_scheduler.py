@@ -0,0 +1,63 @@
+"""Scheduler: firing order, cancellation, compaction and callback errors."""
+import time
+
+from scheduler import Scheduler
+
+
+def run_after(scheduler, seconds):
+    time.sleep(seconds)
+    return scheduler.run_due()
+
+
+def test_timers_fire_in_due_order_and_ties_in_scheduling_order():
+    scheduler = Scheduler()
+    fired = []
+    scheduler.call_later(0.02, fired.append, 'late')
+    scheduler.call_later(0.0, fired.append, 'first')
+    scheduler.call_later(0.0, fired.append, 'second')
+    scheduler.call_later(60, fired.append, 'never')
+    delay = run_after(scheduler, 0.05)
+    assert fired == ['first', 'second', 'late']
+    assert 59 < delay <= 60
+    assert scheduler.stats()['pending'] == 1
+
+
+def test_cancelled_timer_does_not_fire_and_counts_once():
+    scheduler = Scheduler()
+    fired = []
+    handle = scheduler.call_later(0.0, fired.append, 'x')
+    handle.cancel()
+    handle.cancel()
+    assert run_after(scheduler, 0.01) is None
+    assert fired == []
+    stats = scheduler.stats()
+    assert (stats['cancelled'], stats['pending'], stats['fired']) == (1, 0, 0)
+
+
+def test_cancelling_a_timer_that_already_fired_is_a_no_op():
+    scheduler = Scheduler()
+    handle = scheduler.call_later(0.0, lambda: None)
+    scheduler.call_later(60, lambda: None)
+    run_after(scheduler, 0.01)
+    handle.cancel()
+    stats = scheduler.stats()
+    assert (stats['fired'], stats['cancelled'], stats['pending']) == (1, 0, 1)
+
+
+def test_heap_is_compacted_once_most_of_it_is_cancelled():
+    scheduler = Scheduler()
+    handles = [scheduler.call_later(60 + n, lambda: None) for n in range(200)]
+    for handle in handles[:150]:
+        handle.cancel()
+    assert scheduler.stats()['pending'] == 50
+    assert len(scheduler._heap) < 200
+
+
+def test_a_failing_callback_does_not_stop_the_others():
+    scheduler = Scheduler()
+    fired = []
+    scheduler.call_later(0.0, lambda: 1 / 0)
+    scheduler.call_later(0.0, fired.append, 'after')
+    run_after(scheduler, 0.01)
+    assert fired == ['after']
+    assert scheduler.stats()['errors'] == 1
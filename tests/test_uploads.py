@@ -0,0 +1,94 @@
+"""uploads.sniff_image() and parse_upload() on hand-built multipart bodies."""
+import hashlib
+import io
+import os
+
+import pytest
+
+import uploads
+from uploads import UploadError, parse_upload, sniff_image
+
+BOUNDARY = 'test-boundary'
+CONTENT_TYPE = f'multipart/form-data; boundary={BOUNDARY}'
+PNG = b'\x89PNG\r\n\x1a\n' + b'\x00' * 200
+
+
+def body(fields=(), files=()):
+    """A multipart body from (name, value) fields and (name, filename, data) files."""
+    out = b''
+    for name, value in fields:
+        out += (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n'
+                f'{value}\r\n').encode()
+    for name, filename, data in files:
+        out += (f'--{BOUNDARY}\r\nContent-Disposition: form-data; name="{name}"; filename="{filename}"\r\n'
+                f'Content-Type: application/octet-stream\r\n\r\n').encode() + data + b'\r\n'
+    return out + f'--{BOUNDARY}--\r\n'.encode()
+
+
+def parse(raw, upload_dir, max_bytes=10_000, content_type=CONTENT_TYPE):
+    return parse_upload(io.BytesIO(raw), content_type, 'photo', str(upload_dir), max_bytes)
+
+
+@pytest.mark.parametrize('head, ext', [
+    (PNG[:12], 'png'),
+    (b'\xff\xd8\xff\xe0' + b'\x00' * 8, 'jpg'),
+    (b'GIF89a' + b'\x00' * 6, 'gif'),
+    (b'GIF87a' + b'\x00' * 6, 'gif'),
+    (b'RIFF\x00\x00\x00\x00WEBP', 'webp'),
+    (b'XXXX\x00\x00\x00\x00WEBP', None),  # WEBP tag without the RIFF header
+    (b'<svg xmlns="', None),
+    (b'', None),
+])
+def test_sniff_image(head, ext):
+    assert sniff_image(head) == ext
+
+
+def test_fields_and_photo_are_parsed_and_written_to_disk(tmp_path):
+    fields, upload = parse(body([('name', 'Alice'), ('venue', 'pub')], [('photo', 'a.png', PNG)]), tmp_path)
+    assert fields == {'name': 'Alice', 'venue': 'pub'}
+    assert (upload.ext, upload.size) == ('png', len(PNG))
+    assert upload.digest == hashlib.sha256(PNG).hexdigest()
+    with open(upload.path, 'rb') as f:
+        assert f.read() == PNG
+
+
+def test_photo_split_across_small_chunks_is_sniffed(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, 'CHUNK_SIZE', 5)
+    _, upload = parse(body(files=[('photo', 'a.png', PNG)]), tmp_path)
+    assert upload.ext == 'png'
+    assert upload.digest == hashlib.sha256(PNG).hexdigest()
+
+
+def test_missing_or_empty_photo_gives_no_file(tmp_path):
+    assert parse(body([('name', 'Alice')]), tmp_path) == ({'name': 'Alice'}, None)
+    assert parse(body(files=[('photo', '', b'')]), tmp_path)[1] is None
+    assert os.listdir(tmp_path) == []
+
+
+def test_non_image_is_refused_and_nothing_is_left_behind(tmp_path):
+    with pytest.raises(UploadError) as refused:
+        parse(body(files=[('photo', 'a.svg', b'<svg xmlns="http://www.w3.org/2000/svg"/>')]), tmp_path)
+    assert refused.value.status == 415
+    assert os.listdir(tmp_path) == []
+
+
+def test_oversized_body_is_refused_and_the_partial_file_removed(tmp_path, monkeypatch):
+    monkeypatch.setattr(uploads, 'CHUNK_SIZE', 64)
+    big = PNG + b'\x00' * 5000
+    with pytest.raises(UploadError) as refused:
+        parse(body(files=[('photo', 'a.png', big)]), tmp_path, max_bytes=1000)
+    assert refused.value.status == 413
+    assert os.listdir(tmp_path) == []
+
+
+def test_truncated_body_is_refused(tmp_path):
+    raw = body(files=[('photo', 'a.png', PNG)])
+    with pytest.raises(UploadError):
+        parse(raw[:-40], tmp_path)
+    assert os.listdir(tmp_path) == []
+
+
+def test_non_multipart_request_is_refused(tmp_path):
+    with pytest.raises(UploadError) as refused:
+        parse(b'name=Alice', tmp_path, content_type='application/x-www-form-urlencoded')
+    assert refused.value.status == 400
@@ -0,0 +1,117 @@
+"""WriteBehindQueue: batching, keyed flush and discard, backpressure, retries."""
+import sqlite3
+
+import pytest
+
+from writebehind import WriteBehindQueue
+
+
+class Database:
+    """Records committed batches; fails the next `locked` writes, and any batch holding 'bad'."""
+
+    def __init__(self):
+        self.batches = []
+        self.locked = 0
+
+    def write_batch(self, records):
+        if self.locked:
+            self.locked -= 1
+            raise sqlite3.OperationalError('database is locked')
+        if any(params == 'bad' for _, params in records):
+            raise sqlite3.IntegrityError('rejected')
+        self.batches.append([params for _, params in records])
+
+    @property
+    def rows(self):
+        return [params for batch in self.batches for params in batch]
+
+
+@pytest.fixture
+def db():
+    return Database()
+
+
+def make_queue(db, write_batch=None, **kwargs):
+    return WriteBehindQueue(write_batch or db.write_batch,
+                            is_transient=lambda e: isinstance(e, sqlite3.OperationalError), **kwargs)
+
+
+def test_flush_writes_in_submission_order_and_batches(db):
+    queue = make_queue(db, batch_size=2)
+    for n in range(5):
+        queue.submit('INSERT', n)
+    queue.flush()
+    assert db.batches == [[0, 1], [2, 3], [4]]
+    assert queue.stats()['depth'] == 0
+
+
+def test_flush_with_match_writes_only_matching_records(db):
+    queue = make_queue(db)
+    queue.submit('INSERT', 'a1', key='a')
+    queue.submit('INSERT', 'b1', key='b')
+    queue.submit('INSERT', 'a2', key='a')
+    queue.flush(lambda key: key == 'a')
+    assert db.rows == ['a1', 'a2']
+    queue.flush()
+    assert db.rows == ['a1', 'a2', 'b1']
+
+
+def test_discard_drops_matching_records_unwritten(db):
+    queue = make_queue(db)
+    queue.submit('INSERT', 'a1', key='a')
+    queue.submit('INSERT', 'b1', key='b')
+    assert queue.discard(lambda key: key == 'a') == 1
+    queue.flush()
+    assert db.rows == ['b1']
+
+
+def test_full_queue_is_drained_by_the_submitter(db):
+    queue = make_queue(db, max_size=3)
+    for n in range(4):
+        queue.submit('INSERT', n)
+    assert db.rows == [0, 1, 2]
+    stats = queue.stats()
+    assert (stats['backpressure'], stats['depth']) == (1, 1)
+
+
+def test_transient_failure_requeues_the_batch_at_the_head(db):
+    queue = make_queue(db, batch_size=2)
+    for n in range(3):
+        queue.submit('INSERT', n)
+    db.locked = 1
+    queue.flush()
+    assert db.rows == []
+    stats = queue.stats()
+    assert (stats['depth'], stats['retries'], stats['failed']) == (3, 1, 0)
+    queue.submit('INSERT', 3)
+    queue.flush()
+    assert db.rows == [0, 1, 2, 3]
+
+
+def test_rejected_records_are_dropped_alone(db):
+    queue = make_queue(db)
+    for params in (0, 1, 'bad', 3, 4):
+        queue.submit('INSERT', params)
+    queue.flush()
+    assert db.rows == [0, 1, 3, 4]
+    stats = queue.stats()
+    assert (stats['written'], stats['failed']) == (4, 1)
+
+
+def test_transient_failure_while_bisecting_keeps_the_unwritten_half(db):
+    calls = []
+
+    def write_batch(records):
+        calls.append(len(records))
+        if len(calls) == 3:  # whole batch, first half, then the second half hits a lock
+            raise sqlite3.OperationalError('database is locked')
+        db.write_batch(records)
+
+    queue = make_queue(db, write_batch)
+    for params in (0, 1, 'bad', 3):
+        queue.submit('INSERT', params)
+    queue.flush()
+    assert db.rows == [0, 1]
+    queue.flush()
+    assert db.rows == [0, 1, 3]
+    assert queue.stats()['failed'] == 1
@@ -0,0 +1,156 @@
+"""Streaming multipart parsing for photo uploads.
+
+The request body is read in fixed-size chunks and fed to Werkzeug's
+sans-IO multipart decoder instead of letting request.files buffer it.
+The file part is sniffed from its first bytes, so an oversized or
+non-image upload is refused before the rest of the body is read, and
+accepted files go straight to disk while being hashed.
+"""
+import hashlib
+import os
+import uuid
+
+from werkzeug.http import parse_options_header
+from werkzeug.sansio.multipart import Data, Epilogue, Field, File, MultipartDecoder, NeedData
+
+CHUNK_SIZE = 64 * 1024
+MAX_FIELD_BYTES = 16 * 1024  # all text fields together
+SNIFF_BYTES = 12
+
+# (offset, magic bytes) -> extension
+_SIGNATURES = (
+    (0, b'\x89PNG\r\n\x1a\n', 'png'),
+    (0, b'\xff\xd8\xff', 'jpg'),
+    (0, b'GIF87a', 'gif'),
+    (0, b'GIF89a', 'gif'),
+    (8, b'WEBP', 'webp'),  # RIFF....WEBP
+)
+
+
+class UploadError(Exception):
+    """The upload was refused. status is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.message = message
+        self.status = status
+
+
+class UploadedFile:
+    """A file part written to a temporary path, with its sniffed type and content hash."""
+
+    __slots__ = ('path', 'ext', 'digest', 'size')
+
+    def __init__(self, path, ext, digest, size):
+        self.path = path
+        self.ext = ext
+        self.digest = digest
+        self.size = size
+
+    def discard(self):
+        try:
+            os.remove(self.path)
+        except OSError:
+            pass
+
+
+def sniff_image(head):
+    """Image type from the first bytes of a file, or None if it isn't one we accept."""
+    for offset, magic, ext in _SIGNATURES:
+        if head[offset:offset + len(magic)] == magic:
+            if ext == 'webp' and not head.startswith(b'RIFF'):
+                continue
+            return ext
+    return None
+
+
+def parse_upload(stream, content_type, file_field, upload_dir, max_bytes):
+    """Read a multipart body chunk by chunk.
+
+    Returns (fields, file) where fields is {name: str} and file is an
+    UploadedFile for file_field (or None if it was missing or empty).
+    Bodies without a Content-Length are cut off after max_bytes.
+    Raises UploadError on anything we refuse; no temporary file is left
+    behind in that case.
+    """
+    mimetype, options = parse_options_header(content_type or '')
+    if mimetype != 'multipart/form-data' or 'boundary' not in options:
+        raise UploadError('Expected a multipart/form-data upload')
+
+    decoder = MultipartDecoder(options['boundary'].encode('latin-1'))
+    fields = {}
+    field_bytes = 0
+    upload = None
+    part = None        # ('field', name, [chunks]) or ('file', name)
+    out = None         # open temp file for the current file part
+    head = b''
+    hasher = None
+    size = 0
+    received = 0
+    eof = False
+
+    try:
+        while True:
+            event = decoder.next_event()
+            if isinstance(event, NeedData):
+                if eof:
+                    raise UploadError('Upload ended unexpectedly')
+                chunk = stream.read(CHUNK_SIZE)
+                received += len(chunk)
+                if received > max_bytes:
+                    raise UploadError('Photo is too large', 413)
+                eof = not chunk
+                decoder.receive_data(chunk or None)
+                continue
+            if isinstance(event, Epilogue):
+                break
+            if isinstance(event, Field):
+                part = ('field', event.name, [])
+            elif isinstance(event, File):
+                part = ('file', event.name) if event.name == file_field and upload is None else None
+                head, hasher, size = b'', hashlib.sha256(), 0
+            elif isinstance(event, Data) and part is not None:
+                if part[0] == 'field':
+                    field_bytes += len(event.data)
+                    if field_bytes > MAX_FIELD_BYTES:
+                        raise UploadError('Form fields are too large', 413)
+                    part[2].append(event.data)
+                    if not event.more_data:
+                        fields[part[1]] = b''.join(part[2]).decode('utf-8', 'replace')
+                    continue
+                if out is None:
+                    head += event.data
+                    if len(head) < SNIFF_BYTES and event.more_data:
+                        continue
+                    if not head:
+                        part = None  # empty file input
+                        continue
+                    ext = sniff_image(head)
+                    if ext is None:
+                        raise UploadError('Photo must be a PNG, JPEG, GIF or WebP image', 415)
+                    path = os.path.join(upload_dir, f'.upload-{uuid.uuid4().hex}.part')
+                    os.makedirs(upload_dir, exist_ok=True)
+                    out = open(path, 'wb')
+                    upload = UploadedFile(path, ext, None, 0)
+                    data = head
+                else:
+                    data = event.data
+                out.write(data)
+                hasher.update(data)
+                size += len(data)
+                if not event.more_data:
+                    out.close()
+                    out = None
+                    upload.digest = hasher.hexdigest()
+                    upload.size = size
+                    part = None
+    except (UploadError, ValueError) as e:
+        if out is not None:
+            out.close()
+        if upload is not None:
+            upload.discard()
+        if isinstance(e, UploadError):
+            raise
+        raise UploadError('Malformed upload') from e
+
+    return fields, upload
@@ -0,0 +1,157 @@
+"""Write-behind queue for fire-and-forget database inserts.
+
+Socket handlers enqueue (sql, params) records and return straight away; a
+single background task commits them in batched transactions, so gameplay
+latency no longer waits on a SQLite commit per record.
+"""
+import threading
+import time
+from collections import deque
+
+
+class WriteBehindQueue:
+    """Bounded queue of pending writes, drained by run() in batches.
+
+    write_batch(records) commits a list of (sql, params) records in one
+    transaction. A batch is written every `interval` seconds, or as soon as
+    `batch_size` records are waiting. When `max_size` records are already
+    queued, submit() applies backpressure: the caller drains the queue
+    itself before enqueueing, so nothing is dropped.
+
+    Each record may carry a key. flush(match) and discard(match) then act
+    only on the records whose key satisfies match(key), so a read of one
+    guest's rows waits for that guest's writes rather than the whole queue.
+
+    A batch that fails with an error is_transient(error) accepts (say,
+    "database is locked") goes back to the head of the queue, and run()
+    retries it after a backoff that doubles up to max_retry_delay. Any
+    other error is blamed on the records: the batch is split in halves
+    until the ones the database rejects are found, and only those are
+    dropped (counted in `failed`).
+    """
+
+    def __init__(self, write_batch, interval=0.5, batch_size=100, max_size=5000,
+                 is_transient=lambda error: False, retry_delay=0.1, max_retry_delay=5.0):
+        self._write_batch = write_batch
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_size = max_size
+        self._is_transient = is_transient
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self._backoff = 0.0  # seconds run() waits before retrying; 0 while writes succeed
+        self._pending = deque()
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()  # one writer at a time keeps records in order
+        self._wakeup = threading.Event()
+        self.submitted = 0
+        self.written = 0
+        self.batches = 0
+        self.failed = 0
+        self.retries = 0
+        self.backpressure = 0
+        self.max_depth = 0
+        self.last_batch_ms = 0.0
+
+    def submit(self, sql, params, key=None):
+        with self._lock:
+            full = len(self._pending) >= self.max_size
+        if full:
+            self.backpressure += 1
+            self.flush()
+        with self._lock:
+            self._pending.append((sql, params, key))
+            self.submitted += 1
+            depth = len(self._pending)
+            self.max_depth = max(self.max_depth, depth)
+        if depth >= self.batch_size:
+            self._wakeup.set()
+
+    def flush(self, match=None):
+        """Write everything queued so far (only the records match(key) accepts), in batches.
+
+        Safe to call from any task. Returns once a batch another task was
+        writing is committed too, so the caller can read what it queued.
+        Stops early, leaving the rest queued, after a transient failure.
+        """
+        with self._flush_lock:
+            while True:
+                with self._lock:
+                    batch = self._take(match, self.batch_size)
+                if not batch:
+                    return
+                start = time.perf_counter()
+                unwritten = self._write(batch)
+                self.batches += 1
+                self.last_batch_ms = (time.perf_counter() - start) * 1000
+                if unwritten:
+                    with self._lock:
+                        self._pending.extendleft(reversed(unwritten))
+                    self.retries += 1
+                    self._backoff = min(max(self._backoff * 2, self.retry_delay), self.max_retry_delay)
+                    print(f"Write-behind batch of {len(unwritten)} requeued, retrying in {self._backoff:.1f}s")
+                    return
+                self._backoff = 0.0
+
+    def _write(self, batch):
+        """Write batch; returns the records a transient error left unwritten ([] otherwise)."""
+        try:
+            self._write_batch([(sql, params) for sql, params, _ in batch])
+        except Exception as e:
+            if self._is_transient(e):
+                return batch
+            if len(batch) == 1:
+                self.failed += 1
+                print(f"Write-behind record dropped: {e}")
+                return []
+            half = len(batch) // 2
+            unwritten = self._write(batch[:half])
+            return unwritten + batch[half:] if unwritten else self._write(batch[half:])
+        self.written += len(batch)
+        return []
+
+    def discard(self, match):
+        """Drop the queued records match(key) accepts, unwritten. Returns how many."""
+        with self._flush_lock:
+            with self._lock:
+                return len(self._take(match))
+
+    def _take(self, match, limit=None):
+        """Remove and return up to limit records (oldest first) that match; call with _lock held."""
+        if match is None:
+            count = len(self._pending) if limit is None else min(len(self._pending), limit)
+            return [self._pending.popleft() for _ in range(count)]
+        taken, kept = [], deque()
+        for record in self._pending:
+            if (limit is None or len(taken) < limit) and match(record[2]):
+                taken.append(record)
+            else:
+                kept.append(record)
+        if taken:
+            self._pending = kept
+        return taken
+
+    def run(self):
+        """Writer loop — start once with socketio.start_background_task()."""
+        while True:
+            if self._backoff:
+                time.sleep(self._backoff)  # a full queue doesn't cut a retry backoff short
+            else:
+                self._wakeup.wait(self.interval)
+            self._wakeup.clear()
+            self.flush()
+
+    def stats(self) -> dict:
+        with self._lock:
+            depth = len(self._pending)
+        return {
+            'depth': depth,
+            'max_depth': self.max_depth,
+            'submitted': self.submitted,
+            'written': self.written,
+            'batches': self.batches,
+            'failed': self.failed,
+            'retries': self.retries,
+            'backpressure': self.backpressure,
+            'last_batch_ms': round(self.last_batch_ms, 2),
+        }